@@ -0,0 +1,117 @@
+"""Benchmark the PNG encoder.
+
+Compares the presets of ``array2png()`` with the original row-by-row
+implementation, and with lossless WebP (if Pillow is installed), on images
+that are representative for scientific plots and user interfaces.
+Run with ``python benchmarks/bench_png.py``.
+"""
+
+import struct
+import time
+import zlib
+
+import numpy as np
+
+from jupyter_rfb._png import array2png, PRESETS
+from jupyter_rfb._webp import array2webp, get_pillow
+
+
+def array2png_rowwise(array):
+    """The original implementation: filter type 0, two compress calls per row."""
+    shape = array.shape
+    if not array.flags.c_contiguous:
+        array = array.copy()
+    chunks = []
+
+    def add_chunk(data, name):
+        name = name.encode("ASCII")
+        crc = zlib.crc32(data, zlib.crc32(name))
+        chunks.append(struct.pack(">I", len(data)) + name + data)
+        chunks.append(struct.pack(">I", crc & 0xFFFFFFFF))
+
+    chunks.append(b"\x89PNG\x0d\x0a\x1a\x0a")
+    ctyp = 0b0110 if shape[2] == 4 else 0b0010
+    add_chunk(struct.pack(">IIBBBBB", shape[1], shape[0], 8, ctyp, 0, 0, 0), "IHDR")
+    compressor = zlib.compressobj(level=7)
+    compressed_data = []
+    for row_index in range(shape[0]):
+        compressed_data.append(compressor.compress(b"\x00"))
+        compressed_data.append(compressor.compress(array[row_index]))
+    compressed_data.append(compressor.flush())
+    add_chunk(b"".join(compressed_data), "IDAT")
+    add_chunk(b"", "IEND")
+    return b"".join(chunks)
+
+
+def get_images(h=1080, w=1920):
+    """Get a dict of test images."""
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:h, 0:w] / max(h, w)
+    images = {}
+
+    # A smooth field with a colormap, like an imshow of simulation data
+    field = np.sin(x * 13) * np.cos(y * 7) + 0.5 * np.sin((x + y) * 29)
+    field = (field - field.min()) / np.ptp(field)
+    images["heatmap"] = np.stack(
+        [field * 255, np.abs(field - 0.5) * 2 * 255, (1 - field) * 255], axis=2
+    ).astype(np.uint8)
+
+    # Noisy measurement data
+    noise = field + rng.normal(0, 0.05, field.shape)
+    images["noisy"] = (np.clip(noise, 0, 1) * 255).astype(np.uint8)[:, :, None]
+    images["noisy"] = np.repeat(images["noisy"], 3, axis=2)
+
+    # A UI-like image: flat background, panels, grid lines and "text"
+    ui = np.full((h, w, 3), 245, np.uint8)
+    ui[: h // 12] = (40, 44, 52)
+    ui[h // 12 :, : w // 6] = (225, 228, 232)
+    ui[::40, w // 6 :] = 200
+    ui[:, w // 6 :: 40] = 200
+    text = rng.random((h // 2, w // 2)) > 0.8
+    ui[h // 4 : h // 4 + h // 2, w // 4 : w // 4 + w // 2][text] = 20
+    images["ui"] = ui
+
+    # A line plot with an alpha channel
+    plot = np.zeros((h, w, 4), np.uint8)
+    xs = np.arange(w)
+    ys = (h / 2 + np.sin(xs / 50) * h / 3).astype(int)
+    for dy in range(-2, 3):
+        plot[np.clip(ys + dy, 0, h - 1), xs] = (31, 119, 180, 255)
+    images["plot_rgba"] = plot
+
+    return images
+
+
+def bench(func, array, n=3):
+    """Get the best time and the result size."""
+    times = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        bb = func(array)
+        times.append(time.perf_counter() - t0)
+    return min(times), len(bb)
+
+
+def main():
+    """Run the benchmark and print a table."""
+    images = get_images()
+    encoders = {"rowwise": array2png_rowwise}
+    for preset in PRESETS:
+        encoders[preset] = lambda a, preset=preset: array2png(a, preset=preset)
+    if get_pillow("WEBP"):
+        for preset in PRESETS:
+            encoders[f"webp-{preset}"] = lambda a, preset=preset: array2webp(
+                a, lossless=True, preset=preset
+            )
+
+    print(f"{'image':<12}{'encoder':<14}{'time (ms)':>12}{'size (KiB)':>12}")
+    for image_name, array in images.items():
+        for encoder_name, func in encoders.items():
+            t, size = bench(func, array)
+            print(
+                f"{image_name:<12}{encoder_name:<14}{t * 1000:12.1f}{size / 1024:12.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""Benchmark the RemoteFrameBuffer end-to-end, with a simulated frontend.
+
+A widget renders an animation as fast as it can, while a Python stand-in for
+the browser (``SimulatedFrontend``) receives the frames over a simulated link,
+"decodes" and "paints" them, and confirms them like the real frontend does.
+This measures the throttling, encoding and stats of the widget without a
+browser. The benchmark sweeps over frame sizes, channel counts, quality,
+JPEG encoders and max_buffered_frames, and reports the FPS, latency and CPU
+use for each configuration.
+
+Run with ``python benchmarks/bench_widget.py``, see ``--help`` for options.
+Use ``--json results.json`` to store the results, e.g. to compare releases.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import itertools
+import json
+import math
+import platform
+import sys
+import time
+
+import numpy as np
+
+import jupyter_rfb
+from jupyter_rfb import RemoteFrameBuffer, clear_frame_cache, list_jpeg_encoders
+
+
+class SimulatedFrontend:
+    """A stand-in for the frontend (``RenderviewAnywidgetModel``) of a widget.
+
+    Messages sent by the widget are captured, and go over a simulated link
+    with the given bandwidth (bytes per second) and one-way latency (seconds),
+    one message at a time. The client decodes frames one after another,
+    taking decode_time seconds per megapixel, and paints a frame at the next
+    refresh of the display. It then confirms the frame via ``_frame_feedback``,
+    which reaches the widget after the latency. Clock pings are answered too.
+    """
+
+    def __init__(self, bandwidth=100e6, latency=0.001, decode_time=0.005, fps=60):
+        self.bandwidth = float(bandwidth)
+        self.latency = float(latency)
+        self.decode_time = float(decode_time)
+        self.refresh_interval = 1 / fps
+        self.widget = None
+        self.received_frames = 0
+        self.received_bytes = 0
+        self._link_free_time = 0
+        self._client_free_time = 0
+        self._npixels = 0
+
+    def attach(self, widget, width, height, ratio=1):
+        """Connect to the widget, and show it with the given logical size."""
+        loop = asyncio.get_running_loop()
+        self._loop = loop
+        self._wall_offset = time.time() - loop.time()  # loop time to wall time
+        self.widget = widget
+        self._npixels = width * ratio * height * ratio
+        widget.send = self._on_send
+        widget._has_visible_views = True
+        event = {
+            "type": "resize",
+            "width": width,
+            "height": height,
+            "pwidth": width * ratio,
+            "pheight": height * ratio,
+            "ratio": ratio,
+            "timestamp": time.perf_counter(),
+        }
+        widget._rfb_handle_msg(widget, event, [])
+
+    def _on_send(self, msg, buffers=None):
+        """Send a message over the link."""
+        nbytes = sum(len(b) for b in buffers or ())
+        nbytes += len(msg.get("data_b64") or "")
+        now = self._loop.time()
+        self._link_free_time = max(now, self._link_free_time) + nbytes / self.bandwidth
+        arrival = self._link_free_time + self.latency
+        self._loop.call_at(arrival, self._on_receive, msg, nbytes)
+
+    def _on_receive(self, msg, nbytes):
+        now = self._loop.time()
+        if msg["type"] == "clock_ping":
+            t = now + self._wall_offset
+            pong = {"type": "clock_pong", "t0": msg["t0"], "t1": t, "t2": t}
+            self._send_to_widget(self.widget._rfb_handle_msg, self.widget, pong, [])
+        elif msg["type"] == "framebufferdata":
+            self.received_frames += 1
+            self.received_bytes += nbytes
+            if msg.get("unchanged"):
+                decoded = painted = max(now, self._client_free_time)
+            else:
+                start = max(now, self._client_free_time)
+                decoded = start + self.decode_time * self._npixels / 1e6
+                interval = self.refresh_interval
+                painted = math.ceil(decoded / interval) * interval
+            self._client_free_time = painted
+            feedback = {
+                "index": msg["index"],
+                "timestamp": msg["timestamp"],
+                "localtime": painted + self._wall_offset,
+                "received": now + self._wall_offset,
+                "decoded": decoded + self._wall_offset,
+                "painted": painted + self._wall_offset,
+            }
+            delay = painted - now
+            self._loop.call_later(delay, self._send_to_widget, self._confirm, feedback)
+
+    def _send_to_widget(self, func, *args):
+        self._loop.call_later(self.latency, func, *args)
+
+    def _confirm(self, feedback):
+        if self.widget is not None:
+            self.widget._frame_feedback = feedback
+
+
+class AnimatedRFB(RemoteFrameBuffer):
+    """A widget that renders a new frame as soon as it can."""
+
+    nchannels = 3
+
+    def __init__(self, **kwargs):
+        # Avoid printing the output widget outside of a notebook
+        with contextlib.redirect_stdout(io.StringIO()):
+            super().__init__(**kwargs)
+        self._base = None
+        self._frame_count = 0
+
+    def get_frame(self):
+        self.request_draw()
+        buffer = self.get_frame_buffer(self.nchannels)
+        if self._base is None or self._base.shape != buffer.shape:
+            self._base = get_image(buffer.shape)
+        # Change the colors, so that each frame is different
+        self._frame_count += 1
+        np.add(self._base, np.uint8(self._frame_count % 256), out=buffer)
+        return buffer
+
+
+def get_image(shape):
+    """Get an image with smooth regions, edges and some noise, like a typical plot."""
+    h, w, nchannels = shape
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:h, 0:w] / max(h, w)
+    field = np.sin(x * 13) * np.cos(y * 7) + 0.5 * np.sin((x + y) * 29)
+    field = (field - field.min()) / np.ptp(field)
+    field += rng.normal(0, 0.02, field.shape)
+    channels = [field, np.abs(field - 0.5) * 2, 1 - field, np.ones_like(field)]
+    image = np.stack(channels[:nchannels], axis=2)
+    image[::50] = 0.2  # grid lines
+    image[:, ::50] = 0.2
+    return (np.clip(image, 0, 1) * 255).astype(np.uint8)
+
+
+async def run_config(config, frontend_kwargs, duration, warmup=0.3):
+    """Run a single configuration, and return a dict with the results."""
+    # Configs render the same frames, these should not come from the cache
+    clear_frame_cache()
+    widget = AnimatedRFB(
+        quality=config["quality"],
+        encoder=config["encoder"],
+        max_buffered_frames=config["max_buffered_frames"],
+    )
+    widget.nchannels = config["channels"]
+    frontend = SimulatedFrontend(**frontend_kwargs)
+    width, height = (int(x) for x in config["size"].split("x"))
+    frontend.attach(widget, width, height)
+
+    await asyncio.sleep(warmup)
+    widget.reset_stats()
+    cpu0, t0 = time.process_time(), time.perf_counter()
+    await asyncio.sleep(duration)
+    cpu, elapsed = time.process_time() - cpu0, time.perf_counter() - t0
+    stats = widget.get_stats()
+    frontend.widget = None
+    widget.close()
+    # Let pending callbacks finish
+    await asyncio.sleep(frontend.latency * 2 + 0.05)
+
+    percentiles = stats["percentiles"]
+    return {
+        **config,
+        "fps": stats["fps"],
+        "latency": stats["roundtrip"],
+        "latency_p95": percentiles["ack_latency"][1],
+        "encoding": stats["img_encoding"],
+        "frame_bytes": percentiles["nbytes"][0],
+        "throughput": stats["throughput"],
+        "cpu": cpu / elapsed,
+    }
+
+
+def get_configs(args):
+    """Get the configurations to benchmark, as a list of dicts."""
+    encoders = args.encoders or list_jpeg_encoders(available=True)
+    keys = ("size", "channels", "quality", "encoder", "max_buffered_frames")
+    values = (args.sizes, args.channels, args.qualities, encoders, args.buffered)
+    return [dict(zip(keys, combination)) for combination in itertools.product(*values)]
+
+
+def main(argv=None):
+    """Run the benchmark, print a table, and optionally write the results to JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", nargs="+", default=["640x480", "1920x1080"])
+    parser.add_argument("--channels", nargs="+", type=int, default=[3, 4])
+    parser.add_argument("--qualities", nargs="+", type=int, default=[50, 80])
+    parser.add_argument("--encoders", nargs="+", help="default: all available")
+    parser.add_argument("--buffered", nargs="+", type=int, default=[1, 2, 4])
+    parser.add_argument("--duration", type=float, default=1.0, help="per config (s)")
+    parser.add_argument("--bandwidth", type=float, default=100, help="in MB/s")
+    parser.add_argument("--latency", type=float, default=1, help="one-way, in ms")
+    parser.add_argument("--decode-time", type=float, default=5, help="in ms per MP")
+    parser.add_argument("--json", help="the file to write the results to")
+    args = parser.parse_args(argv)
+
+    frontend_kwargs = {
+        "bandwidth": args.bandwidth * 1e6,
+        "latency": args.latency / 1000,
+        "decode_time": args.decode_time / 1000,
+    }
+    columns = [
+        ("size", "{:<11}"),
+        ("channels", "{:>3}"),
+        ("quality", "{:>4}"),
+        ("encoder", "{:>12}"),
+        ("max_buffered_frames", "{:>4}"),
+        ("fps", "{:>8.1f}"),
+        ("latency", "{:>9.1f}", 1000),
+        ("latency_p95", "{:>9.1f}", 1000),
+        ("encoding", "{:>9.1f}", 1000),
+        ("frame_bytes", "{:>11.1f}", 1 / 1024),
+        ("cpu", "{:>6.0%}"),
+    ]
+    print(
+        f"{'size':<11}{'ch':>3}{'q':>4}{'encoder':>12}{'buf':>4}{'fps':>8}"
+        f"{'lat (ms)':>9}{'p95 (ms)':>9}{'enc (ms)':>9}{'size (KiB)':>11}{'cpu':>6}"
+    )
+    results = []
+    for config in get_configs(args):
+        result = asyncio.run(run_config(config, frontend_kwargs, args.duration))
+        results.append(result)
+        line = ""
+        for key, fmt, *scale in columns:
+            value = result[key] * scale[0] if scale else result[key]
+            line += fmt.format(value)
+        print(line, flush=True)
+
+    if args.json:
+        info = {
+            "jupyter_rfb": jupyter_rfb.__version__,
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "frontend": frontend_kwargs,
+            "duration": args.duration,
+            "results": results,
+        }
+        with open(args.json, "w") as f:
+            json.dump(info, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,3 +2,23 @@
 from ._version import __version__, version_info
 from .widget import RemoteFrameBuffer
 from ._utils import remove_rfb_models_from_nb
+from ._jpg import (
+    JpegEncoder,
+    register_jpeg_encoder,
+    list_jpeg_encoders,
+    calibrate_jpeg_encoder,
+)
+from ._cache import (
+    set_frame_cache_budget,
+    clear_frame_cache,
+    get_frame_cache_stats,
+)
+from ._scheduler import (
+    enable_frame_scheduler,
+    disable_frame_scheduler,
+    get_frame_scheduler_stats,
+)
+from ._profiling import ProfilingHook, SamplingProfiler
+from ._snapshot import get_snapshots, save_snapshots
+from ._recording import FrameRecording
+from ._replay import RecordingPlayer
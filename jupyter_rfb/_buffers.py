@@ -0,0 +1,47 @@
+import numpy as np
+
+
+class FrameBufferRing:
+    """A set of reusable arrays to render frames into.
+
+    All buffers have the same shape; changing the shape discards them. A buffer
+    is handed out when it does not share memory with any of the given arrays
+    that are in use, least recently handed out first. A new buffer is only
+    allocated when all are in use, or when there are fewer than *min_count*
+    buffers. The latter keeps a buffer from being handed out again while the
+    frame that was rendered into it is not in the given arrays yet (e.g. when
+    a frame is rendered asynchronously).
+    """
+
+    def __init__(self):
+        self.shape = None
+        self._buffers = []
+        self.allocations = 0
+
+    def acquire(self, shape, in_use, min_count=1):
+        """Get a uint8 buffer with the given shape that is not in use."""
+        shape = tuple(int(x) for x in shape)
+        if shape != self.shape:
+            self.shape = shape
+            self._buffers = []
+        if len(self._buffers) >= min_count:
+            for i, buffer in enumerate(self._buffers):
+                if not any(np.may_share_memory(buffer, array) for array in in_use):
+                    self._buffers.append(self._buffers.pop(i))
+                    return buffer
+        buffer = np.zeros(shape, np.uint8)
+        self._buffers.append(buffer)
+        self.allocations += 1
+        return buffer
+
+    def owns(self, array):
+        """Get whether the array is (a view of) one of the buffers."""
+        return any(array is b or array.base is b for b in self._buffers)
+
+    def clear(self):
+        """Discard all buffers."""
+        self.shape = None
+        self._buffers = []
+
+    def __len__(self):
+        return len(self._buffers)
@@ -0,0 +1,158 @@
+import threading
+from collections import OrderedDict
+
+from ._jpg import JpegEncoder, StubJpegEncoder, get_default_encoder, get_jpeg_encoder
+from ._layout import get_layout
+from ._utils import array2compressed
+
+
+class EncodedFrameCache:
+    """A size-bounded LRU cache of encoded images, shared by all widgets.
+
+    Items are evicted, least recently used first, when the total size of the
+    cached images exceeds the budget (in bytes). The cache can be used from
+    multiple threads.
+    """
+
+    def __init__(self, budget):
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+        self._budget = int(budget)
+        self._nbytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key):
+        """Get the (mimetype, data) for the given key, or None."""
+        with self._lock:
+            value = self._items.get(key, None)
+            if value is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        """Store the (mimetype, data) for the given key."""
+        nbytes = len(value[1])
+        with self._lock:
+            if key in self._items:
+                return
+            if nbytes > self._budget:
+                return  # would evict everything, and then itself
+            self._items[key] = value
+            self._nbytes += nbytes
+            self._evict()
+
+    def _evict(self):
+        while self._nbytes > self._budget:
+            _, value = self._items.popitem(last=False)
+            self._nbytes -= len(value[1])
+            self._evictions += 1
+
+    def set_budget(self, budget):
+        """Set the max number of bytes to store, evicting images if needed."""
+        with self._lock:
+            self._budget = int(budget)
+            self._evict()
+
+    def clear(self):
+        """Remove all images from the cache."""
+        with self._lock:
+            self._items.clear()
+            self._nbytes = 0
+
+    def get_stats(self):
+        """Get a dict with stats about the cache."""
+        with self._lock:
+            return {
+                "count": len(self._items),
+                "nbytes": self._nbytes,
+                "budget": self._budget,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+            }
+
+
+# The cache, with a budget of 32 MiB, i.e. about a hundred (lossy) HD frames
+frame_cache = EncodedFrameCache(32 * 2**20)
+
+
+def array2compressed_cached(array, fingerprint, quality, **kwargs):
+    """Like ``array2compressed()``, but using the shared cache.
+
+    The fingerprint must represent the contents and shape of the array
+    (see ``get_fingerprint()``). The quality and other arguments (except
+    stats) are part of the cache key.
+    """
+    key = get_cache_key(array, fingerprint, quality, **kwargs)
+    result = frame_cache.get(key)
+    if result is None:
+        result = array2compressed(array, quality, **kwargs)
+        frame_cache.put(key, result)
+    return result
+
+
+def get_cache_key(
+    array,
+    fingerprint,
+    quality,
+    png_preset="default",
+    jpeg_backend=None,
+    layout=None,
+    stats=None,
+    image_format="jpeg",
+):
+    """Get the cache key for the arguments of ``array2compressed()``.
+
+    The defaults are resolved, and the arguments that do not affect the result
+    are left out, so that e.g. the frames that a widget sends and the snapshots
+    of these frames share the same entries.
+    """
+    quality = int(quality)
+    nchannels = 1 if array.ndim == 2 else array.shape[2]
+    layout = layout or get_layout(nchannels)
+    if quality < 100:
+        # Lossy, with JPEG as the fallback, and PNG as the last resort
+        if jpeg_backend is None:
+            jpeg_backend = get_default_encoder()
+        elif not isinstance(jpeg_backend, JpegEncoder):
+            jpeg_backend = get_jpeg_encoder(jpeg_backend) or StubJpegEncoder()
+        return fingerprint, quality, image_format, type(jpeg_backend), layout
+    else:
+        # Lossless WebP, or PNG
+        image_format = "webp" if image_format == "webp" else "png"
+        return fingerprint, quality, image_format, png_preset, layout
+
+
+def set_frame_cache_budget(nbytes):
+    """Set the max number of bytes that the cache of encoded frames may use.
+
+    The cache is shared by all widgets in the process, so that identical frames
+    (e.g. shown in multiple widgets, or in a snapshot) are only encoded once.
+    The default budget is 32 MiB. Set to zero to disable the cache.
+    """
+    frame_cache.set_budget(nbytes)
+
+
+def clear_frame_cache():
+    """Remove all encoded frames from the cache."""
+    frame_cache.clear()
+
+
+def get_frame_cache_stats():
+    """Get a dict with stats about the cache of encoded frames.
+
+    The dict has the following fields:
+
+    * *count*: the number of encoded frames in the cache.
+    * *nbytes*: the total size of these frames.
+    * *budget*: the max number of bytes (see ``set_frame_cache_budget()``).
+    * *hits*: the number of times an encoded frame was found in the cache.
+    * *misses*: the number of times a frame had to be encoded.
+    * *evictions*: the number of frames removed to stay within the budget.
+    """
+    return frame_cache.get_stats()
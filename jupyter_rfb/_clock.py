@@ -0,0 +1,38 @@
+from collections import deque
+
+
+class ClockOffsetEstimator:
+    """Estimate the offset between the client's clock and ours, like NTP does.
+
+    We send a ping with our time t0, the client replies with the times at
+    which it received the ping (t1) and sent the reply (t2), and we note the
+    time at which the reply arrived (t3). The offset (client time minus our
+    time) is then ((t1 - t0) + (t2 - t3)) / 2, with an error of at most half
+    the roundtrip delay (t3 - t0) - (t2 - t1). Like NTP, the sample with the
+    smallest delay among the most recent ones is used, since it is the least
+    affected by queueing. Without samples, the clocks are assumed to be synced.
+    """
+
+    def __init__(self, nsamples=8):
+        self._samples = deque(maxlen=nsamples)  # (delay, offset)
+        self.offset = 0.0
+        self.delay = 0.0
+
+    def __len__(self):
+        return len(self._samples)
+
+    @property
+    def is_settled(self):
+        """Whether all samples are collected, so pings can be sent less often."""
+        return len(self._samples) == self._samples.maxlen
+
+    def add_sample(self, t0, t1, t2, t3):
+        """Add a sample from a ping (sent at t0) and its reply (received at t3)."""
+        delay = max(0.0, (t3 - t0) - (t2 - t1))
+        offset = ((t1 - t0) + (t2 - t3)) / 2
+        self._samples.append((delay, offset))
+        self.delay, self.offset = min(self._samples)
+
+    def to_local_time(self, client_time):
+        """Convert a time from the client's clock to ours."""
+        return client_time - self.offset
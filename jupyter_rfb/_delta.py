@@ -0,0 +1,78 @@
+import hashlib
+
+import numpy as np
+
+from ._layout import has_contiguous_rows
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+
+def get_changed_tiles(array1, array2, tile_size=64):
+    """Get a boolean grid indicating which tiles differ between two images.
+
+    Both arrays must have the same shape. The result has shape (ny, nx),
+    with each element representing a tile of tile_size x tile_size pixels.
+    Tiles at the right and bottom edges may be smaller.
+    """
+    if array1.shape != array2.shape:
+        raise ValueError("Arrays to compare must have the same shape.")
+    diff = array1 != array2
+    if diff.ndim == 3:
+        diff = diff.any(axis=2)
+    # Reduce over the rows and then the columns of each tile
+    rows = np.arange(0, diff.shape[0], tile_size)
+    cols = np.arange(0, diff.shape[1], tile_size)
+    diff = np.logical_or.reduceat(diff, rows, axis=0)
+    return np.logical_or.reduceat(diff, cols, axis=1)
+
+
+def get_changed_rects(changed, tile_size, shape):
+    """Turn a grid of changed tiles into a list of rectangles (x, y, w, h).
+
+    Horizontally adjacent changed tiles are merged, to reduce the number of
+    rectangles, and thereby the overhead per encoded image. Rectangles at the
+    edges are clipped to the given image shape.
+    """
+    height, width = shape[:2]
+    rects = []
+    for iy, row in enumerate(changed.tolist()):
+        ix = 0
+        while ix < len(row):
+            if not row[ix]:
+                ix += 1
+                continue
+            ix1 = ix
+            while ix < len(row) and row[ix]:
+                ix += 1
+            x, y = ix1 * tile_size, iy * tile_size
+            w = min(ix * tile_size, width) - x
+            h = min(y + tile_size, height) - y
+            rects.append((x, y, w, h))
+    return rects
+
+
+def get_fingerprint(array, stats=None):
+    """Get a fingerprint (bytes) of the contents of an array, including its shape.
+
+    Uses xxhash if it is installed (``pip install jupyter_rfb[speedups]``),
+    which is about ten times faster than blake2b from the standard library.
+    Strided arrays are hashed row by row. If the pixels in a row are not
+    contiguous, the rows are copied, and 1 is added to the "copies" field of
+    ``stats`` (if it is a dict).
+    """
+    hasher = xxhash.xxh3_128() if xxhash else hashlib.blake2b(digest_size=16)
+    hasher.update(str((array.shape, array.dtype.str)).encode())
+    if array.flags.c_contiguous:
+        hasher.update(array.reshape(-1))
+    elif array.ndim > 1 and has_contiguous_rows(array):
+        for row in array:
+            hasher.update(row)
+    else:
+        for row in array:
+            hasher.update(np.ascontiguousarray(row))
+        if stats is not None:
+            stats["copies"] = stats.get("copies", 0) + 1
+    return hasher.digest()
@@ -0,0 +1,42 @@
+import numpy as np
+
+
+# The types of events that can be coalesced, these are throttled by the client too
+COALESCED_EVENT_TYPES = ("pointer_move", "wheel")
+
+
+def merge_events(event1, event2):
+    """Merge two consecutive events into one, or return None if they cannot be merged.
+
+    Like the client's throttling, pointer_move and wheel events can be merged
+    when their buttons and modifiers match. The merged event has the position of
+    the latest event; for wheel events the deltas are summed.
+    """
+    if event1["type"] != event2["type"] or event2["type"] not in COALESCED_EVENT_TYPES:
+        return None
+    for key in ("buttons", "modifiers"):
+        if tuple(event1.get(key, ())) != tuple(event2.get(key, ())):
+            return None
+    merged = event2.copy()
+    if merged["type"] == "wheel":
+        merged["dx"] = event1.get("dx", 0) + event2.get("dx", 0)
+        merged["dy"] = event1.get("dy", 0) + event2.get("dy", 0)
+    return merged
+
+
+def unpack_event_batch(msg, buffers):
+    """Get the list of events from a batch message sent by the client.
+
+    The client can pack numeric fields of the events into a buffer of float64
+    values, with one row per event and NaN for missing values. These fields
+    are restored, with integer values as int, like they would be via JSON.
+    """
+    events = msg["events"]
+    fields = msg.get("fields", [])
+    if fields and buffers:
+        values = np.frombuffer(buffers[0], "<f8").reshape(len(events), len(fields))
+        for event, row in zip(events, values.tolist()):
+            for key, value in zip(fields, row):
+                if value == value:  # not NaN
+                    event[key] = int(value) if value.is_integer() else value
+    return events
@@ -1,15 +1,61 @@
 import io
+import time
+import threading
+
+import numpy as np
+
+from ._layout import (
+    get_layout,
+    check_layout,
+    select_layout,
+    get_layout_view,
+    has_contiguous_rows,
+    get_row_buffer,
+)
+
+
+# Map pixel layouts to the simplejpeg colorspaces, and the Pillow (mode, rawmode)
+_SIMPLEJPEG_COLORSPACES = {
+    "L": "GRAY",
+    "RGB": "RGB",
+    "BGR": "BGR",
+    "RGBA": "RGBX",
+    "BGRA": "BGRX",
+}
+_PILLOW_MODES = {
+    "L": ("L", "L"),
+    "RGB": ("RGB", "RGB"),
+    "BGR": ("RGB", "BGR"),
+    "RGBA": ("RGB", "RGBX"),
+    "BGRA": ("RGB", "BGRX"),
+}
 
 
 class JpegEncoder:
     """Base JPEG encoder class.
 
     Subclasses must import their dependencies in their __init__,
-    and implement the _encode() method.
+    and implement the _encode() method. They can be registered with
+    :func:`register_jpeg_encoder() <jupyter_rfb.register_jpeg_encoder>`.
+
+    The ``layouts`` attribute lists the pixel layouts that the encoder supports
+    natively: "L" for grayscale (NxM or NxMx1), "RGB" or "BGR" (NxMx3), and "RGBA"
+    or "BGRA" (NxMx4, the 4th channel is ignored). Other layouts are converted
+    before being passed to ``_encode()``, which costs a copy. Similarly, the
+    ``strided_rows`` attribute indicates whether the encoder supports images
+    of which the rows are not contiguous in memory (e.g. a crop of a larger image).
     """
 
-    def encode(self, array, quality):
-        """Encode the array, returning bytes."""
+    layouts = ("L", "RGB")
+    strided_rows = False
+
+    def encode(self, array, quality, layout=None, stats=None):
+        """Encode the array, returning bytes.
+
+        The layout is derived from the number of channels by default (assuming RGB
+        order). If ``stats`` is a dict, the number of copies of the image
+        that had to be made is added to its "copies" field.
+        """
 
         quality = int(quality)
 
@@ -27,47 +73,60 @@ class JpegEncoder:
         if len(shape) == 2:
             shape = (*shape, 1)
             array = array.reshape(shape)
-        if not (len(shape) == 3 and shape[2] in (1, 3)):
+        if not (len(shape) == 3 and shape[2] in (1, 3, 4)):
             raise ValueError(f"Unexpected image shape: {original_shape}")
 
-        return self._encode(array, quality)
-
-    def _encode(self, array, quality):
+        # Check layout
+        if layout is None:
+            layout = get_layout(shape[2])
+        check_layout(layout, shape[2])
+
+        # Convert if the encoder does not support the data as it is
+        copies = 0
+        if layout not in self.layouts:
+            target = select_layout(layout, self.layouts)
+            array, _ = get_layout_view(array, layout, target)
+            array, layout = np.ascontiguousarray(array), target
+            copies += 1
+        elif not array.flags.c_contiguous:
+            if not (self.strided_rows and has_contiguous_rows(array)):
+                array = np.ascontiguousarray(array)
+                copies += 1
+        if stats is not None:
+            stats["copies"] = stats.get("copies", 0) + copies
+
+        return self._encode(array, quality, layout)
+
+    def _encode(self, array, quality, layout):
         raise NotImplementedError()
 
 
 class StubJpegEncoder(JpegEncoder):
     """A stub encoder that returns None."""
 
-    def _encode(self, array, quality):
+    layouts = ("L", "RGB", "BGR", "RGBA", "BGRA")
+    strided_rows = True
+
+    def _encode(self, array, quality, layout):
         return None
 
 
 class SimpleJpegEncoder(JpegEncoder):
     """A JPEG encoder using the simplejpeg library."""
 
+    # Simplejpeg supports all layouts, and strided rows
+    layouts = ("L", "RGB", "BGR", "RGBA", "BGRA")
+    strided_rows = True
+
     def __init__(self):
         import simplejpeg
 
         self.simplejpeg = simplejpeg
 
-    def _encode(self, array, quality):
-        # Simplejpeg requires contiguous data
-        if not array.flags.c_contiguous:
-            array = array.copy()
-
-        # Get appropriate colorspace
-        nchannels = array.shape[2]
-        if nchannels == 1:
-            colorspace = "GRAY"
-            colorsubsampling = "Gray"
-        elif nchannels == 3:
-            colorspace = "RGB"
-            colorsubsampling = "444"
-        elif nchannels == 4:  # no-cover
-            # No alpha in JPEG - transparent pixels become black
-            colorspace = "RGBA"
-            colorsubsampling = "444"
+    def _encode(self, array, quality, layout):
+        # Get appropriate colorspace. No alpha in JPEG, so the 4th channel is ignored.
+        colorspace = _SIMPLEJPEG_COLORSPACES[layout]
+        colorsubsampling = "Gray" if layout == "L" else "444"
 
         # Encode!
         return self.simplejpeg.encode_jpeg(
@@ -82,18 +141,25 @@ class SimpleJpegEncoder(JpegEncoder):
 class PillowJpegEncoder(JpegEncoder):
     """A JPEG encoder using the Pillow library."""
 
+    # Pillow can read all layouts from a buffer, with a given row stride
+    layouts = ("L", "RGB", "BGR", "RGBA", "BGRA")
+    strided_rows = True
+
     def __init__(self):
         import PIL.Image
 
         self.pillow = PIL.Image
 
-    def _encode(self, array, quality):
-        # Pillow likes grayscale as an NxM array (not NxMx1)
-        if len(array.shape) == 3 and array.shape[2] == 1:
-            array = array.reshape(array.shape[:-1])
+    def _encode(self, array, quality, layout):
+        mode, rawmode = _PILLOW_MODES[layout]
+        size = array.shape[1], array.shape[0]
+        stride = array.strides[0]
 
-        # Encode!
-        img_pil = self.pillow.fromarray(array)
+        # Encode! Pillow always unpacks the pixels into its own image memory,
+        # so we use frombytes(), which also works for the last (unpadded) row.
+        img_pil = self.pillow.frombytes(
+            mode, size, get_row_buffer(array), "raw", rawmode, stride, 1
+        )
         f = io.BytesIO()
         img_pil.save(f, format="JPEG", quality=quality)
         return f.getvalue()
@@ -102,16 +168,16 @@ class PillowJpegEncoder(JpegEncoder):
 class OpenCVJpegEncoder(JpegEncoder):
     """A JPEG encoder using the OpenCV library."""
 
+    # OpenCV expects BGR, and ignores the alpha channel
+    layouts = ("L", "BGR", "BGRA")
+    strided_rows = True
+
     def __init__(self):
         import cv2
 
         self.cv2 = cv2
 
-    def _encode(self, array, quality):
-        if len(array.shape) == 3 and array.shape[2] == 3:
-            # Convert RGB to BGR if needed (assume input is RGB)
-            array = self.cv2.cvtColor(array, self.cv2.COLOR_RGB2BGR)
-
+    def _encode(self, array, quality, layout):
         # Encode with the specified quality
         encode_param = [self.cv2.IMWRITE_JPEG_QUALITY, quality]
         success, encoded_image = self.cv2.imencode(".jpg", array, encode_param)
@@ -121,14 +187,153 @@ class OpenCVJpegEncoder(JpegEncoder):
         return encoded_image.tobytes()
 
 
+# The registered encoder classes, in order of preference
+_encoder_classes = {}
+# Encoder instances, and names of encoders that are not available
+_encoder_instances = {}
+_encoder_unavailable = set()
+# The results of calibrate_jpeg_encoder(), the calibrations that run in the
+# background, and a lock to run one benchmark at a time
+_calibration_cache = {}
+_calibration_pending = set()
+_calibration_lock = threading.Lock()
+_benchmark_lock = threading.Lock()
+
+
+def register_jpeg_encoder(name, cls, *, first=False):
+    """Register a JPEG encoder class under the given name.
+
+    The class must be a subclass of ``JpegEncoder``. It is instantiated when
+    first needed; it should raise ImportError if its dependencies are not
+    available. By default, the encoder is the last one to be tried when selecting
+    an encoder automatically. With ``first=True`` it is the first.
+    """
+    global encoder
+    if not (isinstance(cls, type) and issubclass(cls, JpegEncoder)):
+        raise TypeError("A JPEG encoder must be a subclass of JpegEncoder.")
+    _encoder_classes.pop(name, None)
+    _encoder_instances.pop(name, None)
+    _encoder_unavailable.discard(name)
+    with _calibration_lock:
+        _calibration_cache.clear()
+    encoder = None  # select the default encoder again
+    if first:
+        items = list(_encoder_classes.items())
+        _encoder_classes.clear()
+        _encoder_classes[name] = cls
+        _encoder_classes.update(items)
+    else:
+        _encoder_classes[name] = cls
+
+
+def list_jpeg_encoders(available=False):
+    """Get a list of the names of the registered JPEG encoders, in order of preference.
+
+    If ``available`` is True, only list encoders that have their dependencies installed.
+    """
+    if available:
+        return [name for name in _encoder_classes if get_jpeg_encoder(name)]
+    return list(_encoder_classes)
+
+
+def get_jpeg_encoder(name):
+    """Get the encoder instance for the given name, or None if it's not available."""
+    if name not in _encoder_classes:
+        raise ValueError(
+            f"Unknown JPEG encoder {name!r}, options are {list_jpeg_encoders()}"
+        )
+    if name in _encoder_unavailable:
+        return None
+    encoder = _encoder_instances.get(name, None)
+    if encoder is None:
+        try:
+            encoder = _encoder_instances[name] = _encoder_classes[name]()
+        except ImportError:
+            _encoder_unavailable.add(name)
+    return encoder
+
+
+def calibrate_jpeg_encoder(shape, quality=80, layout=None, repeats=3, wait=True):
+    """Get the name of the fastest available JPEG encoder for the given image shape.
+
+    A short micro-benchmark is performed on a synthetic image of the given shape
+    and pixel layout, for each available encoder. This includes the cost of
+    converting the layout if an encoder does not support it natively. The result
+    is cached. The width and height are rounded up to a multiple of 256, and the
+    quality is rounded down to a multiple of 10, so that calibration is not
+    repeated for every small change. Returns None if no encoder is available.
+
+    If ``wait`` is False, the benchmark runs in a background thread, and None is
+    returned until its result is known. Benchmarks run one at a time, so that
+    they do not compete for the CPU.
+    """
+    nchannels = 1 if len(shape) == 2 else shape[2]
+    layout = layout or get_layout(nchannels)
+    shape = (-(-shape[0] // 256) * 256, -(-shape[1] // 256) * 256, nchannels)
+    quality = max(10, int(quality) // 10 * 10)
+    key = shape, layout, quality
+    with _calibration_lock:
+        if key in _calibration_cache:
+            return _calibration_cache[key]
+        if not wait:
+            if key not in _calibration_pending:
+                _calibration_pending.add(key)
+                threading.Thread(
+                    target=_calibrate,
+                    args=(key, repeats),
+                    name="jupyter_rfb_calibration",
+                    daemon=True,
+                ).start()
+            return None
+    return _calibrate(key, repeats)
+
+
+def _calibrate(key, repeats):
+    """Run the benchmark of calibrate_jpeg_encoder(), and cache the result."""
+    with _benchmark_lock:
+        with _calibration_lock:
+            if key in _calibration_cache:
+                _calibration_pending.discard(key)
+                return _calibration_cache[key]
+        shape, layout, quality = key
+        array = _get_synthetic_image(shape)
+        times = {}
+        for name in list_jpeg_encoders(available=True):
+            encoder = get_jpeg_encoder(name)
+            encoder.encode(array, quality, layout)  # warmup
+            t0 = time.perf_counter()
+            for _ in range(repeats):
+                encoder.encode(array, quality, layout)
+            times[name] = time.perf_counter() - t0
+        result = min(times, key=times.get) if times else None
+        with _calibration_lock:
+            _calibration_cache[key] = result
+            _calibration_pending.discard(key)
+    return result
+
+
+def _get_synthetic_image(shape):
+    """Get an image with smooth gradients and some sharp edges."""
+    h, w = shape[:2]
+    nchannels = 1 if len(shape) == 2 else shape[2]
+    y, x = np.mgrid[0:h, 0:w]
+    gradient = (x * 255 // max(w, 1) + y * 255 // max(h, 1)) // 2
+    stripes = ((x // 16 + y // 16) % 2) * 64
+    image = np.empty((h, w, nchannels), np.uint8)
+    for i in range(nchannels):
+        image[:, :, i] = (gradient + stripes * (i + 1)) % 256
+    return image.reshape(shape)
+
+
+register_jpeg_encoder("simplejpeg", SimpleJpegEncoder)  # fast and lean
+register_jpeg_encoder("pillow", PillowJpegEncoder)  # commonly available
+register_jpeg_encoder("opencv", OpenCVJpegEncoder)  # readily installed in conda envs
+
+
 def select_encoder():
-    """Select an encoder."""
+    """Select an encoder: the first registered encoder that is available."""
 
-    for cls in [
-        SimpleJpegEncoder,  # simplejpeg is fast and lean
-        PillowJpegEncoder,  # pillow is commonly available
-        OpenCVJpegEncoder,  # opencv is readily installed in conda environments
-    ]:
+    for cls in _encoder_classes.values():
         try:
             return cls()
         except ImportError:
@@ -137,16 +342,33 @@ def select_encoder():
         return StubJpegEncoder()  # if all else fails
 
 
-encoder = select_encoder()
+# The default encoder. It is selected on first use, because importing the
+# encoder libraries can take a significant amount of time.
+encoder = None
+
+
+def get_default_encoder():
+    """Get the default encoder, selecting it if this has not been done yet."""
+    global encoder
+    if encoder is None:
+        encoder = select_encoder()
+    return encoder
 
 
-def array2jpg(array, quality=90):
+def array2jpg(array, quality=90, backend=None, layout=None, stats=None):
     """Create a JPEG image from a numpy array, with the given quality (percentage).
 
     The provided array's shape must be either NxM (grayscale), NxMx1 (grayscale),
-    or NxMx3 (RGB).
+    NxMx3 (RGB) or NxMx4 (RGBA, the alpha channel is ignored). The layout can
+    be given explicitly to support BGR and BGRA. See ``JpegEncoder.encode()``.
 
-    The encoding is performed be one of multiple possible backends. If
-    no backend is available, None is returned.
+    The encoding is performed be one of multiple possible backends. The backend
+    can be given as a ``JpegEncoder`` instance or the name of a registered encoder.
+    By default the first available encoder is used. If no backend is available,
+    None is returned.
     """
-    return encoder.encode(array, quality)
+    if backend is None:
+        backend = get_default_encoder()
+    elif isinstance(backend, str):
+        backend = get_jpeg_encoder(backend) or StubJpegEncoder()
+    return backend.encode(array, quality, layout, stats)
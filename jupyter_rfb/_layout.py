@@ -0,0 +1,86 @@
+import numpy as np
+
+
+# The channels of each supported pixel layout. The alpha channel of RGBA and
+# BGRA may also be padding (i.e. RGBX and BGRX); it is dropped for JPEG.
+LAYOUTS = ("L", "RGB", "BGR", "RGBA", "BGRA")
+
+
+def get_layout(nchannels, channel_order="RGB"):
+    """Get the layout for an image with the given number of channels and channel order."""
+    if nchannels == 1:
+        return "L"
+    elif nchannels == 3:
+        return channel_order
+    elif nchannels == 4:
+        return channel_order + "A"
+    raise ValueError(f"Unexpected number of channels: {nchannels}")
+
+
+def check_layout(layout, nchannels):
+    """Check that the given layout matches the number of channels."""
+    if layout not in LAYOUTS:
+        raise ValueError(f"Invalid pixel layout {layout!r}, options are {LAYOUTS}")
+    if len(layout) != nchannels:
+        raise ValueError(f"Pixel layout {layout!r} does not have {nchannels} channels")
+
+
+def select_layout(layout, supported):
+    """Select the supported layout that the given layout can best be converted to.
+
+    The alpha channel may be dropped. Raises ValueError if there is no
+    suitable layout (i.e. when converting between grayscale and color).
+    """
+    if layout in supported:
+        return layout
+    elif layout == "L":
+        candidates = []
+    else:
+        # Color layouts, without adding an alpha channel that is not there
+        candidates = [x for x in supported if len(x) == 3 or len(layout) == 4]
+        candidates = [x for x in candidates if x != "L"]
+    if not candidates:
+        raise ValueError(
+            f"Cannot convert pixel layout {layout!r} to any of {supported}"
+        )
+    # Prefer the same channel order, and then keeping the alpha channel
+    candidates.sort(key=lambda x: (x[:3] != layout[:3], len(x) != len(layout)))
+    return candidates[0]
+
+
+def get_layout_view(array, layout, target):
+    """Get a view of the (HxWxC) array in the target layout, or a copy if needed.
+
+    Returns (array, is_copy). Dropping the alpha channel and reversing the
+    channel order can be done with a view.
+    """
+    index = [layout.index(c) for c in target]
+    step = index[1] - index[0] if len(index) > 1 else 1
+    is_progression = step != 0 and all(
+        index[i + 1] - index[i] == step for i in range(len(index) - 1)
+    )
+    if is_progression:
+        stop = index[-1] + step
+        return array[:, :, index[0] : (stop if stop >= 0 else None) : step], False
+    return array[:, :, index], True
+
+
+def has_contiguous_rows(array):
+    """Get whether the pixels of each row are contiguous, though rows may be strided."""
+    itemsize = array.itemsize
+    expected = (array.shape[2] * itemsize, itemsize) if array.ndim == 3 else (itemsize,)
+    return array.strides[0] > 0 and array.strides[1:] == expected
+
+
+def get_row_buffer(array):
+    """Get a 1D view of the memory of an array with contiguous rows.
+
+    This view covers the padding between the rows, so that strided images can
+    be passed to libraries that accept a buffer plus a row stride.
+    """
+    if array.flags.c_contiguous:
+        return array.reshape(-1)
+    nbytes = (array.shape[0] - 1) * array.strides[0] + array[0].nbytes
+    return np.lib.stride_tricks.as_strided(
+        array, shape=(nbytes,), strides=(1,), writeable=False
+    )
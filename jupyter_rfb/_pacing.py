@@ -0,0 +1,41 @@
+import math
+
+
+class FramePacer:
+    """Align draws to a fixed cadence, to limit the frame rate.
+
+    Draws happen on ticks of a grid with the given interval, anchored at the
+    first draw, so that delays of individual draws do not cause drift. A draw
+    that is a bit early (e.g. because of timer jitter) counts as being on the
+    tick. A deadline is missed when a draw was requested, but a tick passed
+    without a draw, e.g. because the client was not ready for a new frame.
+    """
+
+    def __init__(self, max_fps):
+        self.interval = 1 / max_fps
+        self._tolerance = 0.1 * self.interval
+        self._origin = None
+        self._next_tick = 0
+
+    def _get_tick_time(self, tick):
+        return self._origin + tick * self.interval
+
+    def get_delay(self, now):
+        """Get the time (in seconds) until the next draw may happen."""
+        if self._origin is None:
+            return 0
+        return max(0, self._get_tick_time(self._next_tick) - self._tolerance - now)
+
+    def mark_drawn(self, now, request_time=None):
+        """Register a draw, and return the number of missed deadlines."""
+        if self._origin is None:
+            self._origin = now
+        tick = math.floor((now + self._tolerance - self._origin) / self.interval)
+        missed = 0
+        if request_time is not None:
+            # The first tick at or after the request, when a draw was allowed
+            offset = request_time - self._tolerance - self._origin
+            due_tick = max(math.ceil(offset / self.interval), self._next_tick)
+            missed = max(0, tick - due_tick)
+        self._next_tick = tick + 1
+        return missed
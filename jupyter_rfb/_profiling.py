@@ -0,0 +1,110 @@
+import io
+import cProfile
+import pstats
+from collections import deque
+
+
+class ProfilingHook:
+    """Base class for hooks to profile a widget.
+
+    A hook is added to a widget with
+    :func:`.add_profiling_hook() <jupyter_rfb.RemoteFrameBuffer.add_profiling_hook>`.
+    Subclasses can implement any of the methods below, which are called at
+    each stage of a frame (and for each event). All methods are called from the
+    event loop, also when frames are encoded in a worker thread. Durations are
+    in seconds.
+
+    The index of a frame is known once ``get_frame()`` returns an array; the
+    index passed to ``before_get_frame()`` and ``after_get_frame()`` is the index
+    that the frame will get if it is sent.
+    """
+
+    def before_get_frame(self, widget, index):
+        """Called before ``get_frame()``."""
+
+    def after_get_frame(self, widget, index, duration):
+        """Called after ``get_frame()`` returns (or its coroutine is done)."""
+
+    def before_encode(self, widget, index):
+        """Called before the frame is encoded (or submitted to a worker thread)."""
+
+    def after_encode(self, widget, index, duration, mimetype):
+        """Called when the frame is encoded."""
+
+    def before_send(self, widget, index):
+        """Called before the encoded frame is sent to the client."""
+
+    def after_send(self, widget, index, duration, nbytes):
+        """Called after the frame is sent (i.e. queued on the connection)."""
+
+    def on_ack(self, widget, index, latency):
+        """Called when the client confirms a frame, with the time since it was submitted."""
+
+    def before_handle_event(self, widget, event):
+        """Called before ``handle_event()``."""
+
+    def after_handle_event(self, widget, event, duration):
+        """Called after ``handle_event()`` returns (or its coroutine is done)."""
+
+
+class SamplingProfiler(ProfilingHook):
+    """A hook that profiles every nth call to ``get_frame()`` with cProfile.
+
+    The profiles are accumulated, and can be shown with ``print_stats()``.
+    If a budget (in seconds) is given, calls to ``get_frame()`` that take
+    longer are overruns. These are collected in ``overruns``, as tuples
+    (index, duration). If *report* is True, the profile of a sampled call
+    that overran the budget is printed to the widget's output. For an async
+    ``get_frame()``, the profile covers everything that runs in the event loop
+    until the coroutine is done.
+    """
+
+    def __init__(self, every=10, budget=None, report=True):
+        self.every = max(1, int(every))
+        self.budget = budget
+        self.report = report
+        self.overruns = deque(maxlen=1000)
+        self.stats = None
+        self._count = 0
+        self._profile = None
+
+    def before_get_frame(self, widget, index):
+        self._count += 1
+        if self._profile is None and self._count % self.every == 0:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                return  # another profiler is active
+            self._profile = profile
+
+    def after_get_frame(self, widget, index, duration):
+        profile, self._profile = self._profile, None
+        if profile is not None:
+            profile.disable()
+            if self.stats is None:
+                self.stats = pstats.Stats(profile)
+            else:
+                self.stats.add(profile)
+        if self.budget is not None and duration > self.budget:
+            self.overruns.append((index, duration))
+            if profile is not None and self.report:
+                text = f"get_frame() for frame {index} took {duration * 1000:.1f} ms, "
+                text += f"the budget is {self.budget * 1000:.1f} ms.\n"
+                text += get_stats_text(pstats.Stats(profile), limit=10)
+                widget.print(text)
+
+    def print_stats(self, sort="cumulative", limit=20):
+        """Print the accumulated profile of the sampled calls."""
+        if self.stats is None:
+            print("No calls to get_frame() were profiled yet.")
+        else:
+            print(get_stats_text(self.stats, sort, limit))
+
+
+def get_stats_text(stats, sort="cumulative", limit=20):
+    """Get the text of a pstats.Stats object."""
+    stream = io.StringIO()
+    stats.stream = stream
+    stats.sort_stats(sort).print_stats(limit)
+    return stream.getvalue()
@@ -0,0 +1,67 @@
+class QualityController:
+    """A controller that adjusts the (JPEG) quality to stay within a roundtrip budget.
+
+    It is fed the roundtrip time and size of each confirmed frame. When the
+    roundtrip exceeds the budget, the quality is lowered, proportional to the
+    overshoot. When there is room in the budget, the quality is increased in small
+    steps, but only if the larger frames are predicted to fit, based on the
+    observed throughput. After each change, the controller waits for the first
+    frame encoded with the new quality, to avoid oscillation.
+    """
+
+    def __init__(self, min_quality, max_quality):
+        self.min_quality = int(min_quality)
+        self.max_quality = int(max_quality)
+        self.quality = self.max_quality
+        self._roundtrip = None  # exponential moving averages
+        self._throughput = None  # bytes per second
+        self._hold_index = 0
+
+    def set_bounds(self, min_quality, max_quality):
+        """Set the min and max quality, clipping the current quality."""
+        self.min_quality = int(min_quality)
+        self.max_quality = max(int(max_quality), self.min_quality)
+        self.quality = min(max(self.quality, self.min_quality), self.max_quality)
+
+    def update(self, index, roundtrip, nbytes, budget, current_index):
+        """Process the feedback for a frame, and return the new quality.
+
+        The index is that of the confirmed frame, and current_index that of the
+        most recently submitted frame. The roundtrip and budget are in seconds.
+        """
+        # Update the estimates
+        alpha = 0.3
+        if self._roundtrip is None:
+            self._roundtrip = roundtrip
+        else:
+            self._roundtrip = (1 - alpha) * self._roundtrip + alpha * roundtrip
+        throughput = nbytes / max(roundtrip, 1e-6)
+        if self._throughput is None:
+            self._throughput = throughput
+        else:
+            self._throughput = (1 - alpha) * self._throughput + alpha * throughput
+
+        # Wait for the effect of the previous change
+        if index <= self._hold_index or budget <= 0:
+            return self.quality
+
+        quality = self.quality
+        ratio = self._roundtrip / budget
+        if ratio > 1:
+            # Multiplicative decrease, to quickly get within budget
+            step = (quality - self.min_quality) * min(0.5, 1 - 1 / ratio)
+            quality -= max(1, round(step))
+        elif ratio < 0.7:
+            # Additive increase, if the larger frames are expected to fit
+            step = 5 if ratio < 0.35 else 2
+            extra_bytes = nbytes * step / max(quality, 1)
+            predicted = self._roundtrip + extra_bytes / max(self._throughput, 1)
+            if predicted < 0.9 * budget:
+                quality += step
+        quality = min(max(quality, self.min_quality), self.max_quality)
+
+        if quality != self.quality:
+            self.quality = quality
+            self._hold_index = current_index
+            self._roundtrip = None  # start fresh at the new quality
+        return self.quality
@@ -0,0 +1,124 @@
+import zlib
+
+import numpy as np
+
+from ._layout import get_layout, check_layout, get_layout_view
+
+
+# The mimetype for frames consisting of raw RGBA pixels
+RAW_MIMETYPE = "application/x-rgba"
+
+COMPRESSIONS = ("none", "lz4", "deflate")
+
+
+def get_lz4_block():
+    """Get the lz4.block module, or None if it's not installed."""
+    try:
+        import lz4.block
+    except ImportError:
+        return None
+    return lz4.block
+
+
+def array2raw(array, layout=None, compression="none"):
+    """Get the raw RGBA pixels of the array, as a bytes-like object.
+
+    The provided array's shape must be either NxM (grayscale), NxMx1 (grayscale),
+    NxMx3 (RGB) or NxMx4 (RGBA). The layout can be given explicitly to support
+    BGR and BGRA. A contiguous RGBA array only needs to be copied once.
+
+    The pixels can be compressed with "lz4" (a block without the size, the
+    client knows the size from the frame's shape) or "deflate" (zlib level 1).
+    Using "lz4" raises ImportError if the lz4 library is not installed.
+    """
+
+    # Check types
+    if hasattr(array, "shape") and hasattr(array, "dtype"):
+        if array.dtype != "uint8":
+            raise ValueError("Image array to convert to RGBA must be uint8")
+        original_shape = shape = array.shape
+    else:
+        raise ValueError(
+            f"Invalid type for array, need ndarray-like, got {type(array)}"
+        )
+
+    # Check shape
+    if len(shape) == 2:
+        shape = (*shape, 1)
+        array = array.reshape(shape)
+    if not (len(shape) == 3 and shape[2] in (1, 3, 4)):
+        raise ValueError(f"Unexpected image shape: {original_shape}")
+
+    # Check layout
+    if layout is None:
+        layout = get_layout(shape[2])
+    check_layout(layout, shape[2])
+    if compression not in COMPRESSIONS:
+        raise ValueError(
+            f"Invalid compression {compression!r}, options are {COMPRESSIONS}"
+        )
+
+    # Get RGBA pixels
+    if layout == "RGBA" and array.flags.c_contiguous:
+        rgba, is_copy = array, False
+    else:
+        rgba, is_copy = np.empty((shape[0], shape[1], 4), np.uint8), True
+        if layout == "L":
+            rgba[:, :, :3] = array
+        else:
+            rgba[:, :, :3] = get_layout_view(array, layout, "RGB")[0]
+        rgba[:, :, 3] = array[:, :, layout.index("A")] if "A" in layout else 255
+
+    # Compress
+    if compression == "lz4":
+        lz4_block = get_lz4_block()
+        if lz4_block is None:
+            raise ImportError("LZ4 compression requires the lz4 library.")
+        return lz4_block.compress(rgba, store_size=False)
+    elif compression == "deflate":
+        return zlib.compress(rgba, 1)
+    # The array may be modified by the user after get_frame(), so we need a copy
+    return rgba.reshape(-1).data if is_copy else rgba.tobytes()
+
+
+class TransportSelector:
+    """Select whether to send frames raw or encoded, based on measured roundtrips.
+
+    The cost of each transport is measured as the roundtrip time per pixel
+    (an exponential moving average), so that frames of different sizes can be
+    compared. Each transport is tried at first, and the other transport is
+    probed regularly, so that the selection follows changing conditions.
+    """
+
+    probe_interval = 50
+
+    def __init__(self):
+        self._costs = {"encoded": None, "raw": None}
+        self._count = 0
+
+    def select(self):
+        """Get the transport to use for the next frame: "raw" or "encoded"."""
+        self._count += 1
+        for transport, cost in self._costs.items():
+            if cost is None:
+                return transport
+        best = min(self._costs, key=self._costs.get)
+        if self._count % self.probe_interval == 0:
+            return "raw" if best == "encoded" else "encoded"
+        return best
+
+    def update(self, transport, roundtrip, npixels):
+        """Process the feedback for a frame that was sent with the given transport."""
+        cost = roundtrip / max(npixels, 1)
+        previous = self._costs[transport]
+        if previous is None:
+            self._costs[transport] = cost
+        else:
+            self._costs[transport] = 0.7 * previous + 0.3 * cost
+
+    def get_costs(self):
+        """Get a dict with the measured cost (seconds per megapixel) per transport."""
+        return {
+            transport: None if cost is None else cost * 1e6
+            for transport, cost in self._costs.items()
+        }
@@ -0,0 +1,220 @@
+import json
+import mmap
+import os
+import queue
+import struct
+import threading
+
+import numpy as np
+
+
+# A recording starts with this magic, followed by the frames. Each frame has a
+# header (a row of RECORDING_INDEX_DTYPE), and a payload: the message as JSON
+# (without the index and timestamp), followed by its buffers. When the
+# recording is closed, the headers are written again as one array (the index),
+# followed by a footer with the offset of the index, and the number of frames.
+RECORDING_MAGIC = b"RFBREC01"
+RECORDING_INDEX_MAGIC = b"RFBIDX01"
+RECORDING_FOOTER = struct.Struct("<QQ8s")
+
+# The fields of the index. The offset is the position of the payload in the
+# file, the nbytes is the size of the payload, of which meta_size is the JSON.
+# A keyframe does not depend on the previous frame (i.e. is not a delta
+# frame, a video frame between keyframes, or an unchanged frame).
+RECORDING_INDEX_DTYPE = np.dtype(
+    [
+        ("index", "<i8"),
+        ("timestamp", "<f8"),
+        ("offset", "<i8"),
+        ("nbytes", "<i8"),
+        ("meta_size", "<i4"),
+        ("mimetype", "S32"),
+        ("keyframe", "?"),
+    ]
+)
+
+
+def is_keyframe(msg):
+    """Get whether a frame message can be shown without the frames before it."""
+    if msg.get("unchanged") or msg.get("tiles"):
+        return False
+    elif msg.get("mimetype", "").startswith("video/"):
+        return bool(msg.get("keyframe"))
+    return True
+
+
+class FrameRecordingWriter:
+    """Append the frames that a widget sends to a recording file.
+
+    The frames are written in a background thread, so that calling ``write()``
+    only puts the message in a queue. The file (a filename) is created, or
+    overwritten if it exists. If more than *max_pending* bytes are waiting
+    to be written (e.g. because the disk is slow), frames are dropped, and
+    counted in ``dropped_frames``. An error in the background thread is
+    stored in ``error``, after which frames are no longer written.
+    """
+
+    def __init__(self, filename, max_pending=256 * 2**20):
+        self.filename = os.fspath(filename)
+        self.max_pending = int(max_pending)
+        self.frame_count = 0
+        self.dropped_frames = 0
+        self.error = None
+        self._queue = queue.SimpleQueue()
+        self._pending_lock = threading.Lock()
+        self._pending_nbytes = 0
+        self._dropping = False
+        self._file = open(self.filename, "wb")
+        self._file.write(RECORDING_MAGIC)
+        self._thread = threading.Thread(
+            target=self._run, name="jupyter_rfb_recorder", daemon=True
+        )
+        self._thread.start()
+
+    def write(self, msg, buffers):
+        """Add a frame message (as sent to the client) to the recording.
+
+        When a frame is dropped, the frames after it are dropped too, up to the
+        next keyframe, because these depend on it.
+        """
+        if self._thread is None or self.error is not None:
+            return
+        nbytes = sum(memoryview(b).nbytes for b in buffers)
+        with self._pending_lock:
+            if (self._dropping and not is_keyframe(msg)) or (
+                self._pending_nbytes + nbytes > self.max_pending
+            ):
+                self._dropping = True
+                self.dropped_frames += 1
+                return
+            self._dropping = False
+            self._pending_nbytes += nbytes
+        self._queue.put((msg, buffers, nbytes))
+
+    def close(self, wait=True):
+        """Write the pending frames and the index, and close the file."""
+        if self._thread is not None:
+            self._queue.put(None)
+            if wait:
+                self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        headers = []
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                msg, buffers, nbytes = item
+                headers.append(self._write_frame(msg, buffers))
+                self.frame_count += 1
+                with self._pending_lock:
+                    self._pending_nbytes -= nbytes
+            index_offset = self._file.tell()
+            self._file.write(np.array(headers, RECORDING_INDEX_DTYPE).tobytes())
+            footer = (index_offset, len(headers), RECORDING_INDEX_MAGIC)
+            self._file.write(RECORDING_FOOTER.pack(*footer))
+        except Exception as err:
+            self.error = err
+        finally:
+            self._file.close()
+
+    def _write_frame(self, msg, buffers):
+        meta = {k: v for k, v in msg.items() if k not in ("index", "timestamp")}
+        meta["buffer_sizes"] = [memoryview(b).nbytes for b in buffers]
+        meta_bytes = json.dumps(meta).encode()
+        header = np.zeros((), RECORDING_INDEX_DTYPE)
+        header["index"] = msg["index"]
+        header["timestamp"] = msg["timestamp"]
+        header["offset"] = self._file.tell() + RECORDING_INDEX_DTYPE.itemsize
+        header["nbytes"] = len(meta_bytes) + sum(meta["buffer_sizes"])
+        header["meta_size"] = len(meta_bytes)
+        header["mimetype"] = msg.get("mimetype", "").encode()[:32]
+        header["keyframe"] = is_keyframe(msg)
+        self._file.write(header.tobytes())
+        self._file.write(meta_bytes)
+        for buffer in buffers:
+            self._file.write(buffer)
+        return header.item()
+
+
+class FrameRecording:
+    """A recording of the frames that a widget sent, for random access.
+
+    A recording is made with :func:`.start_recording()
+    <jupyter_rfb.RemoteFrameBuffer.start_recording>`. The file is memory-mapped,
+    and so is its index, so opening a large recording is cheap. A recording that
+    was not closed properly (e.g. because the kernel died) can still be read,
+    by scanning the frames. Use ``len(recording)`` to get the number of frames,
+    and ``recording[i]`` to get a frame as a tuple (msg, buffers).
+    """
+
+    def __init__(self, filename):
+        self.filename = os.fspath(filename)
+        with open(self.filename, "rb") as f:
+            if f.read(len(RECORDING_MAGIC)) != RECORDING_MAGIC:
+                raise ValueError(f"Not a frame recording: {self.filename!r}")
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.index = self._read_index()
+
+    def _read_index(self):
+        size = len(self._mmap)
+        if size >= len(RECORDING_MAGIC) + RECORDING_FOOTER.size:
+            footer = self._mmap[size - RECORDING_FOOTER.size :]
+            index_offset, count, magic = RECORDING_FOOTER.unpack(footer)
+            if magic == RECORDING_INDEX_MAGIC:
+                return np.frombuffer(
+                    self._mmap, RECORDING_INDEX_DTYPE, count, index_offset
+                )
+        # No index, scan the frames, up to the first incomplete one
+        headers = []
+        pos = len(RECORDING_MAGIC)
+        header_size = RECORDING_INDEX_DTYPE.itemsize
+        while pos + header_size <= size:
+            header = np.frombuffer(self._mmap, RECORDING_INDEX_DTYPE, 1, pos)[0]
+            if header["offset"] != pos + header_size:
+                break
+            if header["offset"] + header["nbytes"] > size:
+                break
+            headers.append(header.item())
+            pos = int(header["offset"] + header["nbytes"])
+        return np.array(headers, RECORDING_INDEX_DTYPE)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, i):
+        """Get frame i as a tuple (msg, buffers), with the buffers as memoryviews."""
+        entry = self.index[i]
+        offset, meta_size = int(entry["offset"]), int(entry["meta_size"])
+        view = memoryview(self._mmap)
+        msg = json.loads(bytes(view[offset : offset + meta_size]))
+        msg["index"] = int(entry["index"])
+        msg["timestamp"] = float(entry["timestamp"])
+        buffers = []
+        pos = offset + meta_size
+        for nbytes in msg.pop("buffer_sizes"):
+            buffers.append(view[pos : pos + nbytes])
+            pos += nbytes
+        return msg, buffers
+
+    @property
+    def duration(self):
+        """The time between the first and last frame, in seconds."""
+        if len(self.index) < 2:
+            return 0.0
+        return float(self.index["timestamp"][-1] - self.index["timestamp"][0])
+
+    def find_keyframe(self, i):
+        """Get the position of the last keyframe at or before frame i (or 0)."""
+        keyframes = np.flatnonzero(self.index["keyframe"][: i + 1])
+        return int(keyframes[-1]) if len(keyframes) else 0
+
+    def close(self):
+        """Close the file. The frames obtained from the recording become invalid."""
+        self.index = self.index[:0].copy()
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass  # frames are still in use, the mmap is closed when they're gone
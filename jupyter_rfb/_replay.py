@@ -0,0 +1,184 @@
+import asyncio
+import time
+
+from traitlets import Bool, Float
+
+from ._recording import FrameRecording
+from .widget import RemoteFrameBuffer
+
+
+class RecordingPlayer(RemoteFrameBuffer):
+    """A widget that plays back a recording of the frames that a widget sent.
+
+    The recorded frames are sent as they are, so they are not rendered or
+    encoded again. The frames are sent at the times they were recorded, divided
+    by ``speed``. Like a normal widget, no more than ``max_buffered_frames``
+    frames are in flight; if the client cannot keep up, playback slows down
+    rather than dropping frames (which could be the base of the delta frames
+    that follow). When the client asks for a keyframe, the frames since the
+    last keyframe are sent again, without waiting for their time.
+
+    The recording is a :class:`FrameRecording <jupyter_rfb.FrameRecording>`
+    or a filename. Playing starts right away, unless ``autoplay`` is False.
+    """
+
+    speed = Float(1.0, min=0.001)
+    repeat = Bool(False)
+
+    def __init__(self, recording, *, autoplay=True, **kwargs):
+        super().__init__(**kwargs)
+        if not isinstance(recording, FrameRecording):
+            recording = FrameRecording(recording)
+        self.recording = recording
+        self._rfb_playing = False
+        self._rfb_play_position = 0
+        self._rfb_play_anchor = None  # (loop time, recorded time)
+        self._rfb_play_timer = None
+        self._rfb_play_waiting = None  # the due time of the frame that waits
+        self._rfb_play_catchup = 0  # frames before this are sent without delay
+        self.observe(
+            self._rfb_play_on_feedback, names=["_frame_feedback", "_has_visible_views"]
+        )
+        self.observe(self._rfb_play_reanchor, names=["speed"])
+        if autoplay:
+            try:
+                self.play()
+            except RuntimeError:
+                pass  # no event loop
+
+    @property
+    def position(self):
+        """The position (in the recording) of the next frame to play."""
+        return self._rfb_play_position
+
+    @property
+    def is_playing(self):
+        """Whether the recording is being played."""
+        return self._rfb_playing
+
+    def play(self):
+        """Start playing, from the current position.
+
+        At the end of the recording, playing stops, or starts over if ``repeat``
+        is set. Playing again after the end starts over too.
+        """
+        if self._rfb_playing:
+            return
+        loop = asyncio.get_running_loop()
+        if self._rfb_play_position >= len(self.recording):
+            self._rfb_play_position = 0
+        self._rfb_playing = True
+        self._rfb_play_reanchor()
+        if self._rfb_play_timer is None and self._rfb_play_waiting is None:
+            self._rfb_play_timer = loop.call_soon(self._rfb_play_next)
+
+    def pause(self):
+        """Stop playing, at the current position."""
+        self._rfb_playing = False
+        if self._rfb_is_catching_up():
+            return  # the client still needs the frames up to the position
+        self._rfb_play_waiting = None
+        if self._rfb_play_timer is not None:
+            self._rfb_play_timer.cancel()
+            self._rfb_play_timer = None
+
+    def seek(self, position):
+        """Set the position of the next frame to play.
+
+        Delta frames and video frames depend on the frames before them, so the
+        position is moved back to the nearest frame that can be shown on its own.
+        """
+        n = len(self.recording)
+        position = max(0, min(int(position), n - 1))
+        self._rfb_play_position = self.recording.find_keyframe(position)
+        self._rfb_play_catchup = 0
+        if self._rfb_playing:
+            self.pause()
+            self.play()
+
+    def close(self, *args, **kwargs):
+        """Stop playing, and close all views of the widget."""
+        self._rfb_play_catchup = 0
+        self.pause()
+        super().close(*args, **kwargs)
+
+    def _rfb_on_keyframe_request(self):
+        """Send the frames again from the keyframe before the current position."""
+        position = self._rfb_play_position
+        if position == 0:
+            return
+        self._rfb_play_catchup = max(self._rfb_play_catchup, position)
+        self._rfb_play_position = self.recording.find_keyframe(position - 1)
+        if self._rfb_play_waiting is None:
+            if self._rfb_play_timer is not None:
+                self._rfb_play_timer.cancel()
+            loop = asyncio.get_running_loop()
+            self._rfb_play_timer = loop.call_soon(self._rfb_play_next)
+
+    def _rfb_is_catching_up(self):
+        return self._rfb_play_position < self._rfb_play_catchup
+
+    def _rfb_play_reanchor(self, *args):
+        """Let the frame at the current position be due now."""
+        if self._rfb_play_position < len(self.recording):
+            timestamp = self.recording.index["timestamp"][self._rfb_play_position]
+            loop_time = asyncio.get_running_loop().time()
+            self._rfb_play_anchor = loop_time, float(timestamp)
+
+    def _rfb_play_next(self):
+        """Send the next frame when it is due, and the client is ready for it."""
+        self._rfb_play_timer = None
+        catching_up = self._rfb_is_catching_up()
+        if not (self._rfb_playing or catching_up):
+            return
+        loop = asyncio.get_running_loop()
+        if self._rfb_play_position >= len(self.recording):
+            if self.repeat and len(self.recording):
+                self._rfb_play_position = 0
+                self._rfb_play_reanchor()
+            else:
+                self._rfb_playing = False
+                return
+        # Wait until the frame is due, unless the client lost it before
+        position = self._rfb_play_position
+        now = loop.time()
+        if catching_up:
+            due = now
+        else:
+            loop_time, recorded_time = self._rfb_play_anchor
+            timestamp = float(self.recording.index["timestamp"][position])
+            due = loop_time + (timestamp - recorded_time) / self.speed
+        if due > now:
+            self._rfb_play_timer = loop.call_at(due, self._rfb_play_next)
+            return
+        # Wait for the client, see _rfb_play_on_feedback()
+        frames_in_flight = self._rfb_frame_index - self._frame_feedback.get("index", 0)
+        if frames_in_flight >= self.max_buffered_frames or not self._has_visible_views:
+            self._rfb_play_waiting = due
+            return
+        # Send the frame, with a new index and timestamp
+        msg, buffers = self.recording[position]
+        self._rfb_frame_index += 1
+        self._rfb_last_sent_index = self._rfb_frame_index
+        msg["index"] = self._rfb_frame_index
+        msg["timestamp"] = time.time()
+        self.send(msg, buffers)
+        self._rfb_play_position += 1
+        if catching_up and not self._rfb_is_catching_up():
+            if not self._rfb_playing:
+                return
+            self._rfb_play_reanchor()
+        self._rfb_play_timer = loop.call_soon(self._rfb_play_next)
+
+    def _rfb_play_on_feedback(self, *args):
+        """Continue playing when the client is ready for a new frame."""
+        due, self._rfb_play_waiting = self._rfb_play_waiting, None
+        if due is None or not (self._rfb_playing or self._rfb_is_catching_up()):
+            return
+        # Shift the timeline, so that the frames after the wait are not rushed
+        if self._rfb_play_anchor is not None:
+            loop = asyncio.get_running_loop()
+            loop_time, recorded_time = self._rfb_play_anchor
+            shift = max(0, loop.time() - due)
+            self._rfb_play_anchor = loop_time + shift, recorded_time
+        self._rfb_play_next()
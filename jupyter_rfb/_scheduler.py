@@ -0,0 +1,262 @@
+import asyncio
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+
+class FrameScheduler:
+    """Arbitrate the draws of all widgets in the kernel.
+
+    Each frame that a widget sends consumes from a budget of bandwidth (bytes
+    per second) and encode load (seconds of encoding per second), which is
+    replenished over time. A budget can accumulate up to *burst_time* seconds
+    worth, and may go into debt. While it is in debt, draws are deferred, and
+    when it recovers the waiting widgets are woken, highest priority first. The
+    priority is the time that a widget has been waiting, plus a boost for
+    widgets that are visible, and for widgets that recently had user input.
+    Because the waiting time keeps increasing, no widget is starved.
+
+    Optionally, the widgets share one pool of threads to encode frames in.
+    """
+
+    # The max time (in seconds) that a budget can accumulate
+    burst_time = 0.1
+    # The priority boost (in seconds of waiting) for visible widgets, and for
+    # widgets that had input within the last interaction_time seconds.
+    visible_boost = 0.5
+    interaction_boost = 1.0
+    interaction_time = 2.0
+
+    def __init__(self, max_bandwidth=0, max_encode_load=0, encoder_threads=0):
+        self.max_bandwidth = float(max_bandwidth)
+        self.max_encode_load = float(max_encode_load)
+        self.encoder_threads = int(encoder_threads)
+        self._bandwidth_tokens = self.max_bandwidth * self.burst_time
+        self._encode_tokens = self.max_encode_load * self.burst_time
+        self._last_refill = None
+        self._allocations = weakref.WeakKeyDictionary()
+        self._waiting = weakref.WeakKeyDictionary()  # widget -> start of wait
+        self._woken = weakref.WeakKeyDictionary()
+        self._pool = None
+        self._timer = None
+
+    def _get_allocation(self, widget):
+        allocation = self._allocations.get(widget, None)
+        if allocation is None:
+            allocation = {
+                "frames": 0,
+                "nbytes": 0,
+                "encoding_time": 0.0,
+                "deferred_draws": 0,
+            }
+            self._allocations[widget] = allocation
+        return allocation
+
+    def _refill(self, now):
+        if self._last_refill is not None:
+            elapsed = max(0, now - self._last_refill)
+            self._bandwidth_tokens = min(
+                self.max_bandwidth * self.burst_time,
+                self._bandwidth_tokens + self.max_bandwidth * elapsed,
+            )
+            self._encode_tokens = min(
+                self.max_encode_load * self.burst_time,
+                self._encode_tokens + self.max_encode_load * elapsed,
+            )
+        self._last_refill = now
+
+    def get_delay(self, now=None):
+        """Get the time (in seconds) until the budget is out of debt."""
+        now = time.perf_counter() if now is None else now
+        self._refill(now)
+        delay = 0
+        if self.max_bandwidth > 0 and self._bandwidth_tokens < 0:
+            delay = max(delay, -self._bandwidth_tokens / self.max_bandwidth)
+        if self.max_encode_load > 0 and self._encode_tokens < 0:
+            delay = max(delay, -self._encode_tokens / self.max_encode_load)
+        return delay
+
+    def get_priority(self, widget, now=None):
+        """Get the priority of a widget to draw."""
+        now = time.perf_counter() if now is None else now
+        priority = now - self._waiting.get(widget, now)
+        if widget._has_visible_views:
+            priority += self.visible_boost
+        if now - widget._rfb_last_input_time < self.interaction_time:
+            priority += self.interaction_boost
+        return priority
+
+    def request_draw(self, widget, now=None):
+        """Get whether the widget may draw now. If not, it is woken up later."""
+        now = time.perf_counter() if now is None else now
+        allocation = self._get_allocation(widget)
+        delay = self.get_delay(now)
+        if delay <= 0:
+            self._waiting.pop(widget, None)
+            return True
+        if widget not in self._waiting:
+            self._waiting[widget] = self._woken.pop(widget, now)
+        allocation["deferred_draws"] += 1
+        self._schedule_wakeup(delay)
+        return False
+
+    def frame_sent(self, widget, nbytes, encoding_time, now=None):
+        """Register a frame that is sent, consuming from the budget."""
+        now = time.perf_counter() if now is None else now
+        self._refill(now)
+        self._bandwidth_tokens -= nbytes
+        self._encode_tokens -= encoding_time
+        allocation = self._get_allocation(widget)
+        allocation["frames"] += 1
+        allocation["nbytes"] += nbytes
+        allocation["encoding_time"] += encoding_time
+
+    def remove(self, widget):
+        """Stop tracking the given widget, e.g. because it is closed."""
+        self._allocations.pop(widget, None)
+        self._waiting.pop(widget, None)
+        self._woken.pop(widget, None)
+
+    def _schedule_wakeup(self, delay):
+        if self._timer is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._timer = loop.call_later(delay, self._wakeup)
+
+    def _wakeup(self):
+        """Let the waiting widgets try to draw again, highest priority first.
+
+        The widgets that cannot draw yet start waiting again, with their
+        original start time, so that their priority keeps increasing.
+        """
+        self._timer = None
+        now = time.perf_counter()
+        delay = self.get_delay(now)
+        if delay > 0:
+            self._schedule_wakeup(delay)
+            return
+        widgets = sorted(
+            self._waiting.keys(),
+            key=lambda widget: self.get_priority(widget, now),
+            reverse=True,
+        )
+        self._woken = self._waiting
+        self._waiting = weakref.WeakKeyDictionary()
+        for widget in widgets:
+            widget._rfb_schedule_maybe_draw()
+
+    def get_encoder_pool(self):
+        """Get the shared pool to encode frames in, or None."""
+        if self.encoder_threads <= 0:
+            return None
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(
+                self.encoder_threads, thread_name_prefix="jupyter_rfb_scheduler"
+            )
+        return self._pool
+
+    def shutdown(self):
+        """Stop the wakeup timer and the encoder pool."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+        # Widgets that are waiting can draw right away now
+        for widget in list(self._waiting.keys()):
+            widget._rfb_schedule_maybe_draw()
+        self._waiting.clear()
+
+    def get_stats(self):
+        """Get a dict with the budget and the allocation of each widget."""
+        now = time.perf_counter()
+        allocations = list(self._allocations.items())
+        total_nbytes = sum(a["nbytes"] for _, a in allocations) or 1
+        total_encoding_time = sum(a["encoding_time"] for _, a in allocations) or 1
+        widgets = []
+        for widget, allocation in allocations:
+            widgets.append(
+                {
+                    "widget": widget,
+                    **allocation,
+                    "bandwidth_share": allocation["nbytes"] / total_nbytes,
+                    "encode_share": allocation["encoding_time"] / total_encoding_time,
+                    "waiting": widget in self._waiting,
+                    "priority": self.get_priority(widget, now),
+                }
+            )
+        return {
+            "max_bandwidth": self.max_bandwidth,
+            "max_encode_load": self.max_encode_load,
+            "encoder_threads": self.encoder_threads,
+            "delay": self.get_delay(now),
+            "widgets": widgets,
+        }
+
+
+# The scheduler, or None when disabled
+frame_scheduler = None
+
+
+def get_frame_scheduler():
+    """Get the kernel-wide frame scheduler, or None if it's not enabled."""
+    return frame_scheduler
+
+
+def enable_frame_scheduler(max_bandwidth=0, max_encode_load=0, encoder_threads=0):
+    """Enable a scheduler that arbitrates the draws of all widgets in the kernel.
+
+    Each widget normally draws as fast as its client can keep up. With many
+    widgets, these compete for the event loop and the connection to the browser.
+    The scheduler enforces a budget that is shared by all widgets:
+
+    * *max_bandwidth*: the max number of bytes per second to send. Default 0 (no limit).
+    * *max_encode_load*: the max time spent encoding, in seconds per second (i.e.
+      1.0 is one CPU core). Default 0 (no limit).
+    * *encoder_threads*: the number of threads in an encoder pool that is shared by
+      all widgets. Default 0, meaning that each widget uses its own
+      *encoder_threads* setting.
+
+    When the budget is used up, draws are deferred until there is room again.
+    Then widgets that are visible and that recently had user input go first,
+    but widgets that have been waiting longer gain priority, so no widget is
+    starved. Calling this function again replaces the scheduler.
+    """
+    global frame_scheduler
+    disable_frame_scheduler()
+    frame_scheduler = FrameScheduler(max_bandwidth, max_encode_load, encoder_threads)
+
+
+def disable_frame_scheduler():
+    """Disable the frame scheduler, so that each widget draws independently."""
+    global frame_scheduler
+    scheduler, frame_scheduler = frame_scheduler, None
+    if scheduler is not None:
+        scheduler.shutdown()
+
+
+def get_frame_scheduler_stats():
+    """Get a dict with stats about the frame scheduler, or None if it's not enabled.
+
+    The dict has the fields *max_bandwidth*, *max_encode_load* and *encoder_threads*
+    (see ``enable_frame_scheduler()``), *delay* (the time until draws are allowed
+    again) and *widgets*: a list with a dict for each widget that drew since the
+    scheduler was enabled, with the following fields:
+
+    * *widget*: the widget object.
+    * *frames*: the number of frames sent.
+    * *nbytes*: the number of bytes sent.
+    * *encoding_time*: the total time spent encoding its frames.
+    * *deferred_draws*: the number of times a draw was deferred.
+    * *bandwidth_share*: the fraction of all bytes sent by this widget.
+    * *encode_share*: the fraction of the total encoding time for this widget.
+    * *waiting*: whether the widget is waiting to draw.
+    * *priority*: the current priority of the widget.
+    """
+    if frame_scheduler is None:
+        return None
+    return frame_scheduler.get_stats()
@@ -0,0 +1,137 @@
+import os
+
+from ._cache import array2compressed_cached
+from ._delta import get_fingerprint
+
+
+SNAPSHOT_MIMETYPES = {
+    "png": "image/png",
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+    "avif": "image/avif",
+}
+
+SNAPSHOT_EXTENSIONS = {
+    ".png": "png",
+    ".jpg": "jpeg",
+    ".jpeg": "jpeg",
+    ".webp": "webp",
+    ".avif": "avif",
+}
+
+
+def check_snapshot_format(format, quality=None, lossy_quality=80):
+    """Check the format and quality of a snapshot, and return them normalized.
+
+    PNG is always lossless. WebP is lossless when the quality is 100, which
+    is the default. JPEG and AVIF are lossy, so their quality must be below
+    100, and defaults to lossy_quality (capped at 99).
+    """
+    format = format.lower()
+    if format == "jpg":
+        format = "jpeg"
+    if format not in SNAPSHOT_MIMETYPES:
+        formats = ", ".join(repr(x) for x in SNAPSHOT_MIMETYPES)
+        raise ValueError(f"Invalid snapshot format {format!r}, expected {formats}.")
+    if format == "png":
+        quality = 100
+    elif quality is None:
+        quality = 100 if format == "webp" else min(int(lossy_quality), 99)
+    quality = int(quality)
+    if not 1 <= quality <= 100:
+        raise ValueError(f"The quality must be between 1 and 100, not {quality}.")
+    if quality == 100 and format in ("jpeg", "avif"):
+        raise ValueError(f"Snapshots in {format} format cannot be lossless.")
+    return format, quality
+
+
+def get_snapshot_format(file):
+    """Get the snapshot format from the extension of a filename, default 'png'."""
+    filename = getattr(file, "name", file)
+    if not isinstance(filename, (str, os.PathLike)):
+        return "png"
+    ext = os.path.splitext(os.fspath(filename))[1].lower()
+    return SNAPSHOT_EXTENSIONS.get(ext, "png")
+
+
+def encode_snapshot(array, layout, format, quality, last_image=None):
+    """Encode the image of a snapshot, and return the bytes.
+
+    The last_image is a tuple (fingerprint, mimetype, quality, data) of the
+    image that was last sent to the client. If it has the same contents,
+    format and quality, its data is reused. Otherwise the image is encoded,
+    via the shared frame cache. This function can be called from any thread.
+    """
+    mimetype = SNAPSHOT_MIMETYPES[format]
+    fingerprint = get_fingerprint(array)
+    if last_image is not None and last_image[:3] == (fingerprint, mimetype, quality):
+        return last_image[3]
+    image_format = format if format in ("webp", "avif") else "jpeg"
+    result_mimetype, data = array2compressed_cached(
+        array, fingerprint, quality, layout=layout, image_format=image_format
+    )
+    if result_mimetype != mimetype:
+        raise RuntimeError(
+            f"Cannot encode a snapshot in {format} format, because no encoder is "
+            + "available. Install pillow (or simplejpeg for JPEG)."
+        )
+    return data
+
+
+def write_bytes(file, data):
+    """Write bytes to a file, given as a filename or file object."""
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, "wb") as f:
+            f.write(data)
+    else:
+        file.write(data)
+
+
+def _run_in_pool(func, args, widgets):
+    """Call func for each item in args, and return the results.
+
+    The calls run in the encoder pool of the widgets (the pool of the frame
+    scheduler, or the first widget's own pool), or one by one if there is none.
+    """
+    pool = None
+    if len(args) > 1:
+        pool = next(filter(None, (w._rfb_get_thread_pool() for w in widgets)), None)
+    if pool is None:
+        return [func(*a) for a in args]
+    return list(pool.map(lambda a: func(*a), args))
+
+
+def get_snapshots(widgets, format="png", quality=None):
+    """Get images of the current frames of multiple widgets, as a list of bytes.
+
+    This is like calling ``widget.get_snapshot()`` for each widget, but the
+    frames are encoded concurrently (the encoders release the GIL), in the
+    encoder pool of the frame scheduler, or of the widgets (see
+    ``encoder_threads``). The frames are rendered (if needed) one by one,
+    because ``get_frame()`` must run in the main thread.
+    """
+    widgets = list(widgets)
+    jobs = [widget._rfb_prepare_snapshot(format, quality) for widget in widgets]
+    return _run_in_pool(encode_snapshot, jobs, widgets)
+
+
+def save_snapshots(widgets, files, format=None, quality=None):
+    """Save images of the current frames of multiple widgets to files.
+
+    This is like calling ``widget.save_snapshot(file)`` for each pair of widget
+    and file (a filename or file object), but the frames are encoded and written
+    concurrently, like in :func:`get_snapshots`. If *format* is None, it is
+    derived from the extension of each filename.
+    """
+    widgets, files = list(widgets), list(files)
+    if len(widgets) != len(files):
+        raise ValueError("save_snapshots() needs as many files as widgets.")
+
+    def save(file, *job):
+        write_bytes(file, encode_snapshot(*job))
+
+    jobs = []
+    for widget, file in zip(widgets, files):
+        job = widget._rfb_prepare_snapshot(format or get_snapshot_format(file), quality)
+        jobs.append((file, *job))
+    _run_in_pool(save, jobs, widgets)
@@ -0,0 +1,130 @@
+import csv
+from collections import deque
+
+import numpy as np
+
+
+# The fields of a frame record. Times are in seconds, the timestamp is the
+# (wall clock) time at which the frame was submitted. Times that are not known
+# (e.g. the render time of a frame passed to send_frame()) are NaN.
+FRAME_RECORD_DTYPE = np.dtype(
+    [
+        ("index", "i8"),
+        ("timestamp", "f8"),
+        ("render_time", "f8"),
+        ("encoding_time", "f8"),
+        ("nbytes", "i8"),
+        ("mimetype", "U32"),
+        ("in_flight", "i4"),
+        ("ack_latency", "f8"),
+        ("lossless", "?"),
+    ]
+)
+
+# The fields to calculate percentiles for
+PERCENTILE_FIELDS = ("render_time", "encoding_time", "nbytes", "ack_latency")
+
+
+class FrameRecorder:
+    """A fixed-size ring of per-frame records.
+
+    Adding a record writes a row into a preallocated structured array, so
+    that the recorder is cheap enough to always be on. When the ring is full,
+    the oldest records are overwritten. A record's ack latency is filled in
+    when the client confirms the frame (or a later frame).
+    """
+
+    def __init__(self, size=1024):
+        self._records = np.zeros(size, FRAME_RECORD_DTYPE)
+        self._count = 0
+        self._unacked = deque(maxlen=size)  # (index, record number)
+
+    def __len__(self):
+        return min(self._count, len(self._records))
+
+    def add(
+        self,
+        index,
+        timestamp,
+        render_time,
+        encoding_time,
+        nbytes,
+        mimetype,
+        in_flight,
+        lossless,
+    ):
+        """Add the record of a frame that is sent."""
+        pos = self._count % len(self._records)
+        self._records[pos] = (
+            index,
+            timestamp,
+            render_time,
+            encoding_time,
+            nbytes,
+            mimetype,
+            in_flight,
+            np.nan,
+            lossless,
+        )
+        self._count += 1
+        self._unacked.append((index, self._count))
+
+    def acknowledge(self, index, now):
+        """Set the ack latency of the frames up to (and including) the given index."""
+        size = len(self._records)
+        while self._unacked and self._unacked[0][0] <= index:
+            _, number = self._unacked.popleft()
+            if self._count - number < size:  # not overwritten
+                pos = (number - 1) % size
+                latency = now - self._records["timestamp"][pos]
+                self._records["ack_latency"][pos] = latency
+
+    def clear(self):
+        """Remove all records."""
+        self._count = 0
+        self._unacked.clear()
+
+    def get_records(self):
+        """Get a copy of the records as a structured array, oldest first."""
+        size = len(self._records)
+        if self._count <= size:
+            return self._records[: self._count].copy()
+        pos = self._count % size
+        return np.concatenate([self._records[pos:], self._records[:pos]])
+
+    def get_summary(self):
+        """Get the percentiles (p50, p95, p99) of the main fields, and the throughput.
+
+        Returns a tuple (percentiles, throughput), with percentiles a dict that
+        maps field names to a tuple of three values, and the throughput in bytes
+        per second, measured over the records in the ring.
+        """
+        records = self.get_records()
+        percentiles = {}
+        for name in PERCENTILE_FIELDS:
+            values = records[name]
+            if values.dtype.kind == "f":
+                values = values[~np.isnan(values)]
+            if len(values):
+                p = np.percentile(values, (50, 95, 99))
+                percentiles[name] = tuple(float(x) for x in p)
+            else:
+                percentiles[name] = (0.0, 0.0, 0.0)
+        throughput = 0.0
+        if len(records) > 1:
+            duration = records["timestamp"][-1] - records["timestamp"][0]
+            if duration > 0:
+                # The bytes of the last frame are sent after the duration
+                throughput = float(records["nbytes"][:-1].sum() / duration)
+        return percentiles, throughput
+
+
+def save_records_csv(records, file):
+    """Write frame records to a CSV file, given as a filename or file object."""
+    if isinstance(file, str) or hasattr(file, "__fspath__"):
+        with open(file, "w", newline="") as f:
+            save_records_csv(records, f)
+        return
+    writer = csv.writer(file)
+    writer.writerow(records.dtype.names)
+    writer.writerows(records.tolist())
@@ -6,31 +6,64 @@ import ipywidgets
 
 from ._png import array2png
 from ._jpg import array2jpg
+from ._webp import array2webp, array2avif
 
 
 _original_print = builtins.print
 
 
-def array2compressed(array, quality=90):
+def array2compressed(
+    array,
+    quality=90,
+    png_preset="default",
+    jpeg_backend=None,
+    layout=None,
+    stats=None,
+    image_format="jpeg",
+):
     """Convert the given image (a numpy array) as a compressed array.
 
     If the quality is 100, a PNG is returned. Otherwise, JPEG is
     preferred and PNG is used as a fallback. Returns (mimetype, bytes).
+    The png_preset is used to trade speed for size (see ``array2png()``).
+    The jpeg_backend can be used to select the JPEG encoder (see ``array2jpg()``).
+    The layout can be given to support BGR(A) data (e.g. "RGB", "BGRA").
+    If stats is a dict, the number of copies made of the image is added to it.
+
+    The image_format can be set to "webp" to use lossy WebP instead of JPEG,
+    and lossless WebP instead of PNG. With "avif", lossy AVIF is used instead
+    of JPEG. WebP and AVIF preserve the alpha channel. If these formats are not
+    available, JPEG and PNG are used instead.
     """
 
-    # Drop alpha channel if there is one
+    if quality < 100:
+        result = None
+        if image_format == "webp":
+            mimetype = "image/webp"
+            result = array2webp(array, quality, layout=layout)
+        elif image_format == "avif":
+            mimetype = "image/avif"
+            result = array2avif(array, quality, layout=layout)
+        if result is None:
+            # The JPEG encoders ignore the alpha channel
+            mimetype = "image/jpeg"
+            result = array2jpg(array, quality, jpeg_backend, layout, stats)
+        if result is not None:
+            return mimetype, result
+        png_preset = "fast"
+    elif image_format == "webp":
+        mimetype = "image/webp"
+        result = array2webp(array, lossless=True, preset=png_preset, layout=layout)
+        if result is not None:
+            return mimetype, result
+
+    # Drop alpha channel if there is one (this is a view)
     if len(array.shape) == 3 and array.shape[2] == 4:
+        layout = layout[:3] if layout else None
         array = array[:, :, :3]
 
-    if quality >= 100:
-        mimetype = "image/png"
-        result = array2png(array)
-    else:
-        mimetype = "image/jpeg"
-        result = array2jpg(array, quality)
-        if result is None:
-            mimetype = "image/png"
-            result = array2png(array)
+    mimetype = "image/png"
+    result = array2png(array, preset=png_preset, layout=layout)
 
     return mimetype, result
 
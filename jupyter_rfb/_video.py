@@ -0,0 +1,115 @@
+from fractions import Fraction
+
+import numpy as np
+
+from ._layout import get_layout, check_layout
+
+
+# The supported codecs: the name of the ffmpeg encoder, and its options for low latency.
+# The codec strings for the browser's VideoDecoder are defined in the frontend.
+VIDEO_CODECS = {
+    "h264": (
+        "libx264",
+        {"preset": "ultrafast", "tune": "zerolatency", "profile": "baseline"},
+    ),
+    "vp9": (
+        "libvpx-vp9",
+        {"deadline": "realtime", "cpu-used": "8", "lag-in-frames": "0", "row-mt": "1"},
+    ),
+}
+
+_PIXEL_FORMATS = {
+    "L": "gray",
+    "RGB": "rgb24",
+    "BGR": "bgr24",
+    "RGBA": "rgba",
+    "BGRA": "bgra",
+}
+
+
+def get_av():
+    """Get the PyAV module, or None if it's not installed."""
+    try:
+        import av
+    except ImportError:
+        return None
+    return av
+
+
+def quality_to_crf(codec, quality):
+    """Map a JPEG-like quality (1-100) to the constant rate factor of the codec.
+
+    The default quality of 80 maps to about the default CRF of each encoder.
+    """
+    if codec == "vp9":
+        return min(63, round(15 + (100 - quality) * 0.6))
+    return min(51, round(12 + (100 - quality) * 0.5))
+
+
+class VideoEncoder:
+    """Encode successive frames into a video stream, using PyAV.
+
+    Frames are encoded without delay: each call to ``encode()`` returns the
+    data for that frame. The first frame is a keyframe; later frames are only
+    keyframes when requested. Each encoder has a fixed size and quality, so
+    a new encoder (and thus a keyframe) is needed when these change. Frames
+    with an odd width or height are padded, because the encoders use 4:2:0
+    chroma subsampling. The alpha channel is dropped.
+    """
+
+    def __init__(self, codec, shape, quality):
+        av = get_av()
+        if av is None:
+            raise ImportError("Video encoding requires the av (PyAV) library.")
+        if codec not in VIDEO_CODECS:
+            raise ValueError(
+                f"Invalid video codec {codec!r}, options are {tuple(VIDEO_CODECS)}"
+            )
+        self.codec = codec
+        self.shape = tuple(shape[:2])
+        self.quality = int(quality)
+        self._av = av
+        self._count = 0
+
+        encoder_name, options = VIDEO_CODECS[codec]
+        ctx = av.CodecContext.create(encoder_name, "w")
+        ctx.width = self.shape[1] + self.shape[1] % 2
+        ctx.height = self.shape[0] + self.shape[0] % 2
+        ctx.pix_fmt = "yuv420p"
+        ctx.time_base = Fraction(1, 1000)
+        ctx.max_b_frames = 0
+        ctx.options = {**options, "crf": str(quality_to_crf(codec, quality))}
+        ctx.open()
+        self._ctx = ctx
+
+    def encode(self, array, layout=None, keyframe=False):
+        """Encode the array and return (data, is_keyframe)."""
+        if array.ndim == 2:
+            array = array.reshape(*array.shape, 1)
+        if layout is None:
+            layout = get_layout(array.shape[2])
+        check_layout(layout, array.shape[2])
+        if array.shape[:2] != self.shape:
+            raise ValueError(
+                f"Frame shape {array.shape[:2]} does not match encoder {self.shape}."
+            )
+
+        # Pad to an even size, and make the rows contiguous
+        height, width = self._ctx.height, self._ctx.width
+        if (height, width) != self.shape:
+            pad = ((0, height - self.shape[0]), (0, width - self.shape[1]), (0, 0))
+            array = np.pad(array, pad, mode="edge")
+        if layout == "L":
+            array = array[:, :, 0]
+        frame = self._av.VideoFrame.from_ndarray(
+            np.ascontiguousarray(array), format=_PIXEL_FORMATS[layout]
+        )
+        frame.pts = self._count
+        if keyframe and self._count > 0:
+            frame.pict_type = self._av.video.frame.PictureType.I
+        self._count += 1
+
+        packets = self._ctx.encode(frame)
+        data = b"".join(bytes(packet) for packet in packets)
+        is_keyframe = any(packet.is_keyframe for packet in packets)
+        return data, is_keyframe
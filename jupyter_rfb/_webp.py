@@ -0,0 +1,125 @@
+import io
+
+import numpy as np
+
+from ._layout import get_layout, check_layout, has_contiguous_rows, get_row_buffer
+
+
+# Map pixel layouts to the Pillow (mode, rawmode). Unlike JPEG, WebP and AVIF
+# support transparency, so the alpha channel is preserved.
+_PILLOW_MODES = {
+    "L": ("L", "L"),
+    "RGB": ("RGB", "RGB"),
+    "BGR": ("RGB", "BGR"),
+    "RGBA": ("RGBA", "RGBA"),
+    "BGRA": ("RGBA", "BGRA"),
+}
+
+# The (method, quality) for lossless WebP. For lossless encoding, the quality
+# is the compression effort. The images are usually smaller than PNG, but
+# slower to encode: at 1080p the fast preset takes about as long as the PNG
+# default preset (up to twice as long), and the other presets take 3-8 times
+# as long (see benchmarks/bench_png.py).
+LOSSLESS_PRESETS = {
+    "fast": (0, 25),
+    "default": (1, 25),
+    "small": (2, 50),
+}
+
+# The Pillow module, per format, or None if the format is not available
+_pillow_per_format = {}
+
+
+def get_pillow(format):
+    """Get the PIL.Image module if it can write the given format ("WEBP" or "AVIF").
+
+    Returns None if Pillow is not installed, or was built without support for
+    the format. Pillow is imported when first needed, because that takes time.
+    """
+    if format not in _pillow_per_format:
+        try:
+            import PIL.Image
+            import PIL.features
+        except ImportError:
+            _pillow_per_format[format] = None
+        else:
+            ok = PIL.features.check(format.lower())
+            _pillow_per_format[format] = PIL.Image if ok else None
+    return _pillow_per_format[format]
+
+
+def array2webp(array, quality=90, lossless=False, preset="default", layout=None):
+    """Create a WebP image from a numpy array.
+
+    The provided array's shape must be either NxM (grayscale), NxMx1 (grayscale),
+    NxMx3 (RGB) or NxMx4 (RGBA). The layout can be given explicitly to support
+    BGR and BGRA. The alpha channel is preserved.
+
+    If ``lossless`` is True, the quality is ignored, and the preset ("fast",
+    "default" or "small") trades speed for compression ratio. Returns None if
+    WebP encoding is not available (it requires Pillow).
+    """
+    if lossless:
+        try:
+            method, effort = LOSSLESS_PRESETS[preset]
+        except KeyError:
+            raise ValueError(f"Invalid WebP preset: {preset!r}") from None
+        options = {"lossless": True, "quality": effort, "method": method}
+    else:
+        # Method 0 is much faster, and the images are only slightly larger
+        options = {"quality": int(quality), "method": 0}
+    return _encode_with_pillow(array, "WEBP", layout, options)
+
+
+def array2avif(array, quality=90, layout=None):
+    """Create an AVIF image from a numpy array, with the given quality (percentage).
+
+    Accepts the same arrays as ``array2webp()``. AVIF images are typically smaller
+    than WebP at the same quality, but take more time to encode. Returns None if
+    AVIF encoding is not available (it requires Pillow with AVIF support).
+    """
+    options = {"quality": int(quality), "speed": 10}
+    return _encode_with_pillow(array, "AVIF", layout, options)
+
+
+def _encode_with_pillow(array, format, layout, options):
+    # Check types
+    if hasattr(array, "shape") and hasattr(array, "dtype"):
+        if array.dtype != "uint8":
+            raise ValueError(f"Image array to convert to {format} must be uint8")
+        original_shape = shape = array.shape
+    else:
+        raise ValueError(
+            f"Invalid type for array, need ndarray-like, got {type(array)}"
+        )
+
+    # Check shape
+    if len(shape) == 2:
+        shape = (*shape, 1)
+        array = array.reshape(shape)
+    if not (len(shape) == 3 and shape[2] in (1, 3, 4)):
+        raise ValueError(f"Unexpected image shape: {original_shape}")
+
+    # Check layout
+    if layout is None:
+        layout = get_layout(shape[2])
+    check_layout(layout, shape[2])
+
+    pillow = get_pillow(format)
+    if pillow is None:
+        return None
+
+    # Pillow unpacks the pixels into its own memory, reading strided rows directly
+    if not has_contiguous_rows(array):
+        array = np.ascontiguousarray(array)
+    mode, rawmode = _PILLOW_MODES[layout]
+    size = shape[1], shape[0]
+    stride = array.strides[0]
+    img_pil = pillow.frombytes(
+        mode, size, get_row_buffer(array), "raw", rawmode, stride, 1
+    )
+
+    # Encode!
+    f = io.BytesIO()
+    img_pil.save(f, format=format, **options)
+    return f.getvalue()
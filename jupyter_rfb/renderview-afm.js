@@ -7,6 +7,296 @@
 
 /* global BaseRenderView getTimestamp */
 
+// Tiny images to test what formats the browser can decode (generated with Pillow)
+const TEST_IMAGES = {
+  'image/webp': [
+    'data:image/webp;base64,UklGRlgAAABXRUJQVlA4WAoAAAAQAAAAAQAAAAAAQUxQSAMAAAAA/4AAVlA4IC4AAADwAQCdASoCAAEAAsBMJaACdLoAAwkG+4AAzjxBSjDj/3HYG68W//BBXMy9mAAA',
+    'data:image/webp;base64,UklGRiAAAABXRUJQVlA4TBMAAAAvAQAAEA8w//sfD/wPBxWI6H8AAA=='
+  ],
+  'image/avif': [
+    'data:image/avif;base64,AAAAIGZ0eXBhdmlmAAAAAGF2aWZtaWYxbWlhZk1BMUIAAADrbWV0YQAAAAAAAAAhaGRscgAAAAAAAAAAcGljdAAAAAAAAAAAAAAAAAAAAAAOcGl0bQAAAAAAAQAAAB5pbG9jAAAAAEQAAAEAAQAAAAEAAAETAAAAKwAAAChpaW5mAAAAAAABAAAAGmluZmUCAAAAAAEAAGF2MDFDb2xvcgAAAABqaXBycAAAAEtpcGNvAAAAFGlzcGUAAAAAAAAAAgAAAAEAAAAQcGl4aQAAAAADCAgIAAAADGF2MUOBAAwAAAAAE2NvbHJuY2x4AAEADQAGgAAAABdpcG1hAAAAAAAAAAEAAQQBAoMEAAAAM21kYXQSAAoIGAAmiAhoNCAyHRlHh4Yhh5555oJAAJBBGgbTIWEr6llyohCfNawq'
+  ]
+}
+
+function canDecodeImage (src) {
+  return new Promise((resolve) => {
+    const img = new Image()
+    img.onload = () => { resolve(img.width > 0) }
+    img.onerror = () => { resolve(false) }
+    img.src = src
+  })
+}
+
+// The mimetype for frames consisting of raw RGBA pixels
+const RAW_MIMETYPE = 'application/x-rgba'
+
+function getWallTime () {
+  // The time in seconds since the epoch, like Python's time.time(), but with sub-ms precision
+  return (performance.timeOrigin + performance.now()) / 1000
+}
+
+/**
+ * Decode an LZ4 block (without size header) into a new array of the given size.
+ */
+function decodeLz4Block (src, dstSize) {
+  const dst = new Uint8Array(dstSize)
+  let si = 0
+  let di = 0
+  while (si < src.length) {
+    // A sequence starts with a token, followed by the literals
+    const token = src[si++]
+    let literalLength = token >> 4
+    if (literalLength === 15) {
+      let b = 255
+      while (b === 255) {
+        b = src[si++]
+        literalLength += b
+      }
+    }
+    dst.set(src.subarray(si, si + literalLength), di)
+    si += literalLength
+    di += literalLength
+    if (si >= src.length) { break } // the last sequence has no match
+    // The match, copied from earlier output, which may overlap
+    const offset = src[si] | (src[si + 1] << 8)
+    si += 2
+    let matchLength = (token & 15) + 4
+    if (matchLength === 19) {
+      let b = 255
+      while (b === 255) {
+        b = src[si++]
+        matchLength += b
+      }
+    }
+    let mi = di - offset
+    if (offset >= matchLength) {
+      dst.copyWithin(di, mi, mi + matchLength)
+      di += matchLength
+    } else {
+      for (let i = 0; i < matchLength; i++) {
+        dst[di++] = dst[mi++]
+      }
+    }
+  }
+  return dst
+}
+
+/**
+ * Turn a buffer with (compressed) raw RGBA pixels into an ImageData object.
+ * The buffer is a typed array or DataView, or an ArrayBuffer (in the worker).
+ */
+async function decodeRawImage (buffer, width, height, compression) {
+  const nbytes = width * height * 4
+  let bytes = ArrayBuffer.isView(buffer)
+    ? new Uint8Array(buffer.buffer, buffer.byteOffset, buffer.byteLength)
+    : new Uint8Array(buffer)
+  if (compression === 'lz4') {
+    bytes = decodeLz4Block(bytes, nbytes)
+  } else if (compression === 'deflate') {
+    const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('deflate'))
+    bytes = new Uint8Array(await new Response(stream).arrayBuffer())
+  }
+  const pixels = new Uint8ClampedArray(bytes.buffer, bytes.byteOffset, nbytes)
+  return new ImageData(pixels, width, height)
+}
+
+/**
+ * Decode the images of a frame (one per tile) into ImageBitmap or ImageData objects.
+ */
+async function decodeImages (mimetype, buffers, rects, compression) {
+  if (mimetype === RAW_MIMETYPE) {
+    return Promise.all(buffers.map((buffer, i) => {
+      const [, , w, h] = rects[i]
+      return decodeRawImage(buffer, w, h, compression)
+    }))
+  }
+  return Promise.all(buffers.map((buffer) => createImageBitmap(new Blob([buffer], { type: mimetype }))))
+}
+
+// The source for the worker to decode images in. ImageData cannot be transferred, so it's turned into a bitmap.
+const WORKER_SOURCE = `
+const RAW_MIMETYPE = '${RAW_MIMETYPE}'
+${decodeLz4Block}
+${decodeRawImage}
+${decodeImages}
+onmessage = async (event) => {
+  const { id, mimetype, buffers, rects, compression } = event.data
+  try {
+    let images = await decodeImages(mimetype, buffers, rects, compression)
+    images = await Promise.all(images.map((im) => im instanceof ImageData ? createImageBitmap(im) : im))
+    postMessage({ id, images }, images)
+  } catch (err) {
+    postMessage({ id, error: String(err) })
+  }
+}
+`
+
+/**
+ * A Web Worker to decode images off the main thread.
+ */
+class DecoderWorker {
+  constructor () {
+    const url = URL.createObjectURL(new Blob([WORKER_SOURCE], { type: 'text/javascript' }))
+    this._worker = new Worker(url)
+    URL.revokeObjectURL(url)
+    this._pending = new Map()
+    this._count = 0
+    this._worker.onmessage = (event) => {
+      const { id, images, error } = event.data
+      const [resolve, reject] = this._pending.get(id)
+      this._pending.delete(id)
+      if (error) { reject(new Error(error)) } else { resolve(images) }
+    }
+  }
+
+  decode (mimetype, buffers, rects, compression) {
+    // The buffers are copied, because they may share an ArrayBuffer, which can only be transferred once
+    const copies = buffers.map((b) => b.buffer.slice(b.byteOffset, b.byteOffset + b.byteLength))
+    const id = ++this._count
+    return new Promise((resolve, reject) => {
+      this._pending.set(id, [resolve, reject])
+      this._worker.postMessage({ id, mimetype, buffers: copies, rects, compression }, copies)
+    })
+  }
+
+  terminate () {
+    this._worker.terminate()
+    for (const [, reject] of this._pending.values()) {
+      reject(new Error('Decoder worker was terminated'))
+    }
+    this._pending.clear()
+  }
+}
+
+/**
+ * Get a promise that resolves to the list of image mimetypes that the browser can decode.
+ */
+async function detectImageFormats () {
+  const formats = ['image/png', 'image/jpeg']
+  for (const [mimetype, srcs] of Object.entries(TEST_IMAGES)) {
+    const results = await Promise.all(srcs.map(canDecodeImage))
+    if (results.every(Boolean)) {
+      formats.push(mimetype)
+    }
+  }
+  return formats
+}
+
+// The codec strings for the video codecs (constrained baseline H.264 level 5.2, and VP9 profile 0)
+const VIDEO_CODECS = {
+  h264: 'avc1.42E034',
+  vp9: 'vp09.00.41.08'
+}
+
+// The VP9 levels, with the max picture size and width/height of each
+const VP9_LEVELS = [
+  ['41', 2228224, 4160],
+  ['51', 8912896, 8384],
+  ['61', 35651584, 16832]
+]
+
+/**
+ * Get the codec string to decode frames of the given size. The VP9 level
+ * limits the frame size, so a higher level is used for large frames.
+ */
+function getCodecString (codec, width, height) {
+  if (codec !== 'vp9') { return VIDEO_CODECS[codec] }
+  const level = VP9_LEVELS.find(([, maxSize, maxDim]) => {
+    return width * height <= maxSize && Math.max(width, height) <= maxDim
+  }) || VP9_LEVELS[VP9_LEVELS.length - 1]
+  return `vp09.00.${level[0]}.08`
+}
+
+/**
+ * Get a promise that resolves to the list of video codecs that the browser can decode with WebCodecs.
+ */
+async function detectVideoCodecs () {
+  const codecs = []
+  if (typeof VideoDecoder === 'undefined') { return codecs }
+  for (const [name, codec] of Object.entries(VIDEO_CODECS)) {
+    try {
+      const support = await VideoDecoder.isConfigSupported({ codec, optimizeForLatency: true })
+      if (support.supported) { codecs.push(name) }
+    } catch { }
+  }
+  return codecs
+}
+
+/**
+ * A video stream, decoded with a VideoDecoder. Each decoded frame is returned as a VideoFrame.
+ */
+class VideoStream {
+  constructor (codec, codecString) {
+    this.codec = codec
+    this.codecString = codecString
+    this.hasKeyframe = false
+    this.keyframeRequested = false
+    this._pending = []
+    this._decoder = new VideoDecoder({
+      output: (videoFrame) => {
+        const pending = this._pending.shift()
+        if (pending) { pending.resolve(videoFrame) } else { videoFrame.close() }
+      },
+      error: (err) => { this._reject(err) }
+    })
+    this._decoder.configure({ codec: codecString, optimizeForLatency: true })
+  }
+
+  decode (buffer, isKeyframe, timestamp) {
+    if (isKeyframe) {
+      this.hasKeyframe = true
+      this.keyframeRequested = false
+    }
+    const chunk = new EncodedVideoChunk({ type: isKeyframe ? 'key' : 'delta', timestamp, data: buffer })
+    return new Promise((resolve, reject) => {
+      this._pending.push({ resolve, reject })
+      this._decoder.decode(chunk)
+    })
+  }
+
+  get closed () {
+    // A decoder is closed by an error too
+    return this._decoder.state === 'closed'
+  }
+
+  close () {
+    if (!this.closed) { this._decoder.close() }
+    this._reject(new Error('Video stream was closed'))
+  }
+
+  _reject (err) {
+    this.hasKeyframe = false
+    for (const pending of this._pending) { pending.reject(err) }
+    this._pending = []
+  }
+}
+
+// Numeric event fields that are packed into a binary buffer when events are batched
+const PACKED_EVENT_FIELDS = ['x', 'y', 'dx', 'dy', 'timestamp']
+
+/**
+ * Create a batch message for the given events, with the numeric fields packed
+ * as float64 values (one row per event, NaN for missing values).
+ */
+function packEvents (events) {
+  const nfields = PACKED_EVENT_FIELDS.length
+  const values = new Float64Array(events.length * nfields).fill(NaN)
+  const packedEvents = events.map((event, i) => {
+    const packedEvent = {}
+    for (const [key, value] of Object.entries(event)) {
+      const j = PACKED_EVENT_FIELDS.indexOf(key)
+      if (j >= 0 && typeof value === 'number') {
+        values[i * nfields + j] = value
+      } else {
+        packedEvent[key] = value
+      }
+    }
+    return packedEvent
+  })
+  const msg = { type: 'event_batch', events: packedEvents, fields: PACKED_EVENT_FIELDS }
+  return [msg, [values.buffer]]
+}
+
 /**
  * An object that represents the model(wrapping the anywidget model object), that can have multiple views.
  */
@@ -18,6 +308,14 @@ class RenderviewAnywidgetModel {
 
     // Variables to store frames and the last frame
     this._frames = []
+    this._compositor = null // canvas to composite delta frames, when needed
+    this._processing = false // a frame is being decoded and painted
+    this._decoder = null // DecoderWorker, when the worker backend is used
+    this._videoStream = null
+    this._codecSupport = new Map() // codec string -> promise of whether it can be decoded
+    this._eventBatch = []
+    this._imageFormats = detectImageFormats()
+    this._videoCodecs = detectVideoCodecs()
     this._lastSrc = 'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAIAAACQd1PeAAAADElEQVR42mOor68HAAL+AX6E2KOJAAAAAElFTkSuQmCC'
     this._lastFrame = {
       src: this._lastSrc,
@@ -28,8 +326,12 @@ class RenderviewAnywidgetModel {
     // Register callbacks
     anymodel.on('msg:custom', (msg, buffers) => {
       if (msg.type === 'framebufferdata') {
-        this._frames.push({ ...msg, buffers })
+        this._frames.push({ ...msg, buffers, received: getWallTime() })
         this._request_animation_frame()
+      } else if (msg.type === 'clock_ping') {
+        // Reply right away, so the server can estimate the offset between our clocks
+        const received = getWallTime()
+        this._send({ type: 'clock_pong', t0: msg.t0, t1: received, t2: getWallTime() })
       }
     })
     // For traits we allow the public and private version, this means we can use the
@@ -85,6 +387,13 @@ class RenderviewAnywidgetModel {
       })
     }
 
+    // The server can ask to send move/wheel events less often, when it cannot keep up
+    anymodel.on('change:_event_throttle', () => {
+      for (const view of this.views) {
+        this._applyEventThrottle(view)
+      }
+    })
+
     // Start the animation loop
     this._img_update_pending = false
     this._request_animation_frame()
@@ -93,6 +402,15 @@ class RenderviewAnywidgetModel {
   close () {
     URL.revokeObjectURL(this._lastSrc)
     this._lastSrc = null
+    this._compositor = null
+    if (this._decoder) {
+      this._decoder.terminate()
+      this._decoder = null
+    }
+    if (this._videoStream) {
+      this._videoStream.close()
+      this._videoStream = null
+    }
     this._lastFrame = null
     this._frames = []
     for (const view of this.views) {
@@ -118,12 +436,53 @@ class RenderviewAnywidgetModel {
     view.showTitlebar(anymodel.get('_has_titlebar') ?? anymodel.get('has_titlebar'))
     view.setTitle(anymodel.get('_title') ?? anymodel.get('title'))
     view.setCursor(anymodel.get('_cursor') ?? anymodel.get('cursor'))
+    this._applyEventThrottle(view)
+    // Let Python know what image formats and video codecs we can decode
+    Promise.all([this._imageFormats, this._videoCodecs]).then(([formats, codecs]) => {
+      if (this._lastFrame === null) { return } // closed
+      this.anymodel.set('_image_formats', formats)
+      this.anymodel.set('_video_codecs', codecs)
+      this.anymodel.save_changes()
+    })
     // Init view
-    if (this._lastSrc) {
+    if (view.viewElement.tagName === 'CANVAS') {
+      if (this._compositor) {
+        this._presentOnCanvas(view.viewElement)
+      }
+    } else if (this._lastSrc) {
       view.viewElement.src = this._lastSrc
     }
   }
 
+  _applyEventThrottle (view) {
+    const throttle = this.anymodel.get('_event_throttle') // in seconds
+    if (typeof throttle === 'number') {
+      view.setThrottle(Math.round(throttle * 1000))
+    }
+  }
+
+  useCanvas () {
+    // Both the 'canvas' and 'worker' backend draw on canvas elements
+    return (this.anymodel.get('_view_backend') ?? 'img') !== 'img'
+  }
+
+  _getDecoder () {
+    // Get the worker to decode images in, or null to decode on the main thread
+    if (this.anymodel.get('_view_backend') !== 'worker') {
+      return null
+    }
+    if (!this._decoder) {
+      try {
+        this._decoder = new DecoderWorker()
+      } catch (err) {
+        // E.g. a content security policy that does not allow workers
+        console.warn('Could not create decoder worker, decoding on the main thread:', err)
+        this._decoder = false
+      }
+    }
+    return this._decoder || null
+  }
+
   removeView (view) {
     this.views = this.views.filter(v => v !== view)
     this.updateVisibility()
@@ -142,10 +501,18 @@ class RenderviewAnywidgetModel {
     }
   }
 
-  _send_response () {
+  _send_response (decoded, painted) {
     // Let Python know what we have at the frame. This prop is a dict, making it "atomic".
+    // The times at which the frame was received, decoded and painted are in our clock.
     const frame = this._lastFrame
-    const frameFeedback = { index: frame.index, timestamp: frame.timestamp, localtime: Date.now() / 1000 }
+    const frameFeedback = {
+      index: frame.index,
+      timestamp: frame.timestamp,
+      localtime: painted,
+      received: frame.received,
+      decoded,
+      painted
+    }
     this.anymodel.set('_frame_feedback', frameFeedback)
     this.anymodel.save_changes()
   }
@@ -163,10 +530,56 @@ class RenderviewAnywidgetModel {
 
   _animate () {
     this._img_update_pending = false
-    if (this._frames.length === 0) { return };
+    if (this._frames.length === 0 || this._processing) { return };
 
-    // Pick the oldest frame from the stack, and get its source
+    // Pick the oldest frame from the stack
     const frame = this._frames.shift()
+
+    // Frames without image data are identical to the previous frame, only confirm them
+    if (frame.unchanged) {
+      const t = getWallTime()
+      this._lastFrame = frame
+      this._send_response(t, t)
+      this._request_animation_frame()
+      return
+    }
+
+    // Frames are composited on a canvas when there are canvas views, or if the frame is a delta, raw or video.
+    // The server is notified when the frame is painted, so that decoding and painting count toward the
+    // back-pressure. A frame is painted right after the next animation frame callbacks.
+    this._processing = true
+    const isVideo = frame.mimetype.startsWith('video/')
+    let decoded
+    if (this.useCanvas() || frame.tiles || frame.mimetype === RAW_MIMETYPE || isVideo) {
+      decoded = this._composite(frame).then(() => {
+        const t = getWallTime()
+        if (this._lastFrame !== null) { this._present(frame) }
+        return t
+      })
+    } else {
+      decoded = this._showImage(frame)
+    }
+    decoded
+      .catch((err) => {
+        console.error(err)
+        return getWallTime()
+      })
+      .then((decodedTime) => new Promise((resolve) => {
+        window.requestAnimationFrame(() => resolve([decodedTime, getWallTime()]))
+      }))
+      .then(([decodedTime, paintedTime]) => {
+        this._processing = false
+        if (this._lastFrame === null) { return } // closed
+        this._lastFrame = frame
+        this._send_response(decodedTime, paintedTime)
+        this._request_animation_frame()
+      })
+  }
+
+  _showImage (frame) {
+    // Show the frame's image in the img views, and resolve with the time at which it is decoded
+
+    // Get the frame's source
     let newSrc
     if (frame.buffers.length > 0) {
       const blob = new Blob([frame.buffers[0].buffer], { type: frame.mimetype })
@@ -180,19 +593,201 @@ class RenderviewAnywidgetModel {
     this._lastSrc = newSrc
 
     // Update the image sources
+    const decodes = []
+    for (const view of this.views) {
+      if (view.viewElement.tagName === 'IMG') {
+        view.viewElement.src = newSrc
+        decodes.push(view.viewElement.decode().catch(() => {}))
+      }
+    }
+    return Promise.all(decodes).then(() => getWallTime())
+  }
+
+  async _composite (frame) {
+    // Decode the frame's image(s) and draw them onto the compositor canvas
+    if (frame.mimetype.startsWith('video/')) {
+      return this._compositeVideo(frame)
+    }
+    let buffers = frame.buffers
+    if (buffers.length === 0) {
+      const blob = await (await fetch(frame.data_b64)).blob()
+      buffers = [new Uint8Array(await blob.arrayBuffer())]
+    }
+    const rects = frame.tiles || (frame.shape ? [[0, 0, frame.shape[1], frame.shape[0]]] : [])
+    const decoder = this._getDecoder()
+    const images = decoder
+      ? await decoder.decode(frame.mimetype, buffers, rects, frame.compression)
+      : await decodeImages(frame.mimetype, buffers, rects, frame.compression)
+    if (!this._compositor) {
+      this._compositor = document.createElement('canvas')
+    }
+    const compositor = this._compositor
+    if (frame.tiles) {
+      // A delta frame: draw the tiles at their offsets
+      const [height, width] = frame.shape
+      if (compositor.width !== width || compositor.height !== height) {
+        this._requestKeyframe() // base frame is missing
+        return
+      }
+      const ctx = compositor.getContext('2d')
+      for (let i = 0; i < images.length; i++) {
+        const [x, y] = frame.tiles[i]
+        this._blit(ctx, images[i], x, y)
+      }
+    } else {
+      // A keyframe: replace the image
+      const image = images[0]
+      compositor.width = image.width
+      compositor.height = image.height
+      this._blit(compositor.getContext('2d'), image, 0, 0)
+    }
+  }
+
+  async _compositeVideo (frame) {
+    // Decode a video frame, and draw it onto the compositor canvas
+    const codec = frame.mimetype.slice('video/'.length)
+    const [height, width] = frame.shape
+    const codecString = getCodecString(codec, width + (width % 2), height + (height % 2))
+    let stream = this._videoStream
+    if (!stream || stream.codecString !== codecString || stream.closed) {
+      if (stream) { stream.close() }
+      this._videoStream = null
+      if (!await this._isCodecSupported(codecString)) {
+        // E.g. the frames are too large for this browser: fall back to images
+        const codecs = this.anymodel.get('_video_codecs')
+        if (codecs.includes(codec)) {
+          this.anymodel.set('_video_codecs', codecs.filter((c) => c !== codec))
+          this.anymodel.save_changes()
+          this._requestKeyframe()
+        }
+        return
+      }
+      this._videoStream = new VideoStream(codec, codecString)
+    }
+    stream = this._videoStream
+    if (!frame.keyframe && !stream.hasKeyframe) {
+      // E.g. after a reload, or a decoder error: the server needs to send a keyframe
+      if (!stream.keyframeRequested) {
+        stream.keyframeRequested = true
+        this._requestKeyframe()
+      }
+      return
+    }
+    const videoFrame = await stream.decode(frame.buffers[0], frame.keyframe, frame.index)
+    // The frame may be padded to an even size
+    if (!this._compositor) {
+      this._compositor = document.createElement('canvas')
+    }
+    const compositor = this._compositor
+    if (compositor.width !== width || compositor.height !== height) {
+      compositor.width = width
+      compositor.height = height
+    }
+    compositor.getContext('2d').drawImage(videoFrame, 0, 0, width, height, 0, 0, width, height)
+    videoFrame.close()
+  }
+
+  async _isCodecSupported (codecString) {
+    // Check (once) whether a codec string can be decoded, e.g. a VP9 level for large frames
+    if (!this._codecSupport.has(codecString)) {
+      const support = VideoDecoder.isConfigSupported({ codec: codecString, optimizeForLatency: true })
+        .then((result) => result.supported, () => false)
+      this._codecSupport.set(codecString, support)
+    }
+    return this._codecSupport.get(codecString)
+  }
+
+  _blit (ctx, image, x, y) {
+    // Draw an ImageData or ImageBitmap, replacing the pixels (they can be transparent)
+    if (image instanceof ImageData) {
+      ctx.putImageData(image, x, y)
+    } else {
+      ctx.clearRect(x, y, image.width, image.height)
+      ctx.drawImage(image, x, y)
+      image.close()
+    }
+  }
+
+  _requestKeyframe () {
+    // Ask the server for a frame that does not depend on the frames before it
+    this.onEvent({ type: 'request_keyframe' })
+  }
+
+  _present (frame) {
+    // Show the composited image in all views
+    if (!this._compositor) {
+      // Nothing was composited yet, e.g. a video frame before its keyframe
+      this._requestKeyframe()
+      return
+    }
+    let needBlob = false
     for (const view of this.views) {
-      view.viewElement.src = newSrc
-      view.viewElement.onload = this._request_animation_frame.bind(this)
+      if (view.viewElement.tagName === 'CANVAS') {
+        this._presentOnCanvas(view.viewElement)
+      } else {
+        needBlob = true
+      }
     }
+    // Fallback for img views that were created before compositing was enabled
+    if (needBlob) {
+      this._compositor.toBlob((blob) => {
+        if (!blob || !this._compositor) { return }
+        const newSrc = URL.createObjectURL(blob)
+        URL.revokeObjectURL(this._lastSrc)
+        this._lastSrc = newSrc
+        for (const view of this.views) {
+          if (view.viewElement.tagName !== 'CANVAS') {
+            view.viewElement.src = newSrc
+          }
+        }
+      })
+    }
+  }
 
-    // Let the server know we processed the image (even if it's not shown yet)
-    this._lastFrame = frame
-    this._send_response()
+  _presentOnCanvas (canvas) {
+    const compositor = this._compositor
+    if (!compositor) { return }
+    if (canvas.width !== compositor.width || canvas.height !== compositor.height) {
+      canvas.width = compositor.width
+      canvas.height = compositor.height
+    }
+    const ctx = canvas.getContext('2d')
+    ctx.clearRect(0, 0, canvas.width, canvas.height)
+    ctx.drawImage(compositor, 0, 0)
   }
 
   onEvent (event) {
+    // Batch the events of an animation frame into one message, if the server supports it
+    if (this.anymodel.get('_event_batching') && event.type !== 'close') {
+      this._eventBatch.push(event)
+      if (this._eventBatch.length === 1) {
+        // Animation frames do not fire in hidden tabs
+        if (document.hidden) {
+          setTimeout(() => this._flushEvents(), 0)
+        } else {
+          window.requestAnimationFrame(() => this._flushEvents())
+        }
+      }
+      return
+    }
+    this._flushEvents()
+    this._send(event)
+  }
+
+  _flushEvents () {
+    const events = this._eventBatch
+    this._eventBatch = []
+    if (events.length === 1) {
+      this._send(events[0])
+    } else if (events.length > 1) {
+      const [msg, buffers] = packEvents(events)
+      this._send(msg, buffers)
+    }
+  }
+
+  _send (msg, buffers) {
     try {
-      this.anymodel.send(event)
+      this.anymodel.send(msg, undefined, buffers)
     } catch { } // probably attempt to send when widget is closed
   }
 }
@@ -209,10 +804,15 @@ class AnywidgetRenderView extends BaseRenderView {
     // wrapperElement.classList.add('has-titlebar') -> not by default
     containerElement.appendChild(wrapperElement)
 
-    // Create img element
-    const viewElement = document.createElement('img')
-    viewElement.decoding = 'sync'
-    viewElement.loading = 'eager'
+    // Create img or canvas element
+    let viewElement
+    if (model.useCanvas()) {
+      viewElement = document.createElement('canvas')
+    } else {
+      viewElement = document.createElement('img')
+      viewElement.decoding = 'sync'
+      viewElement.loading = 'eager'
+    }
     viewElement.style.touchAction = 'none' // prevent default pan/zoom behavior
     viewElement.ondragstart = () => false // prevent browser's built-in image drag
 
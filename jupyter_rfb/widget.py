@@ -7,33 +7,163 @@ a confirmation when it has processed the frame.
 
 The server will not send more than *max_buffered_frames* beyond the
 last confirmed frame. As such, if the client processes frames slower,
-the server will slow down too.
+the server will slow down too. The client confirms a frame after it has
+been decoded and painted, so slow decoding in the browser also slows down
+the server. The confirmation includes the times at which the frame was
+received, decoded and painted, in the client's clock. To relate these to
+the server's clock, the server occasionally sends a ping, and estimates
+the offset of the client's clock from the time the reply takes (like NTP).
+
+Frames can optionally be encoded in a pool of worker threads (the encoders
+release the GIL). A frame gets its index when it is submitted, so frames
+that are being encoded count as in-flight. Encoded frames are sent in
+index order: when a newer frame finishes before an older one, the older
+one is dropped. The client confirms the latest index it has processed,
+so the dropped indices are implicitly confirmed too.
+
+With *delta_frames* enabled, a frame is compared to the previously submitted
+frame (its base) in tiles, and only the changed tiles are encoded and sent,
+together with their position. The client composites these onto a canvas. A
+delta frame only makes sense if the client has its base frame, so if the base
+was dropped (see above) the frame is encoded again as a full keyframe (in a
+worker thread if there is a pool).
+Keyframes are also sent on resize, when most tiles changed, and periodically.
+
+Each frame is fingerprinted (hashed) when it is encoded, so in a worker thread
+if there is a pool. A frame that is identical to the last frame sent is not
+encoded. Instead, a message without image data is sent, so that the frame
+index and the frame feedback still advance. Similarly, a lossless redraw is
+skipped if the client already has the frame losslessly (this is checked when
+the redraw is submitted, because it happens when idle). Skipped frames are
+only possible when no frames are being encoded, because otherwise the skip
+message could overtake the frame it refers to.
+
+With *interaction_scale* below 1, pointer drags and wheel events start an
+interaction, during which the subclass gets a resize event with a reduced
+physical size. The idle timer that normally triggers the lossless redraw
+ends the interaction instead: the subclass gets the real size again, and a
+new frame is drawn (followed by a lossless redraw as usual).
+
+With *video_codec* set, frames are encoded as a video stream (if the client
+can decode it). The encoder is stateful, so these frames are encoded in the
+event loop, in order, and are never dropped. A keyframe is sent when the size
+or quality changes, and when the client asks for one (e.g. when it was
+reloaded, or its decoder failed). The lossless redraw is sent as a normal
+image, which does not affect the state of the video decoder.
+
+The get_frame() and handle_event() methods may be async (i.e. return an
+awaitable). These are run as tasks. A pending render counts as a frame in
+flight, so no new render is started until it is done. A draw request during
+a render cancels it, because its result would be stale, and a new render is
+started. To guarantee progress, a render is not cancelled if the previous
+render was cancelled too.
+
+With *max_fps* set, draws are aligned to ticks at a fixed interval. A draw
+that is requested (or that the client is ready for) before the next tick is
+delayed with a timer. Since the draw-requested flag coalesces requests,
+there is at most one draw per tick. A missed deadline is a tick that passed
+while a draw was requested but could not happen, e.g. due to back-pressure.
+
+Pointer_move and wheel events are coalesced per event loop iteration: the
+first is dispatched directly, and following events that can be merged with
+it (see merge_events()) are merged and dispatched at the end of the
+iteration. Other events dispatch the pending events first, to keep the
+order. The client throttles these events too; the throttle is raised when
+handling an event plus rendering a frame takes longer (see event_throttle).
+
+The buffers from get_frame_buffer() are reused once the widget no longer
+holds on to them. The widget holds the last frame, the delta base, the array
+for the pending lossless redraw, and the arrays that are being encoded in a
+worker thread. Other references (e.g. by the subclass) are not tracked.
+
+The fingerprint is also used as the key (together with the encoding settings)
+in a process-wide cache of encoded frames. This avoids encoding the same
+frame again, e.g. in multiple widgets, or for the snapshot. The widget also
+keeps the last image that it sent, so that a snapshot with the same contents,
+format and quality (e.g. after the lossless redraw) is not encoded at all.
+
+A recording gets each frame message and its buffers, as sent. These are put
+in a queue and written by a background thread, to an append-only file with
+an index at the end. The player sends the recorded messages with new indices,
+so the frame feedback and back-pressure work as usual.
 """
 
 import asyncio
+import inspect
 import time
-from base64 import encodebytes
+import traceback
+from collections import deque
+from base64 import b64encode, encodebytes
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
 from importlib.resources import files as resource_files
 
 import anywidget
+import numpy as np
 from IPython.display import display, HTML
-from traitlets import Bool, Dict, Int, Unicode
+from traitlets import Bool, Dict, Enum, Float, Int, List, TraitError, Unicode, validate
 
 from ._utils import array2compressed, RFBOutputContext
+from ._buffers import FrameBufferRing
+from ._cache import array2compressed_cached
+from ._clock import ClockOffsetEstimator
+from ._events import COALESCED_EVENT_TYPES, merge_events, unpack_event_batch
+from ._delta import get_changed_tiles, get_changed_rects, get_fingerprint
+from ._jpg import calibrate_jpeg_encoder, list_jpeg_encoders
+from ._layout import get_layout
+from ._pacing import FramePacer
+from ._quality import QualityController
+from ._recording import FrameRecordingWriter
+from ._scheduler import get_frame_scheduler
+from ._snapshot import (
+    SNAPSHOT_MIMETYPES,
+    check_snapshot_format,
+    encode_snapshot,
+    get_snapshot_format,
+    write_bytes,
+)
+from ._telemetry import FrameRecorder, save_records_csv
+from ._raw import (
+    RAW_MIMETYPE,
+    COMPRESSIONS,
+    array2raw,
+    get_lz4_block,
+    TransportSelector,
+)
+from ._video import VIDEO_CODECS, VideoEncoder, get_av
+
+
+@lru_cache(maxsize=None)
+def _load_asset(*fnames):
+    text = ""
+    for fname in fnames:
+        path = resource_files("jupyter_rfb").joinpath(fname)
+        text += path.read_text() + "\n\n"
+    return text
+
+
+class _LazyAsset:
+    """Class attribute that loads a frontend asset when first used by an instance.
+
+    This keeps reading (and concatenating) the asset files out of the import.
+    """
 
+    def __init__(self, *fnames):
+        self.fnames = fnames
 
-def _load_js_and_css():
-    js = ""
-    for fname in ["renderview.js", "renderview-afm.js"]:
-        js_path = resource_files("jupyter_rfb").joinpath(fname)
-        js += js_path.read_text() + "\n\n"
-
-    css_path = resource_files("jupyter_rfb").joinpath("renderview.css")
-
-    return js, css_path.read_text()
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return _load_asset(*self.fnames)
 
 
-JS, CSS = _load_js_and_css()
+def __getattr__(name):
+    # Backwards compatibility: the assets used to be module constants
+    if name == "JS":
+        return _load_asset("renderview.js", "renderview-afm.js")
+    elif name == "CSS":
+        return _load_asset("renderview.css")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class RemoteFrameBuffer(anywidget.AnyWidget):
@@ -55,16 +185,83 @@ class RemoteFrameBuffer(anywidget.AnyWidget):
       performance on slow connections. Note that each interaction is ended with a
       lossless image (PNG). If set to 100 or if JPEG encoding isn't possible (missing
       pillow or simplejpeg dependencies), then lossless PNGs will always be sent.
+    * *target_fps*: the frame rate to aim for by adapting the quality. Default 0,
+      meaning that the quality is fixed. When set, the quality is lowered when
+      frames take too long to be confirmed by the client (e.g. on a slow connection),
+      and raised again when there is room. The *quality* trait is the max quality.
+    * *target_latency*: the max roundtrip time (in seconds) to aim for by adapting
+      the quality, similar to *target_fps*. Default 0 (disabled).
+    * *min_quality*: the lowest quality to use when adapting the quality. Default 30.
+    * *max_fps*: the maximum number of frames per second. Default 0 (no limit).
+      Draws are aligned to a fixed cadence, so an animation that requests a new
+      draw for each frame uses no more CPU than needed. Missed deadlines are
+      reported in the stats.
+    * *interaction_scale*: the factor to scale the physical size with during
+      interaction (dragging and scrolling). Default 1.0. Set to e.g. 0.5 to render
+      and encode four times fewer pixels while interacting. The image is upscaled
+      by the browser. When the interaction has settled, a frame with the full
+      resolution is rendered. The subclass is informed of the changes in size
+      via resize events.
+    * *transport*: how frames are sent: 'encoded' (default) sends JPEG/PNG (or WebP)
+      images, 'raw' sends the raw RGBA pixels, which avoids the encoding cost,
+      but results in much more data. This is useful when the kernel runs on the same
+      machine as the browser. With 'auto', the transport is selected based on the
+      measured roundtrip times. Also see *raw_compression*.
+    * *raw_compression*: the compression for raw frames: 'none' (default), 'lz4'
+      (requires the lz4 library), or 'deflate'.
+    * *video_codec*: the codec to stream frames with: 'none' (default), 'h264' or
+      'vp9'. Successive frames are encoded as a video, which needs much less
+      bandwidth than independent images for animations and video playback.
+      Requires the av (PyAV) library, and a browser that supports WebCodecs.
+      Otherwise the normal transport is used. When idle, a lossless image is
+      still sent. The quality is used as well, but changing it (e.g. by
+      *target_fps*) requires a keyframe, which is relatively large.
+    * *image_format*: the image format to use, one of 'auto' (default), 'jpeg',
+      'webp' or 'avif'. With 'webp', frames are sent as lossy WebP during interaction,
+      and as lossless WebP when idle. These are smaller than JPEG and PNG, and preserve
+      transparency, but take several times longer to encode. With 'avif', lossy AVIF
+      is used during interaction. The 'auto' mode currently selects 'jpeg' (which
+      means PNG for lossless frames), so WebP and AVIF are opt-in. These require
+      Pillow, and are only used if the browser reports that it can decode them.
+      Otherwise JPEG and PNG are used.
+    * *event_throttle*: the minimum time (in seconds) between pointer_move and wheel
+      events sent by the client. Default 0.02. When handling an event and rendering
+      a frame takes longer than this, the client is asked to send these events less
+      often (up to 0.1s), so that input does not pile up.
     * *max_buffered_frames*: the number of frames that is allowed to be "in-flight",
       i.e. sent, but not yet confirmed by the client. Default 2. Higher values
       may result in a higher FPS at the cost of introducing lag.
+    * *encoder_threads*: the number of worker threads used to encode frames.
+      Default 0, meaning that frames are encoded in the event loop. Set to 1 or
+      higher to keep the kernel responsive while large frames are encoded.
+      Frames are always sent in order; stale frames are dropped.
+    * *channel_order*: the order of the color channels in the arrays returned by
+      :func:`.get_frame() <jupyter_rfb.RemoteFrameBuffer.get_frame>`, either 'RGB'
+      (default) or 'BGR'. Arrays with four channels (RGBA/BGRA, or RGBX/BGRX) are
+      supported as well. The encoders consume these layouts directly, so setting
+      this to match the renderer avoids copying the frame before encoding.
+    * *encoder*: the name of the JPEG encoder to use. Default 'auto', which selects
+      the first available encoder. Set to 'calibrate' to select the fastest encoder
+      for the current frame size and quality, using a short benchmark (in a background
+      thread, the first available encoder is used until it is done). Also see
+      :func:`register_jpeg_encoder() <jupyter_rfb.register_jpeg_encoder>`.
+    * *delta_frames*: whether to only send the parts of the frame that changed
+      since the previous frame. Default False. This greatly reduces bandwidth
+      and encoding time when only a small part of the image changes.
+    * *view_backend*: how the client decodes and shows frames: 'img' shows frames
+      in an ``<img>`` element, 'canvas' decodes frames with ``createImageBitmap``
+      and draws them on a ``<canvas>``, and 'worker' does the same, but decodes in a
+      Web Worker, keeping the browser's main thread free (useful with many widgets).
+      The default 'auto' selects 'img'. Delta frames and raw frames (see *delta_frames*
+      and *transport*) are composited on a canvas, so then 'img' acts as 'canvas'.
+      Changes apply to views that are created afterwards.
     * *cursor*: the cursor style, ex: "crosshair", "grab". Valid cursors:
       https://developer.mozilla.org/en-US/docs/Web/CSS/cursor#keyword
 
     """
 
-    _esm = JS
-    _css = CSS
+    _esm = _LazyAsset("renderview.js", "renderview-afm.js")
+    _css = _LazyAsset("renderview.css")
 
     # A bitmask, allowing subclasses to determine the events that they receive
     # 1: old events (jupyter rfb spec, with 'event_type', 'time_stamp', 'pixel_ratio')
@@ -73,11 +270,40 @@ class RemoteFrameBuffer(anywidget.AnyWidget):
     # TODO: about a year after vispy and rendercanvas had a release that was compatible with the new style, drop the compatibility
     _event_compatibility = None
 
+    # Settings for delta frames: the tile size in pixels, the max number of
+    # delta frames in a row, and the max fraction of tiles that may change.
+    _rfb_tile_size = 64
+    _rfb_keyframe_interval = 50
+    _rfb_max_delta_fraction = 0.5
+
+    # The number of frames to keep records of, see get_frame_records()
+    _rfb_frame_record_count = 1024
+
     # Widget specific traits
     _frame_feedback = Dict({}).tag(sync=True)
     _has_visible_views = Bool(False).tag(sync=True)
     max_buffered_frames = Int(2, min=1)
+    encoder_threads = Int(0, min=0)
+    channel_order = Enum(["RGB", "BGR"], "RGB")
+    encoder = Unicode("auto")
+    image_format = Enum(["auto", "jpeg", "webp", "avif"], "auto")
+    delta_frames = Bool(False)
+    view_backend = Enum(["auto", "img", "canvas", "worker"], "auto")
+    _view_backend = Unicode("img").tag(sync=True)
+    _image_formats = List(Unicode()).tag(sync=True)  # set by the client
     quality = Int(80, min=1, max=100)
+    target_fps = Float(0, min=0)
+    max_fps = Float(0, min=0)
+    target_latency = Float(0, min=0)
+    min_quality = Int(30, min=1, max=100)
+    interaction_scale = Float(1.0, min=0.1, max=1.0)
+    event_throttle = Float(0.02, min=0)
+    _event_throttle = Float(0.02).tag(sync=True)
+    _event_batching = Bool(True).tag(sync=True)
+    transport = Enum(["encoded", "raw", "auto"], "encoded")
+    raw_compression = Enum(list(COMPRESSIONS), "none")
+    video_codec = Enum(["none", *VIDEO_CODECS], "none")
+    _video_codecs = List(Unicode()).tag(sync=True)  # set by the client
     css_width = Unicode("500px").tag(sync=True)
     css_height = Unicode("300px").tag(sync=True)
     resizable = Bool(True).tag(sync=True)
@@ -105,12 +331,48 @@ class RemoteFrameBuffer(anywidget.AnyWidget):
         # Init attributes for drawing
         self._rfb_last_frame = None
         self._rfb_pending_snapshot_display = None
+        self._rfb_snapshot_options = None, None  # format and quality
+        self._rfb_last_image = None  # (fingerprint, mimetype, quality, data)
         self._rfb_draw_requested = False
+        self._rfb_draw_request_time = None
+        self._rfb_pacer = None  # for max_fps
+        self._rfb_draw_timer = None
         self._rfb_frame_index = 0
         self._rfb_last_confirmed_index = 0
         self._rfb_last_resize_event = None
         self._rfb_warned_png = False
         self._rfb_lossless_draw_info = None
+        self._rfb_encoder_pool = None
+        self._rfb_last_sent_index = 0
+        self._rfb_failed_index = 0  # the last frame that could not be encoded
+        self._rfb_uncounted_indices = []  # dropped and skipped frames
+        self._rfb_sent_content = None  # (fingerprint, is_lossless)
+        self._rfb_quality_controller = None
+        self._rfb_transport_selector = None
+        self._rfb_sent_frame_info = {}  # index -> (nbytes, npixels, transport)
+        self._rfb_video_encoder = None
+        self._rfb_video_keyframe_requested = False
+        self._rfb_frame_buffers = FrameBufferRing()
+        self._rfb_render_task = None  # for async get_frame()
+        self._rfb_render_cancelled = False
+        self._rfb_event_tasks = set()  # for async handle_event()
+        self._rfb_event_queue = []  # coalesced events, dispatched at end of iteration
+        self._rfb_event_flush_scheduled = False
+        self._rfb_last_dispatched_event = None
+        self._rfb_event_time = 0  # moving averages of the time to handle an event
+        self._rfb_draw_time = 0  # and to draw a frame
+        self._rfb_encoding_arrays = {}  # index -> array, for frames in a worker thread
+        self._rfb_is_interacting = False  # rendering at reduced resolution
+        self._rfb_settle_timer = None  # ends the interaction, also without frames
+        self._rfb_last_input_time = float("-inf")  # for the frame scheduler
+        self._rfb_last_acked_index = 0
+        self._rfb_profiling_hooks = []
+        self._rfb_recorder = None  # a FrameRecordingWriter
+        self._rfb_frame_records = FrameRecorder(self._rfb_frame_record_count)
+        self._rfb_clock = ClockOffsetEstimator()  # the offset of the client's clock
+        self._rfb_last_clock_ping = 0
+        self._rfb_delta_base = None
+        self._rfb_deltas_since_keyframe = 0
         self._use_websocket = True  # Could be a prop, private for now
         # Init stats
         self.reset_stats()
@@ -120,6 +382,17 @@ class RemoteFrameBuffer(anywidget.AnyWidget):
             self._rfb_schedule_maybe_draw,
             names=["_frame_feedback", "_has_visible_views"],
         )
+        self.observe(self._rfb_shutdown_encoder_pool, names=["encoder_threads"])
+        self.observe(
+            self._rfb_update_view_backend,
+            names=["delta_frames", "transport", "video_codec", "view_backend"],
+        )
+        self.observe(
+            self._rfb_reset_quality_controller, names=["target_fps", "target_latency"]
+        )
+        self.observe(self._rfb_reset_pacer, names=["max_fps"])
+        self.observe(self._rfb_update_event_throttle, names=["event_throttle"])
+        self._rfb_update_view_backend()
 
     def print(self, *args, **kwargs):
         """Print to the widget's output area (for debugging purposes).
@@ -140,48 +413,242 @@ class RemoteFrameBuffer(anywidget.AnyWidget):
         # same event is emitted from JS when the model is closed in the client.
         anywidget.AnyWidget.close(self, *args, **kwargs)
         self._rfb_handle_msg(self, {"type": "close"}, [])
+        self._rfb_shutdown_encoder_pool()
+        if self._rfb_render_task is not None:
+            self._rfb_render_task.cancel()
+            self._rfb_render_task = None
+        if self._rfb_draw_timer is not None:
+            self._rfb_draw_timer.cancel()
+            self._rfb_draw_timer = None
+        scheduler = get_frame_scheduler()
+        if scheduler is not None:
+            scheduler.remove(self)
+        self.stop_recording(wait=False)
 
     def _rfb_handle_msg(self, widget, content, buffers):
         """Receive custom messages and filter our events."""
-        if "type" in content:
+        if content.get("type") == "event_batch":
+            # The client sends the events of an animation frame in one message
+            for event in unpack_event_batch(content, buffers):
+                self._rfb_handle_msg(widget, event, [])
+        elif "type" in content:
             event = content
 
             # We have some builtin handling
             if event["type"] == "resize":
                 self._rfb_last_resize_event = event
+                if self._rfb_is_interacting:
+                    event = self._rfb_get_scaled_resize_event(event)
                 self.request_draw()
+            elif event["type"] == "request_keyframe":
+                # Internal message from the client, not an event
+                self._rfb_on_keyframe_request()
+                return
+            elif event["type"] == "clock_pong":
+                # Internal message from the client: the reply to _rfb_ping_clock()
+                t0, t1, t2 = event["t0"], event["t1"], event["t2"]
+                self._rfb_clock.add_sample(t0, t1, t2, time.time())
+                return
             elif event["type"] == "close":
+                self._rfb_clock = ClockOffsetEstimator()
+                self._rfb_video_encoder = None
+                self._rfb_frame_buffers.clear()
                 self._rfb_last_frame = None
+                self._rfb_last_image = None
+                self._rfb_delta_base = None
+                self._rfb_sent_content = None
+                self._rfb_is_interacting = False
+            elif event["type"] in ("pointer_down", "wheel") or (
+                event["type"] == "pointer_move" and event.get("buttons")
+            ):
+                self._rfb_last_input_time = time.perf_counter()
+                self._rfb_start_interaction()
+            elif event["type"] == "key_down":
+                self._rfb_last_input_time = time.perf_counter()
             # Turn lists into tuples (js/json does not have tuples)
             if "buttons" in event:
                 event["buttons"] = tuple(event["buttons"])
             if "modifiers" in event:
                 event["modifiers"] = tuple(event["modifiers"])
 
-            # Handle backwards compatibility
-            if self._event_compatibility & 1:  # 1 or 3
-                old_event = event
-                event = {"event_type": old_event["type"]}
-                event.update(old_event)
-                event["time_stamp"] = event.get("timestamp", 0)
-                if "ratio" in event:
-                    event["pixel_ratio"] = event["ratio"]
-                if self._event_compatibility == 1:
-                    event.pop("type", None)
-                    event.pop("timestamp", None)
-                    event.pop("ratio", None)
-
-            # Let the subclass handle the event
+            self._rfb_coalesce_event(event)
+
+    def _rfb_coalesce_event(self, event):
+        """Dispatch the event, or merge it with events in the same loop iteration."""
+        if event["type"] not in COALESCED_EVENT_TYPES:
+            self._rfb_flush_events()
+            self._rfb_dispatch_event(event)
+            return
+        # Merge with a pending event, or with the event dispatched last
+        queue = self._rfb_event_queue
+        if queue:
+            merged = merge_events(queue[-1], event)
+            if merged is None:
+                queue.append(event)
+            else:
+                queue[-1] = merged
+                self._rfb_stats["coalesced_events"] += 1
+            return
+        last_event = self._rfb_last_dispatched_event
+        if last_event is not None and merge_events(last_event, event) is not None:
+            queue.append(event)
+            return
+        # Dispatch now, and start a window for events to be merged with it
+        if not self._rfb_event_flush_scheduled:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+            if loop is not None:
+                loop.call_soon(self._rfb_end_event_window)
+                self._rfb_event_flush_scheduled = True
+        self._rfb_dispatch_event(event)
+        if self._rfb_event_flush_scheduled:
+            self._rfb_last_dispatched_event = event
+
+    def _rfb_flush_events(self):
+        """Dispatch the pending coalesced events."""
+        queue, self._rfb_event_queue = self._rfb_event_queue, []
+        for event in queue:
+            self._rfb_dispatch_event(event)
+        self._rfb_last_dispatched_event = None
+
+    def _rfb_end_event_window(self):
+        self._rfb_event_flush_scheduled = False
+        self._rfb_flush_events()
+
+    def _rfb_update_event_throttle(self, *args):
+        """Set the client's throttle, based on the time to handle an event and draw."""
+        cost = self._rfb_event_time + self._rfb_draw_time
+        throttle = round(min(max(self.event_throttle, cost), 0.1), 3)
+        # Avoid syncing small changes
+        if abs(throttle - self._event_throttle) > 0.2 * self._event_throttle:
+            self._event_throttle = throttle
+
+    def _rfb_dispatch_event(self, event):
+        """Let the subclass handle the event."""
+        t0 = time.perf_counter()
+        is_coalesced = event["type"] in COALESCED_EVENT_TYPES
+
+        # Handle backwards compatibility
+        if self._event_compatibility & 1:  # 1 or 3
+            old_event = event
+            event = {"event_type": old_event["type"]}
+            event.update(old_event)
+            event["time_stamp"] = event.get("timestamp", 0)
+            if "ratio" in event:
+                event["pixel_ratio"] = event["ratio"]
+            if self._event_compatibility == 1:
+                event.pop("type", None)
+                event.pop("timestamp", None)
+                event.pop("ratio", None)
+
+        if self._rfb_profiling_hooks:
+            self._rfb_call_hooks("before_handle_event", event)
+        result = None
+        with self._output_context:
+            result = self.handle_event(event)
+        with self._output_context:
+            if inspect.isawaitable(result):
+                try:
+                    loop = asyncio.get_running_loop()
+                except RuntimeError:
+                    # E.g. the close event when the widget is deleted
+                    if inspect.iscoroutine(result):
+                        result.close()
+                    return
+                task = asyncio.ensure_future(result, loop=loop)
+                self._rfb_event_tasks.add(task)
+                task.add_done_callback(partial(self._rfb_on_event_handled, event, t0))
+            elif self._rfb_profiling_hooks:
+                duration = time.perf_counter() - t0
+                self._rfb_call_hooks("after_handle_event", event, duration)
+        if is_coalesced:
+            elapsed = time.perf_counter() - t0
+            self._rfb_event_time = 0.8 * self._rfb_event_time + 0.2 * elapsed
+            self._rfb_update_event_throttle()
+
+    def _rfb_on_event_handled(self, event, t0, task):
+        """Callback for when an async handle_event() is done."""
+        self._rfb_event_tasks.discard(task)
+        if self._rfb_profiling_hooks:
+            duration = time.perf_counter() - t0
+            self._rfb_call_hooks("after_handle_event", event, duration)
+        if not task.cancelled():
             with self._output_context:
-                self.handle_event(event)
+                task.result()  # show errors
+
+    def _rfb_on_keyframe_request(self):
+        """Send a keyframe, because the client is missing the base of a video or delta frame."""
+        self._rfb_video_keyframe_requested = True
+        self._rfb_delta_base = None
+        self._rfb_sent_content = None
+        self.request_draw()
+
+    def _rfb_schedule_settle(self, delay=0.3):
+        """End the interaction when there was no input for a while.
+
+        The lossless redraw ends the interaction too, but that is only
+        scheduled when a frame is sent, i.e. not if get_frame() returns None.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._rfb_settle_timer = loop.call_later(delay, self._rfb_check_settled)
+
+    def _rfb_check_settled(self, delay=0.3):
+        self._rfb_settle_timer = None
+        if not self._rfb_is_interacting:
+            return
+        idle_time = time.perf_counter() - self._rfb_last_input_time
+        if idle_time < delay:
+            self._rfb_schedule_settle(delay - idle_time)
+        else:
+            self._rfb_end_interaction()
+
+    def _rfb_get_scaled_resize_event(self, event):
+        """Get a copy of a resize event, with the physical size reduced."""
+        scale = self.interaction_scale
+        event = event.copy()
+        event["pwidth"] = max(1, int(event["pwidth"] * scale))
+        event["pheight"] = max(1, int(event["pheight"] * scale))
+        event["ratio"] = event["ratio"] * scale
+        return event
+
+    def _rfb_start_interaction(self):
+        """Start rendering at a reduced resolution, see *interaction_scale*."""
+        if self._rfb_is_interacting or self.interaction_scale >= 1:
+            return
+        if self._rfb_last_resize_event is None:
+            return
+        self._rfb_is_interacting = True
+        self._rfb_schedule_settle()
+        self._rfb_dispatch_event(
+            self._rfb_get_scaled_resize_event(self._rfb_last_resize_event)
+        )
+        self.request_draw()
+
+    def _rfb_end_interaction(self):
+        """Go back to rendering at full resolution."""
+        self._rfb_is_interacting = False
+        if self._rfb_settle_timer is not None:
+            self._rfb_settle_timer.cancel()
+            self._rfb_settle_timer = None
+        self._rfb_dispatch_event(self._rfb_last_resize_event.copy())
+        self.request_draw()
 
     # ---- drawing
 
-    def snapshot(self, pixel_ratio=None):
+    def snapshot(self, pixel_ratio=None, format=None, quality=None):
         """Render a frame and include the resulting image in the output.
 
         An initial placeholder output is produced, which is replaced by an html
-        ``<img>`` as soon as the next frame is rendered.
+        ``<img>`` as soon as the next frame is rendered. By default, the image is
+        the frame as it is sent to the client (so it is not encoded again). Set
+        ``format`` ('png', 'jpeg', 'webp' or 'avif') and/or ``quality`` to encode
+        the image differently. To get the image as bytes, or save it to a file, see
+        :func:`.get_snapshot() <jupyter_rfb.RemoteFrameBuffer.get_snapshot>`.
 
         If the widget is not displayed yet, a resize event is emitted to mimic a widget
         size. This happens at most once in the widget's lifetime. It will use the
@@ -189,12 +656,31 @@ class RemoteFrameBuffer(anywidget.AnyWidget):
         default to 500 or 300 pixels respectively. The ``pixel_ratio`` argument is then
         used to calculate the physical size.
         """
+        if format is not None or quality is not None:
+            check_snapshot_format(format or "jpeg", quality, self.quality)
+        self._rfb_emulate_resize(pixel_ratio)
+
+        self._rfb_snapshot_options = format, quality
+        self._rfb_pending_snapshot_display = display(
+            HTML(
+                "<div style='display: inline-block; padding: 5px; border-radius: 5px; background:#ddd; color:#000'>pending screenshot ...</span>"
+            ),
+            display_id=True,
+        )
+        self.request_draw()
+
+        # Note: It could be that _replace_snapshot() is called directly,
+        # (and _rfb_pending_snapshot_display set to None). But it could
+        # also be that it is called later. In any case, we just return None
+
+    def _rfb_emulate_resize(self, pixel_ratio=None):
+        """Emit a resize event if the widget has no size yet (e.g. is not displayed)."""
         if self._rfb_last_resize_event is None:
             css_width, css_height = self.css_width, self.css_height
             w = float(css_width[:-2]) if css_width.endswith("px") else 500
             h = float(css_height[:-2]) if css_height.endswith("px") else 300
             r = float(pixel_ratio) if pixel_ratio is not None else 1.0
-            pw, ph = int(w * r), (h * r)
+            pw, ph = int(w * r), int(h * r)
             event = {
                 "type": "resize",
                 "width": pw / r,
@@ -206,18 +692,6 @@ class RemoteFrameBuffer(anywidget.AnyWidget):
             }
             self._rfb_handle_msg(self, event, [])
 
-        self._rfb_pending_snapshot_display = display(
-            HTML(
-                "<div style='display: inline-block; padding: 5px; border-radius: 5px; background:#ddd; color:#000'>pending screenshot ...</span>"
-            ),
-            display_id=True,
-        )
-        self.request_draw()
-
-        # Note: It could be that _replace_snapshot() is called directly,
-        # (and _rfb_pending_snapshot_display set to None). But it could
-        # also be that it is called later. In any case, we just return None
-
     def _replace_snapshot(self, array):
         pending_display = self._rfb_pending_snapshot_display
         self._rfb_pending_snapshot_display = None
@@ -226,12 +700,79 @@ class RemoteFrameBuffer(anywidget.AnyWidget):
         w = event.get("width", array.shape[1])
         h = event.get("height", array.shape[0])
 
-        mimetype, data = array2compressed(array, 70)
-        src = f"data:image/{mimetype};base64," + encodebytes(data).decode()
+        # Use the image as sent to the client, if it is lossless
+        format, quality = self._rfb_snapshot_options
+        last_image = self._rfb_last_image
+        if format is None and quality is None:
+            if (
+                last_image is not None
+                and last_image[2] == 100
+                and last_image[0] == get_fingerprint(array)
+            ):
+                mimetype, data = last_image[1], last_image[3]
+            else:
+                format, quality = "jpeg", 70
+        if format is not None or quality is not None:
+            format, quality = check_snapshot_format(
+                format or "jpeg", quality, self.quality
+            )
+            layout = self._rfb_get_layout(array)
+            data = encode_snapshot(array, layout, format, quality, last_image)
+            mimetype = SNAPSHOT_MIMETYPES[format]
+        src = f"data:{mimetype};base64," + b64encode(data).decode()
         html = f"<img src='{src}' style='width:{w}px;height:{h}px;' />"
 
         pending_display.update(HTML(html))
 
+    def get_snapshot(self, format="png", quality=None, pixel_ratio=None):
+        """Get an image of the current frame, as bytes.
+
+        The ``format`` can be 'png', 'jpeg', 'webp' or 'avif' (the latter two
+        need Pillow). The ``quality`` is 100 for lossless, which is the default
+        for PNG and WebP. JPEG and AVIF use the widget's ``quality`` by default.
+
+        If the image that was last sent to the client has the same format and
+        quality (e.g. the lossless redraw), it is reused instead of encoded again.
+        A new frame is rendered if a draw is pending, or if no frame was drawn
+        yet. In the latter case the widget gets a size, like in
+        :func:`.snapshot() <jupyter_rfb.RemoteFrameBuffer.snapshot>`. To get
+        the snapshots of many widgets at once, see :func:`jupyter_rfb.get_snapshots`.
+        """
+        job = self._rfb_prepare_snapshot(format, quality, pixel_ratio)
+        return encode_snapshot(*job)
+
+    def save_snapshot(self, file, format=None, quality=None, pixel_ratio=None):
+        """Save an image of the current frame to a file (a filename or file object).
+
+        If ``format`` is None, it is derived from the extension of the filename,
+        defaulting to PNG. See
+        :func:`.get_snapshot() <jupyter_rfb.RemoteFrameBuffer.get_snapshot>`
+        for details.
+        """
+        format = format or get_snapshot_format(file)
+        write_bytes(file, self.get_snapshot(format, quality, pixel_ratio))
+
+    def _rfb_prepare_snapshot(self, format, quality, pixel_ratio=None):
+        """Get the arguments for encode_snapshot(), rendering a frame if needed."""
+        format, quality = check_snapshot_format(format, quality, self.quality)
+        array = self._rfb_last_frame
+        if array is None:
+            self._rfb_emulate_resize(pixel_ratio)
+        if array is None or self._rfb_draw_requested:
+            array = self.get_frame()
+            if inspect.isawaitable(array):
+                if inspect.iscoroutine(array):
+                    array.close()
+                raise RuntimeError(
+                    "Cannot render a snapshot with an async get_frame(), "
+                    + "wait until the widget has drawn a frame."
+                )
+            if array is None:
+                raise RuntimeError("Cannot get a snapshot, get_frame() returned None.")
+            array = np.asarray(array)
+        layout = self._rfb_get_layout(array)
+        return array, layout, format, quality, self._rfb_last_image
+
     def request_draw(self):
         """Schedule a new draw. This method itself returns immediately.
 
@@ -245,9 +786,52 @@ class RemoteFrameBuffer(anywidget.AnyWidget):
         # new frame_feedback, which will then trigger a draw.
         if not self._rfb_draw_requested:
             self._rfb_draw_requested = True
+            self._rfb_draw_request_time = time.perf_counter()
             self._rfb_cancel_lossless_draw()
+            self._rfb_cancel_stale_render()
             self._rfb_schedule_maybe_draw()
 
+    def get_frame_buffer(self, nchannels=3):
+        """Get an array to render the next frame into.
+
+        Returns a uint8 array with shape ``(pheight, pwidth, nchannels)``, i.e.
+        the physical size from the most recent resize event. The
+        :func:`.get_frame() <jupyter_rfb.RemoteFrameBuffer.get_frame>` method can
+        render into it and return it (or a view of it), so that no array has to be
+        allocated for each frame.
+
+        The buffers are reused: a buffer is only returned again once the widget no
+        longer uses it, e.g. for a frame that is being encoded, or for the lossless
+        redraw, and after at least ``max_buffered_frames + encoder_threads`` other
+        buffers. The buffers are re-created when the size changes. Note that the
+        buffer contains an older frame, so it must be overwritten completely.
+        """
+        event = self._rfb_last_resize_event
+        if event is None:
+            raise RuntimeError("The size of the widget is not known yet.")
+        if self._rfb_is_interacting:
+            event = self._rfb_get_scaled_resize_event(event)
+        shape = round(event["pheight"]), round(event["pwidth"]), int(nchannels)
+        # Enough buffers for the frames in flight and in the encoder threads, and one
+        # to render into, also before the widget holds on to the frames
+        scheduler = get_frame_scheduler()
+        if scheduler is not None and scheduler.encoder_threads > 0:
+            encoder_threads = scheduler.encoder_threads
+        else:
+            encoder_threads = self.encoder_threads
+        min_count = self.max_buffered_frames + encoder_threads + 1
+        in_use = self._rfb_get_arrays_in_use()
+        return self._rfb_frame_buffers.acquire(shape, in_use, min_count)
+
+    def _rfb_get_arrays_in_use(self):
+        """Get the arrays that the widget holds on to."""
+        arrays = [self._rfb_last_frame, *self._rfb_encoding_arrays.values()]
+        if self._rfb_lossless_draw_info is not None:
+            arrays.append(self._rfb_lossless_draw_info[0])
+        if self._rfb_delta_base is not None:
+            arrays.append(self._rfb_delta_base[1])
+        return [array for array in arrays if array is not None]
+
     def send_frame(self, array):
         """Send a frame to display.
 
@@ -277,18 +861,112 @@ class RemoteFrameBuffer(anywidget.AnyWidget):
         # Determine whether we should perform a draw: a draw was requested, and
         # the client is ready for a new frame, and the client widget is visible.
         frames_in_flight = self._rfb_frame_index - feedback.get("index", 0)
+        if self._rfb_render_task is not None:
+            frames_in_flight += 1
         should_draw = (
             self._rfb_draw_requested
             and frames_in_flight < self.max_buffered_frames
             and (self._has_visible_views or self._rfb_pending_snapshot_display)
         )
+        # Let the kernel-wide scheduler decide, if enabled. It wakes us up if not now.
+        scheduler = get_frame_scheduler()
+        if should_draw and scheduler is not None:
+            should_draw = scheduler.request_draw(self)
+        # Wait for the next tick if the frame rate is limited
+        pacer = self._rfb_get_pacer()
+        if should_draw and pacer is not None:
+            now = time.perf_counter()
+            delay = pacer.get_delay(now)
+            if delay > 0:
+                self._rfb_schedule_paced_draw(delay)
+                should_draw = False
+            else:
+                missed = pacer.mark_drawn(now, self._rfb_draw_request_time)
+                self._rfb_stats["missed_deadlines"] += missed
         # Do the draw if we should.
         if should_draw:
             self._rfb_draw_requested = False
+            self._rfb_draw_request_time = None
+            index = self._rfb_frame_index + 1
+            if self._rfb_profiling_hooks:
+                self._rfb_call_hooks("before_get_frame", index)
+            array = None
+            t0 = time.perf_counter()
             with self._output_context:
                 array = self.get_frame()
+            render_time = time.perf_counter() - t0
+            with self._output_context:
+                if inspect.isawaitable(array):
+                    loop = asyncio.get_running_loop()
+                    task = asyncio.ensure_future(array, loop=loop)
+                    self._rfb_render_task = task
+                    callback = partial(self._rfb_on_frame_rendered, index, t0)
+                    task.add_done_callback(callback)
+                else:
+                    if self._rfb_profiling_hooks:
+                        self._rfb_call_hooks("after_get_frame", index, render_time)
+                    if array is not None:
+                        self._rfb_send_frame(array, render_time=render_time)
+            elapsed = time.perf_counter() - t0
+            self._rfb_draw_time = 0.8 * self._rfb_draw_time + 0.2 * elapsed
+            self._rfb_update_event_throttle()
+
+    def _rfb_get_pacer(self):
+        """Get the frame pacer, or None if the frame rate is not limited."""
+        if self.max_fps <= 0:
+            return None
+        if self._rfb_pacer is None:
+            self._rfb_pacer = FramePacer(self.max_fps)
+        return self._rfb_pacer
+
+    def _rfb_reset_pacer(self, *args):
+        self._rfb_pacer = None
+        self._rfb_schedule_maybe_draw()
+
+    def _rfb_schedule_paced_draw(self, delay):
+        """Schedule _maybe_draw() at the next tick, unless it already is."""
+        if self._rfb_draw_timer is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._rfb_draw_timer = loop.call_later(delay, self._rfb_on_draw_timer)
+
+    def _rfb_on_draw_timer(self):
+        self._rfb_draw_timer = None
+        self._rfb_maybe_draw()
+
+    def _rfb_on_frame_rendered(self, index, t0, task):
+        """Callback for when an async get_frame() is done."""
+        render_time = time.perf_counter() - t0
+        if self._rfb_profiling_hooks:
+            self._rfb_call_hooks("after_get_frame", index, render_time)
+        if task is not self._rfb_render_task:
+            return  # cancelled, because a newer draw was requested
+        self._rfb_render_task = None
+        if not task.cancelled():
+            with self._output_context:
+                array = task.result()
+                self._rfb_render_cancelled = False
                 if array is not None:
-                    self._rfb_send_frame(array)
+                    self._rfb_send_frame(array, render_time=render_time)
+        self._rfb_schedule_maybe_draw()
+
+    def _rfb_cancel_stale_render(self):
+        """Cancel the pending async render, unless the previous was cancelled too."""
+        task = self._rfb_render_task
+        if task is None or self._rfb_render_cancelled:
+            return
+        try:
+            current_task = asyncio.current_task()
+        except RuntimeError:
+            current_task = None  # no running loop
+        if task is current_task:
+            return  # get_frame() requested a new draw
+        self._rfb_render_cancelled = True
+        self._rfb_render_task = None
+        task.cancel()
 
     def _rfb_schedule_lossless_draw(self, array, delay=0.3):
         self._rfb_cancel_lossless_draw()
@@ -307,57 +985,529 @@ class RemoteFrameBuffer(anywidget.AnyWidget):
 
     def _rfb_lossless_draw(self):
         array, _ = self._rfb_lossless_draw_info
-        self._rfb_send_frame(array, True)
-
-    def _rfb_send_frame(self, array, is_lossless_redraw=False):
-        """Actually send a frame over to the client."""
+        if self._rfb_is_interacting:
+            # The interaction has settled, render at full resolution
+            self._rfb_lossless_draw_info = None
+            self._rfb_end_interaction()
+        else:
+            self._rfb_send_frame(array, True)
+
+    def _rfb_update_view_backend(self, *args):
+        # Delta frames, raw frames and video frames need to be composited onto a canvas
+        needs_canvas = (
+            self.delta_frames
+            or self.transport != "encoded"
+            or self.video_codec != "none"
+        )
+        backend = self.view_backend
+        if backend in ("auto", "img"):
+            backend = "canvas" if needs_canvas else "img"
+        self._view_backend = backend
+        self._rfb_transport_selector = None
+
+    def _rfb_get_encoder_pool(self):
+        """Get the pool to encode frames in, or None to encode in the event loop."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return None  # Without a loop we cannot await the result
+        return self._rfb_get_thread_pool()
+
+    def _rfb_get_thread_pool(self):
+        """Get the shared encoder pool, or the widget's own, or None if disabled."""
+        scheduler = get_frame_scheduler()
+        if scheduler is not None and scheduler.encoder_threads > 0:
+            return scheduler.get_encoder_pool()
+        if self.encoder_threads <= 0:
+            return None
+        if self._rfb_encoder_pool is None:
+            self._rfb_encoder_pool = ThreadPoolExecutor(
+                self.encoder_threads, thread_name_prefix="jupyter_rfb_encoder"
+            )
+        return self._rfb_encoder_pool
+
+    def _rfb_shutdown_encoder_pool(self, *args):
+        pool = self._rfb_encoder_pool
+        self._rfb_encoder_pool = None
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+    def _rfb_send_frame(self, array, is_lossless_redraw=False, render_time=np.nan):
+        """Actually send a frame over to the client.
+
+        The render_time is the time that get_frame() took, for the frame records.
+        """
 
         # For considerations about performance,
         # see https://github.com/vispy/jupyter_rfb/issues/3
 
+        # Also accept objects that support the buffer protocol (this is a view)
+        array = np.asarray(array)
+
         # Failsafe
         if array.size == 0:
             return
 
-        quality = 100 if is_lossless_redraw else self.quality
+        quality = 100 if is_lossless_redraw else self._rfb_get_quality()
+
+        # Frames are hashed when they are encoded (i.e. in a worker thread if there
+        # is a pool), and skipped if the client already has them. The lossless
+        # redraw happens when idle, so it can be hashed here, and skipped silently.
+        fingerprint = None
+        skip_fingerprint = self._rfb_get_skip_fingerprint(is_lossless_redraw)
+        if is_lossless_redraw:
+            fingerprint = get_fingerprint(array)
+            if fingerprint == skip_fingerprint:
+                return
+            skip_fingerprint = None
 
         self._rfb_frame_index += 1
         self._rfb_last_frame = array
-        timestamp = time.time()
+        frame = {
+            "index": self._rfb_frame_index,
+            "timestamp": time.time(),
+            "quality": quality,
+            "is_lossless_redraw": is_lossless_redraw,
+            "layout": self._rfb_get_layout(array),
+            "image_format": self._rfb_get_image_format(quality == 100),
+            "transport": self._rfb_get_transport(quality == 100),
+            "raw_compression": self._rfb_get_raw_compression(),
+            "jpeg_backend": None,
+            "base_index": 0,
+            "base": None,
+            "fingerprint": fingerprint,
+            "skip_fingerprint": skip_fingerprint,
+            "keyframe": False,
+            "render_time": render_time,
+        }
+        if frame["transport"] == "video":
+            frame["keyframe"] = self._rfb_video_keyframe_requested
+            self._rfb_video_keyframe_requested = False
+        elif (
+            frame["transport"] == "encoded"
+            and quality < 100
+            and frame["image_format"] == "jpeg"
+        ):
+            frame["jpeg_backend"] = self._rfb_get_jpeg_backend(
+                array, frame["layout"], quality
+            )
+
+        # Determine whether this can be a delta frame
+        if self.delta_frames and self._use_websocket and not is_lossless_redraw:
+            base_index, base = self._rfb_delta_base or (0, None)
+            if (
+                base is not None
+                and frame["transport"] != "video"
+                and base.shape == array.shape
+                and self._rfb_deltas_since_keyframe < self._rfb_keyframe_interval
+            ):
+                frame["base_index"], frame["base"] = base_index, base
+            # The next frame is compared to this one. The subclass may render the
+            # next frame into the same array, unless it is from get_frame_buffer().
+            next_base = array
+            if not self._rfb_frame_buffers.owns(array):
+                next_base = array.copy()
+            self._rfb_delta_base = frame["index"], next_base
+
+        self._rfb_submit_frame(frame, array)
+
+    def _rfb_submit_frame(self, frame, array):
+        """Encode the frame now, or in a worker thread, and then send it."""
+        # Video frames must be encoded in order
+        if self._rfb_profiling_hooks:
+            self._rfb_call_hooks("before_encode", frame["index"])
+        pool = self._rfb_get_encoder_pool()
+        if pool is None or frame["transport"] == "video":
+            try:
+                encoded = self._rfb_encode_frame(frame, array)
+            except Exception:
+                self._rfb_release_failed_frame(frame)
+                raise
+            if self._rfb_profiling_hooks:
+                self._rfb_call_hooks(
+                    "after_encode",
+                    frame["index"],
+                    encoded["encoding_time"],
+                    encoded["mimetype"],
+                )
+            self._rfb_finish_frame(frame, array, encoded)
+        else:
+            loop = asyncio.get_running_loop()
+            self._rfb_encoding_arrays[frame["index"]] = array
+            future = loop.run_in_executor(pool, self._rfb_encode_frame, frame, array)
+            future.add_done_callback(partial(self._rfb_on_frame_encoded, frame, array))
+
+    def _rfb_get_quality(self):
+        """Get the quality for the next frame, which may be adaptive."""
+        if self._rfb_get_roundtrip_budget() <= 0:
+            return self.quality
+        controller = self._rfb_quality_controller
+        if controller is None:
+            controller = QualityController(self.min_quality, self.quality)
+            self._rfb_quality_controller = controller
+        else:
+            controller.set_bounds(self.min_quality, self.quality)
+        return controller.quality
+
+    def _rfb_get_roundtrip_budget(self):
+        """Get the max roundtrip time for adaptive quality, or 0 if it is disabled."""
+        budgets = []
+        if self.target_latency > 0:
+            budgets.append(self.target_latency)
+        if self.target_fps > 0:
+            # With n frames in flight, a frame can take n frame-intervals
+            budgets.append(self.max_buffered_frames / self.target_fps)
+        return min(budgets) if budgets else 0
+
+    def _rfb_reset_quality_controller(self, *args):
+        self._rfb_quality_controller = None
+
+    def _rfb_get_transport(self, is_lossless):
+        """Get the transport for the next frame: 'raw', 'encoded' or 'video'."""
+        if not self._use_websocket:
+            return "encoded"  # raw frames are too large for base64
+        elif (
+            not is_lossless
+            and self.video_codec in self._video_codecs
+            and get_av() is not None
+        ):
+            return "video"
+        elif self.transport == "auto":
+            if self._rfb_transport_selector is None:
+                self._rfb_transport_selector = TransportSelector()
+            return self._rfb_transport_selector.select()
+        return self.transport
+
+    def _rfb_get_raw_compression(self):
+        """Get the compression for raw frames, falling back to 'none' if needed."""
+        compression = self.raw_compression
+        if compression == "lz4" and get_lz4_block() is None:
+            return "none"
+        return compression
+
+    def _rfb_get_skip_fingerprint(self, is_lossless_redraw):
+        """Get the fingerprint of the frame that the client has, if the next frame
+        can be skipped when it has the same fingerprint, or None.
+        """
+        if self._rfb_sent_content is None:
+            return None
+        sent_fingerprint, sent_is_lossless = self._rfb_sent_content
+        if (
+            (sent_is_lossless or not is_lossless_redraw)
+            and self._rfb_last_sent_index == self._rfb_frame_index
+            and self._rfb_pending_snapshot_display is None
+        ):
+            return sent_fingerprint
+        return None
+
+    def _rfb_skip_frame(self, frame, array, encoded):
+        """Send a frame without image data, because the client already has it."""
+        if self._rfb_sent_content is None:
+            # The client lost the frame in the meantime (see request_keyframe)
+            frame = {**frame, "fingerprint": encoded["fingerprint"]}
+            frame["skip_fingerprint"] = None
+            self._rfb_submit_frame(frame, array)
+            return
+        self._rfb_last_sent_index = frame["index"]
+        self._rfb_uncounted_indices.append(frame["index"])
+        self._rfb_stats["skipped_frames"] += 1
+        self._rfb_stats["copies"] += encoded["copies"]
+        if frame["keyframe"]:
+            self._rfb_video_keyframe_requested = True  # for the next video frame
+        # The lossless redraw was cancelled by request_draw()
+        if self._rfb_is_interacting or not self._rfb_sent_content[1]:
+            self._rfb_schedule_lossless_draw(array)
+        self._rfb_send_unchanged_frame(frame["index"])
 
-        # Turn array into a based64-encoded JPEG or PNG
+    def _rfb_send_unchanged_frame(self, index):
+        """Send a frame message without image data, so the client keeps its image."""
+        msg = dict(
+            type="framebufferdata",
+            mimetype="",
+            data_b64=None,
+            index=index,
+            timestamp=time.time(),
+            unchanged=True,
+        )
+        self.send(msg, [])
+        if self._rfb_recorder is not None:
+            self._rfb_recorder.write(msg, [])
+
+    def _rfb_release_failed_frame(self, frame):
+        """Release the index of a frame that could not be encoded.
+
+        The frame counts as dropped. Unless a newer frame was sent already, an
+        unchanged frame is sent in its place, so that the client confirms the
+        index, and the frames in flight go down.
+        """
+        index = frame["index"]
+        self._rfb_uncounted_indices.append(index)
+        self._rfb_stats["dropped_frames"] += 1
+        if index < self._rfb_last_sent_index:
+            return
+        # The client does not have this frame, so it cannot be skipped or be a base
+        self._rfb_failed_index = index
+        self._rfb_sent_content = None
+        if self._rfb_delta_base is not None and self._rfb_delta_base[0] == index:
+            self._rfb_delta_base = None
+        if frame["transport"] == "video":
+            self._rfb_video_keyframe_requested = True
+        self._rfb_last_sent_index = index
+        self._rfb_send_unchanged_frame(index)
+
+    def _rfb_encode_frame(self, frame, array):
+        """Turn the array into an image. May be called from a worker thread.
+
+        If the frame has a base, only the tiles that differ from it are encoded.
+        If the frame has the fingerprint to skip, it is not encoded at all.
+        """
         t1 = time.perf_counter()
-        mimetype, data = array2compressed(array, quality)
-        if self._use_websocket:
+        stats = {"copies": 0}
+        fingerprint = frame["fingerprint"]
+        if fingerprint is None:
+            fingerprint = get_fingerprint(array, stats)
+        if fingerprint == frame["skip_fingerprint"]:
+            return {
+                "unchanged": True,
+                "fingerprint": fingerprint,
+                "mimetype": "",
+                "datas": [],
+                "data_b64": None,
+                "tiles": None,
+                "keyframe": None,
+                "encoding_time": time.perf_counter() - t1,
+                "b64_encoding_time": 0,
+                "copies": stats["copies"],
+            }
+        quality = frame["quality"]
+        base = frame["base"]
+        # Get changed tiles
+        tiles = None
+        if base is not None:
+            tile_size = self._rfb_tile_size
+            changed = get_changed_tiles(base, array, tile_size)
+            if changed.mean() <= self._rfb_max_delta_fraction:
+                tiles = get_changed_rects(changed, tile_size, array.shape)
+        # Lossless frames are compressed more when idle, but not with the
+        # "small" preset, which takes too long for large frames
+        png_preset = "default" if frame["is_lossless_redraw"] else "fast"
+        if frame["image_format"] == "webp":
+            png_preset = "fast"  # the other WebP presets take several times longer
+        encode_kwargs = dict(
+            png_preset=png_preset,
+            jpeg_backend=frame["jpeg_backend"],
+            layout=frame["layout"],
+            stats=stats,
+            image_format=frame["image_format"],
+        )
+        # Encode
+        keyframe = None
+        if frame["transport"] == "video":
+            encoder = self._rfb_get_video_encoder(array, quality)
+            data, keyframe = encoder.encode(array, frame["layout"], frame["keyframe"])
+            mimetype, datas = f"video/{encoder.codec}", [data]
+        elif frame["transport"] == "raw":
+            mimetype, datas = RAW_MIMETYPE, []
+            rects = [(0, 0, array.shape[1], array.shape[0])] if tiles is None else tiles
+            for x, y, w, h in rects:
+                tile = array[y : y + h, x : x + w]
+                data = array2raw(tile, frame["layout"], frame["raw_compression"])
+                datas.append(data)
+        elif tiles is None:
+            mimetype, data = array2compressed_cached(
+                array, fingerprint, quality, **encode_kwargs
+            )
             datas = [data]
+        else:
+            mimetype, datas = "image/jpeg", []
+            for x, y, w, h in tiles:
+                tile = array[y : y + h, x : x + w]
+                mimetype, data = array2compressed(tile, quality, **encode_kwargs)
+                datas.append(data)
+        t2 = time.perf_counter()
+        b64_encoding_time = 0
+        if self._use_websocket:
             data_b64 = None
         else:
+            data_b64 = f"data:{mimetype};base64," + encodebytes(datas[0]).decode()
             datas = []
-            data_b64 = f"data:{mimetype};base64," + encodebytes(data).decode()
-        t2 = time.perf_counter()
+            b64_encoding_time = time.perf_counter() - t2
+        return {
+            "unchanged": False,
+            "fingerprint": fingerprint,
+            "mimetype": mimetype,
+            "datas": datas,
+            "data_b64": data_b64,
+            "tiles": tiles,
+            "keyframe": keyframe,
+            "encoding_time": t2 - t1,
+            "b64_encoding_time": b64_encoding_time,
+            "copies": stats["copies"],
+        }
 
-        if "jpeg" in mimetype:
+    def _rfb_get_layout(self, array):
+        """Get the pixel layout of the given array, e.g. 'RGB' or 'BGRA'."""
+        nchannels = 1 if array.ndim == 2 else array.shape[2]
+        return get_layout(nchannels, self.channel_order)
+
+    def _rfb_get_image_format(self, is_lossless):
+        """Get the format to encode a frame in: 'jpeg', 'webp' or 'avif'.
+
+        Falls back to 'jpeg' (which means PNG for lossless frames) if the
+        client cannot decode the selected format.
+        """
+        name = self.image_format
+        if name == "auto":
+            name = "jpeg"  # WebP is smaller, but much slower to encode
+        if is_lossless and name == "avif":
+            name = "webp"  # lossless AVIF is slow and not smaller than WebP
+        if f"image/{name}" not in self._image_formats:
+            return "jpeg"
+        return name
+
+    def _rfb_get_video_encoder(self, array, quality):
+        """Get the video encoder for this frame, creating a new one if needed."""
+        encoder = self._rfb_video_encoder
+        if (
+            encoder is None
+            or encoder.codec != self.video_codec
+            or encoder.shape != array.shape[:2]
+            or encoder.quality != quality
+        ):
+            encoder = VideoEncoder(self.video_codec, array.shape, quality)
+            self._rfb_video_encoder = encoder
+        return encoder
+
+    @validate("encoder")
+    def _rfb_validate_encoder(self, proposal):
+        name = proposal["value"]
+        options = ["auto", "calibrate", *list_jpeg_encoders()]
+        if name not in options:
+            raise TraitError(f"Invalid JPEG encoder {name!r}, options are {options}")
+        return name
+
+    def _rfb_get_jpeg_backend(self, array, layout=None, quality=80):
+        """Get the name of the JPEG encoder to use, or None for the default.
+
+        Calibration runs in the background, the default is used until it is done.
+        """
+        name = self.encoder
+        if name == "auto":
+            return None
+        elif name == "calibrate":
+            return calibrate_jpeg_encoder(array.shape, quality, layout, wait=False)
+        return name
+
+    def _rfb_on_frame_encoded(self, frame, array, future):
+        """Callback for when a frame is encoded in a worker thread."""
+        self._rfb_encoding_arrays.pop(frame["index"], None)
+        encoded = None
+        if not future.cancelled():
+            with self._output_context:
+                encoded = future.result()
+        if encoded is None:
+            self._rfb_release_failed_frame(frame)
+            return
+        if self._rfb_profiling_hooks:
+            self._rfb_call_hooks(
+                "after_encode",
+                frame["index"],
+                encoded["encoding_time"],
+                encoded["mimetype"],
+            )
+        if frame["index"] < self._rfb_last_sent_index:
+            # A newer frame was sent already, so this one is stale
+            self._rfb_uncounted_indices.append(frame["index"])
+            self._rfb_stats["dropped_frames"] += 1
+            return
+        self._rfb_finish_frame(frame, array, encoded)
+
+    def _rfb_finish_frame(self, frame, array, encoded):
+        """Send an encoded frame to the client."""
+
+        if encoded["unchanged"]:
+            self._rfb_skip_frame(frame, array, encoded)
+            return
+
+        # A delta frame is only valid if its base is what the client has now
+        if encoded["tiles"] is not None:
+            base_index = frame["base_index"]
+            if (
+                base_index == self._rfb_last_sent_index
+                and base_index != self._rfb_failed_index
+            ):
+                self._rfb_deltas_since_keyframe += 1
+            else:
+                # Encode it as a keyframe, in a worker thread if there is a pool
+                frame = {**frame, "base_index": 0, "base": None}
+                frame["fingerprint"] = encoded["fingerprint"]
+                self._rfb_submit_frame(frame, array)
+                return
+        if encoded["tiles"] is None:
+            self._rfb_deltas_since_keyframe = 0
+
+        mimetype = encoded["mimetype"]
+        quality = frame["quality"]
+        is_lossless = quality == 100 or mimetype in ("image/png", RAW_MIMETYPE)
+        self._rfb_last_sent_index = frame["index"]
+        self._rfb_sent_content = encoded["fingerprint"], is_lossless
+
+        if not is_lossless:
             self._rfb_schedule_lossless_draw(array)
         else:
-            self._rfb_cancel_lossless_draw()
+            if self._rfb_is_interacting:
+                self._rfb_schedule_lossless_draw(array)  # to end the interaction
+            else:
+                self._rfb_cancel_lossless_draw()
             # Issue png warning?
-            if quality < 100 and not self._rfb_warned_png:
+            if quality < 100 and mimetype == "image/png" and not self._rfb_warned_png:
                 self._rfb_warned_png = True
                 self.print(
                     "Warning: No JPEG encoder found, using PNG instead. "
                     + "Install simplejpeg or pillow for better performance."
                 )
 
-        if is_lossless_redraw:
+        # Record the frame, and let the scheduler know
+        nbytes = sum(len(data) for data in encoded["datas"])
+        nbytes += len(encoded["data_b64"] or "")
+        self._rfb_frame_records.add(
+            frame["index"],
+            frame["timestamp"],
+            frame["render_time"],
+            encoded["encoding_time"],
+            nbytes,
+            mimetype,
+            frame["index"] - self._frame_feedback.get("index", 0),
+            is_lossless,
+        )
+        scheduler = get_frame_scheduler()
+        if scheduler is not None:
+            scheduler.frame_sent(self, nbytes, encoded["encoding_time"])
+
+        # Keep the last image, so that snapshots can reuse it
+        if encoded["tiles"] is None and encoded["datas"]:
+            if mimetype in SNAPSHOT_MIMETYPES.values():
+                image_quality = 100 if mimetype == "image/png" else quality
+                image = encoded["fingerprint"], mimetype, image_quality
+                self._rfb_last_image = (*image, encoded["datas"][0])
+
+        if frame["is_lossless_redraw"]:
             # No stats, also not on the confirmation of this frame
-            self._rfb_last_confirmed_index = self._rfb_frame_index
+            self._rfb_last_confirmed_index = frame["index"]
         else:
             # Stats
-            self._rfb_stats["img_encoding_sum"] += t2 - t1
+            self._rfb_stats["img_encoding_sum"] += encoded["encoding_time"]
+            self._rfb_stats["b64_encoding_sum"] += encoded["b64_encoding_time"]
+            self._rfb_stats["copies"] += encoded["copies"]
             self._rfb_stats["sent_frames"] += 1
+            self._rfb_stats["quality_history"].append(quality)
+            if self._rfb_quality_controller or self._rfb_transport_selector:
+                npixels = array.shape[0] * array.shape[1]
+                info = nbytes, npixels, frame["transport"]
+                self._rfb_sent_frame_info[frame["index"]] = info
             if self._rfb_stats["start_time"] <= 0:  # Start measuring
-                self._rfb_stats["start_time"] = timestamp
-                self._rfb_last_confirmed_index = self._rfb_frame_index - 1
+                self._rfb_stats["start_time"] = frame["timestamp"]
+                self._rfb_last_confirmed_index = frame["index"] - 1
 
         # Reload the output if we did not have a frame when the widget was first loaded
         if self._rfb_pending_snapshot_display is not None:
@@ -367,11 +1517,32 @@ class RemoteFrameBuffer(anywidget.AnyWidget):
         msg = dict(
             type="framebufferdata",
             mimetype=mimetype,
-            data_b64=data_b64,
-            index=self._rfb_frame_index,
-            timestamp=timestamp,
+            data_b64=encoded["data_b64"],
+            index=frame["index"],
+            timestamp=frame["timestamp"],
         )
-        self.send(msg, datas)
+        if (
+            encoded["tiles"] is not None
+            or mimetype == RAW_MIMETYPE
+            or encoded["keyframe"] is not None
+        ):
+            msg["shape"] = array.shape[:2]
+        if encoded["tiles"] is not None:
+            msg["tiles"] = encoded["tiles"]
+        if mimetype == RAW_MIMETYPE:
+            msg["compression"] = frame["raw_compression"]
+        if encoded["keyframe"] is not None:
+            msg["keyframe"] = encoded["keyframe"]
+        if self._rfb_profiling_hooks:
+            self._rfb_call_hooks("before_send", frame["index"])
+            t0 = time.perf_counter()
+            self.send(msg, encoded["datas"])
+            duration = time.perf_counter() - t0
+            self._rfb_call_hooks("after_send", frame["index"], duration, nbytes)
+        else:
+            self.send(msg, encoded["datas"])
+        if self._rfb_recorder is not None:
+            self._rfb_recorder.write(msg, encoded["datas"])
 
     # ----- related to stats
 
@@ -381,12 +1552,23 @@ class RemoteFrameBuffer(anywidget.AnyWidget):
             "start_time": 0,
             "last_time": 1,
             "sent_frames": 0,
+            "dropped_frames": 0,
+            "skipped_frames": 0,
             "confirmed_frames": 0,
             "roundtrip_count": 0,
             "roundtrip_sum": 0,
             "delivery_sum": 0,
+            "stage_count": 0,
+            "decode_sum": 0,
+            "paint_sum": 0,
             "img_encoding_sum": 0,
+            "b64_encoding_sum": 0,
+            "copies": 0,
+            "missed_deadlines": 0,
+            "coalesced_events": 0,
+            "quality_history": deque(maxlen=256),
         }
+        self._rfb_frame_records.clear()
 
     def get_stats(self):
         """Get the current stats since the last time ``.reset_stats()`` was called.
@@ -394,40 +1576,225 @@ class RemoteFrameBuffer(anywidget.AnyWidget):
         Stats is a dict with the following fields:
 
         * *sent_frames*: the number of frames sent.
+        * *dropped_frames*: the number of frames that were encoded in a worker thread,
+          but not sent because a newer frame was ready first.
+        * *skipped_frames*: the number of frames that were not encoded, because they
+          were identical to the previous frame. These don't count as confirmed frames.
         * *confirmed_frames*: number of frames confirmed by the client.
         * *roundtrip*: avererage time for processing a frame, including receiver confirmation.
         * *delivery*: average time for processing a frame until it's received by the client.
-          This measure assumes that the clock of the server and client are precisely synced.
+          The time at which the client received the frame is converted to the server's
+          clock using *clock_offset*.
+        * *decode*: average time from receiving a frame until it's decoded by the client,
+          including the time that it waited for the previous frame to be painted.
+        * *paint*: average time from decoding a frame until it's painted.
+        * *clock_offset*: the estimated offset between the clock of the client and that
+          of the server, in seconds. It's estimated from the time that pings take to
+          the client and back, as NTP does.
         * *img_encoding*: the average time spent on encoding the array into an image.
-        * *b64_encoding*: the average time spent on base64 encoding the data.
+        * *copies*: the number of times that a frame had to be copied before it could
+          be encoded, e.g. to convert the channel order. See the *channel_order* trait.
+        * *missed_deadlines*: the number of ticks that passed while a draw was
+          requested, but could not happen. Only counted when *max_fps* is set.
+        * *coalesced_events*: the number of pointer_move and wheel events that were
+          merged into another event, because they arrived in quick succession.
+        * *quality_history*: the quality of the (up to 256) most recently sent frames,
+          excluding lossless redraws. See the *target_fps* trait.
+        * *b64_encoding*: the average time spent on base64 encoding the data. This is
+          only done when frames cannot be sent as binary buffers.
         * *fps*: the average FPS, measured from the first frame sent since ``.reset_stats()``
           was called, until the last confirmed frame.
+        * *percentiles*: a dict with the 50th, 95th and 99th percentiles of the
+          *render_time*, *encoding_time*, *nbytes* and *ack_latency* of the frames
+          (including lossless redraws), see ``.get_frame_records()``.
+        * *throughput*: the number of bytes sent per second, over the same frames.
         """
         d = self._rfb_stats
         roundtrip_count_div = d["roundtrip_count"] or 1
+        stage_count_div = d["stage_count"] or 1
         sent_frames_div = d["sent_frames"] or 1
         fps_div = (d["last_time"] - d["start_time"]) or 0.001
+        percentiles, throughput = self._rfb_frame_records.get_summary()
         return {
             "sent_frames": d["sent_frames"],
+            "dropped_frames": d["dropped_frames"],
+            "skipped_frames": d["skipped_frames"],
             "confirmed_frames": d["confirmed_frames"],
             "roundtrip": d["roundtrip_sum"] / roundtrip_count_div,
             "delivery": d["delivery_sum"] / roundtrip_count_div,
+            "decode": d["decode_sum"] / stage_count_div,
+            "paint": d["paint_sum"] / stage_count_div,
+            "clock_offset": self._rfb_clock.offset,
             "img_encoding": d["img_encoding_sum"] / sent_frames_div,
+            "b64_encoding": d["b64_encoding_sum"] / sent_frames_div,
+            "copies": d["copies"],
+            "missed_deadlines": d["missed_deadlines"],
+            "coalesced_events": d["coalesced_events"],
+            "quality_history": list(d["quality_history"]),
             "fps": d["confirmed_frames"] / fps_div,
+            "percentiles": percentiles,
+            "throughput": throughput,
         }
 
+    def get_frame_records(self):
+        """Get the records of the most recently sent frames, as a NumPy structured array.
+
+        A record is kept for each of the (up to 1024) most recently sent frames,
+        since the last time ``.reset_stats()`` was called. The records have the
+        following fields:
+
+        * *index*: the index of the frame.
+        * *timestamp*: the time (``time.time()``) at which the frame was submitted.
+        * *render_time*: the time that ``get_frame()`` took, or NaN if not known.
+        * *encoding_time*: the time spent on encoding the frame.
+        * *nbytes*: the size of the encoded frame.
+        * *mimetype*: the mimetype of the encoded frame.
+        * *in_flight*: the number of unconfirmed frames when this frame was sent,
+          including this frame.
+        * *ack_latency*: the time until the client confirmed the frame, or NaN if
+          it has not been confirmed yet.
+        * *lossless*: whether the frame was sent losslessly.
+        """
+        return self._rfb_frame_records.get_records()
+
+    def save_frame_records(self, file):
+        """Save the frame records to a CSV file, given as a filename or file object.
+
+        See ``.get_frame_records()`` for the fields.
+        """
+        save_records_csv(self.get_frame_records(), file)
+
     def _rfb_update_stats(self, feedback):
         """Update the stats when a new frame feedback has arrived."""
         last_index = feedback.get("index", 0)
+        if last_index > self._rfb_last_acked_index:
+            self._rfb_last_acked_index = last_index
+            self._rfb_frame_records.acknowledge(last_index, time.time())
+            if self._rfb_profiling_hooks:
+                latency = time.time() - feedback["timestamp"]
+                self._rfb_call_hooks("on_ack", last_index, latency)
         if last_index > self._rfb_last_confirmed_index:
             timestamp = feedback["timestamp"]
-            nframes = last_index - self._rfb_last_confirmed_index
+            first_index = self._rfb_last_confirmed_index
+            nframes = last_index - first_index
+            # Frames that were dropped or skipped are confirmed, but don't count
+            if self._rfb_uncounted_indices:
+                uncounted = self._rfb_uncounted_indices
+                nframes -= sum(1 for i in uncounted if first_index < i <= last_index)
+                self._rfb_uncounted_indices = [i for i in uncounted if i > last_index]
             self._rfb_last_confirmed_index = last_index
             self._rfb_stats["confirmed_frames"] += nframes
             self._rfb_stats["roundtrip_count"] += 1
             self._rfb_stats["roundtrip_sum"] += time.time() - timestamp
-            self._rfb_stats["delivery_sum"] += feedback["localtime"] - timestamp
+            # The times from the client are in its clock, which may not be in sync
+            received = feedback.get("received", feedback["localtime"])
+            received = self._rfb_clock.to_local_time(received)
+            self._rfb_stats["delivery_sum"] += received - timestamp
+            if "decoded" in feedback:
+                decode_time = feedback["decoded"] - feedback["received"]
+                paint_time = feedback["painted"] - feedback["decoded"]
+                self._rfb_stats["stage_count"] += 1
+                self._rfb_stats["decode_sum"] += decode_time
+                self._rfb_stats["paint_sum"] += paint_time
+                self._rfb_ping_clock()
             self._rfb_stats["last_time"] = time.time()
+            self._rfb_process_feedback(last_index, time.time() - timestamp)
+
+    def _rfb_ping_clock(self):
+        """Send a ping to the client, to estimate the offset of its clock.
+
+        Pings are sent along with the frames: often at first, until the
+        estimate has settled, and occasionally after that, to track drift.
+        """
+        interval = 10 if self._rfb_clock.is_settled else 0.5
+        now = time.time()
+        if now - self._rfb_last_clock_ping >= interval:
+            self._rfb_last_clock_ping = now
+            self.send({"type": "clock_ping", "t0": now}, [])
+
+    def _rfb_process_feedback(self, index, roundtrip):
+        """Let the quality controller and transport selector process a confirmed frame."""
+        info = self._rfb_sent_frame_info.get(index, None)
+        self._rfb_sent_frame_info = {
+            i: x for i, x in self._rfb_sent_frame_info.items() if i > index
+        }
+        if info is None:
+            return
+        nbytes, npixels, transport = info
+        controller = self._rfb_quality_controller
+        if controller is not None:
+            budget = self._rfb_get_roundtrip_budget()
+            controller.update(index, roundtrip, nbytes, budget, self._rfb_frame_index)
+        selector = self._rfb_transport_selector
+        if selector is not None:
+            selector.update(transport, roundtrip, npixels)
+
+    # ----- related to profiling
+
+    def add_profiling_hook(self, hook):
+        """Add a hook that is called at each stage of a frame, and for each event.
+
+        The hook is an instance of a subclass of
+        :class:`ProfilingHook <jupyter_rfb.ProfilingHook>`, that
+        implements (some of) its methods. Each method is called with the widget,
+        and the frame index or event, and (for the ``after_`` methods) the
+        duration of the stage. E.g.
+        :class:`SamplingProfiler <jupyter_rfb.SamplingProfiler>` profiles
+        ``get_frame()`` with cProfile. When no hooks are added, there is
+        virtually no overhead.
+        """
+        if hook not in self._rfb_profiling_hooks:
+            self._rfb_profiling_hooks.append(hook)
+
+    def remove_profiling_hook(self, hook):
+        """Remove a hook that was added with ``add_profiling_hook()``."""
+        if hook in self._rfb_profiling_hooks:
+            self._rfb_profiling_hooks.remove(hook)
+
+    def _rfb_call_hooks(self, name, *args):
+        """Call the given method of the profiling hooks, showing any errors."""
+        for hook in list(self._rfb_profiling_hooks):
+            try:
+                getattr(hook, name)(self, *args)
+            except Exception:
+                self._output_context.append_stderr(traceback.format_exc())
+
+    # ----- related to recording
+
+    def start_recording(self, filename):
+        """Start recording the frames that are sent to the client to a file.
+
+        Each frame is recorded exactly as it is sent (i.e. encoded, and possibly
+        a delta frame), together with its index and timestamp. The frames are
+        written in a background thread, so recording adds no encoding, and does
+        not block the event loop. The recording can be read with
+        :class:`FrameRecording <jupyter_rfb.FrameRecording>`, and played back with
+        :class:`RecordingPlayer <jupyter_rfb.RecordingPlayer>`. If the widget
+        was already recording, the previous recording is stopped.
+        """
+        self.stop_recording()
+        self._rfb_recorder = FrameRecordingWriter(filename)
+
+    def stop_recording(self, wait=True):
+        """Stop recording, and write the index of the recording.
+
+        By default, this waits until the pending frames are written, and raises
+        an error if the recording could not be written. Frames that were dropped,
+        because the disk could not keep up, are reported in the widget's output.
+        """
+        recorder, self._rfb_recorder = self._rfb_recorder, None
+        if recorder is None:
+            return
+        recorder.close(wait)
+        if recorder.dropped_frames:
+            self.print(
+                f"Warning: {recorder.dropped_frames} frames were not recorded, "
+                + "because writing the recording could not keep up."
+            )
+        if recorder.error is not None:
+            raise RuntimeError(
+                f"Could not write the recording {recorder.filename!r}: {recorder.error}"
+            ) from recorder.error
 
     # ----- for the subclass to implement
 
@@ -438,8 +1805,12 @@ class RemoteFrameBuffer(anywidget.AnyWidget):
         The returned numpy array must be NxM (grayscale), NxMx3 (RGB) or NxMx4 (RGBA).
         May also return ``None`` to cancel the draw.
 
-        As alternative asynchronous usage, the implementation may also return
-        None and then call ``send_frame()`` somewhat later.
+        This method may also be async (``async def get_frame(self)``), e.g. to
+        await a GPU readback or fetch data without blocking the event loop. The
+        frame is sent when the coroutine is done. Until then no new draw is started,
+        and a new draw request cancels it, since its result would be stale.
+        Alternatively, the implementation may return None and then call
+        ``send_frame()`` somewhat later, but this bypasses the throttling.
         """
         return None
 
@@ -449,5 +1820,8 @@ class RemoteFrameBuffer(anywidget.AnyWidget):
         Subclasses should overload this method. Events include widget resize,
         mouse/touch interaction, key events, and more. An event is a dict with at least
         the key *type*. See :mod:`jupyter_rfb.events` for details.
+
+        This method may also be async, in which case it is run as a task. Note
+        that the next event may then be handled before this one is done.
         """
         pass
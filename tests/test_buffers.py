@@ -0,0 +1,65 @@
+"""Test the buffers module."""
+
+import numpy as np
+
+from jupyter_rfb._buffers import FrameBufferRing
+
+
+def test_frame_buffer_ring():
+    """Test that buffers are reused when they are not in use."""
+
+    ring = FrameBufferRing()
+    a = ring.acquire((10, 20, 3), [])
+    assert a.shape == (10, 20, 3) and a.dtype == np.uint8
+    assert ring.acquire((10, 20, 3), []) is a
+    assert len(ring) == 1
+
+    # A buffer that is in use is not returned, also not via a view
+    b = ring.acquire((10, 20, 3), [a])
+    assert b is not a
+    assert ring.acquire((10, 20, 3), [b[2:5, :, :2]]) is a
+    assert ring.acquire((10, 20, 3), [a, np.zeros(3)]) is b
+    assert len(ring) == 2
+    assert ring.allocations == 2
+
+    # The least recently returned buffer is preferred
+    assert ring.acquire((10, 20, 3), []) is a
+    assert ring.acquire((10, 20, 3), []) is b
+
+    # A new shape discards the buffers
+    c = ring.acquire((10, 20, 4), [])
+    assert c.shape == (10, 20, 4)
+    assert len(ring) == 1
+    assert ring.allocations == 3
+
+    ring.clear()
+    assert len(ring) == 0
+    assert ring.shape is None
+
+
+def test_frame_buffer_ring_min_count():
+    """Test that there are at least min_count buffers before any is reused."""
+
+    ring = FrameBufferRing()
+    buffers = [ring.acquire((4, 4, 3), [], 3) for _ in range(3)]
+    assert len({id(b) for b in buffers}) == 3
+    assert ring.acquire((4, 4, 3), [], 3) is buffers[0]
+    assert ring.acquire((4, 4, 3), [buffers[1]], 3) is buffers[2]
+    assert len(ring) == 3
+
+    # Buffers in use are still not reused
+    d = ring.acquire((4, 4, 3), buffers, 3)
+    assert len(ring) == 4
+    assert ring.acquire((4, 4, 3), buffers[:2], 3) is buffers[2]
+    assert ring.acquire((4, 4, 3), buffers, 3) is d
+
+
+def test_frame_buffer_ring_owns():
+    """Test checking whether an array is one of the buffers."""
+
+    ring = FrameBufferRing()
+    buffer = ring.acquire((4, 4, 3), [])
+    assert ring.owns(buffer)
+    assert ring.owns(buffer[1:])
+    assert not ring.owns(buffer.copy())
+    assert not ring.owns(np.zeros((4, 4, 3), np.uint8))
@@ -0,0 +1,97 @@
+"""Test the cache module."""
+
+import numpy as np
+
+from jupyter_rfb import set_frame_cache_budget, clear_frame_cache, get_frame_cache_stats
+from jupyter_rfb._cache import (
+    EncodedFrameCache,
+    array2compressed_cached,
+    frame_cache,
+    get_cache_key,
+)
+from jupyter_rfb._delta import get_fingerprint
+from jupyter_rfb._jpg import get_default_encoder
+
+
+def test_encoded_frame_cache():
+    """Test the LRU behavior and the byte budget."""
+
+    cache = EncodedFrameCache(100)
+    assert cache.get("a") is None
+
+    cache.put("a", ("image/png", b"x" * 40))
+    cache.put("b", ("image/png", b"x" * 40))
+    assert cache.get("a") == ("image/png", b"x" * 40)
+
+    # Adding c evicts b, because a was used more recently
+    cache.put("c", ("image/png", b"x" * 40))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+    stats = cache.get_stats()
+    assert stats == {
+        "count": 2,
+        "nbytes": 80,
+        "budget": 100,
+        "hits": 3,
+        "misses": 2,
+        "evictions": 1,
+    }
+
+    # Items larger than the budget are not stored
+    cache.put("d", ("image/png", b"x" * 101))
+    assert cache.get("d") is None
+    assert cache.get_stats()["count"] == 2
+
+    # Lowering the budget evicts
+    cache.set_budget(50)
+    assert cache.get_stats()["count"] == 1
+    assert cache.get_stats()["evictions"] == 2
+
+    cache.clear()
+    assert cache.get_stats()["count"] == 0
+    assert cache.get_stats()["nbytes"] == 0
+
+
+def test_array2compressed_cached():
+    """Test that the shared cache is used, with the settings in the key."""
+
+    clear_frame_cache()
+    im = np.random.randint(0, 255, (20, 30, 3)).astype(np.uint8)
+    fingerprint = get_fingerprint(im)
+
+    hits = get_frame_cache_stats()["hits"]
+    result1 = array2compressed_cached(im, fingerprint, 100, png_preset="fast")
+    result2 = array2compressed_cached(im, fingerprint, 100, png_preset="fast")
+    assert result2 is result1
+    assert get_frame_cache_stats()["hits"] == hits + 1
+
+    # Other settings, other result
+    result3 = array2compressed_cached(im, fingerprint, 100, png_preset="small")
+    result4 = array2compressed_cached(im, fingerprint, 100, layout="BGR")
+    assert result3 is not result1
+    assert result4 is not result1
+    assert get_frame_cache_stats()["count"] == 3
+
+    # The defaults are resolved, and arguments that do not matter are ignored
+    key = get_cache_key(im, fingerprint, 100)
+    assert get_cache_key(im, fingerprint, 100.0, layout="RGB") == key
+    assert get_cache_key(im, fingerprint, 100, jpeg_backend="pillow") == key
+    assert get_cache_key(im, fingerprint, 100, image_format="avif") == key
+    assert get_cache_key(im, fingerprint, 100, image_format="webp") != key
+    key = get_cache_key(im, fingerprint, 80)
+    assert get_cache_key(im, fingerprint, 80, png_preset="fast") == key
+    assert get_cache_key(im, fingerprint, 80, jpeg_backend=get_default_encoder()) == key
+    assert get_cache_key(im, fingerprint, 80, image_format="webp") != key
+
+    # Zero budget disables the cache
+    budget = get_frame_cache_stats()["budget"]
+    try:
+        set_frame_cache_budget(0)
+        assert get_frame_cache_stats()["count"] == 0
+        array2compressed_cached(im, fingerprint, 100)
+        assert get_frame_cache_stats()["count"] == 0
+    finally:
+        set_frame_cache_budget(budget)
+    assert frame_cache.get_stats()["budget"] == budget
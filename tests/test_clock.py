@@ -0,0 +1,36 @@
+"""Test the clock module."""
+
+from pytest import approx
+
+from jupyter_rfb._clock import ClockOffsetEstimator
+
+
+def test_clock_offset_estimator():
+    """Test estimating the offset of the client's clock from pings."""
+
+    clock = ClockOffsetEstimator(nsamples=3)
+    assert clock.offset == 0
+    assert clock.to_local_time(5.0) == 5.0
+
+    # A symmetric roundtrip of 0.2s, with the client 100s ahead
+    clock.add_sample(10.0, 110.1, 110.1, 10.2)
+    assert clock.offset == approx(100)
+    assert clock.delay == approx(0.2)
+    assert clock.to_local_time(115.0) == approx(15.0)
+
+    # A sample with a queueing delay on the way back is less precise, and not used
+    clock.add_sample(20.0, 120.1, 120.1, 20.8)
+    assert clock.offset == approx(100)
+    assert not clock.is_settled
+
+    # The time that the client took to reply does not count toward the delay
+    clock.add_sample(30.0, 130.05, 130.25, 30.3)
+    assert clock.delay == approx(0.1)
+    assert clock.offset == approx(100)
+    assert clock.is_settled
+
+    # Old samples are discarded, so that drift is tracked
+    for t in (40.0, 50.0, 60.0):
+        clock.add_sample(t, t + 101.1, t + 101.1, t + 0.2)
+    assert len(clock) == 3
+    assert clock.offset == approx(101)
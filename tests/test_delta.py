@@ -0,0 +1,85 @@
+"""Test delta module."""
+
+import numpy as np
+from pytest import raises
+
+from jupyter_rfb import _delta
+from jupyter_rfb._delta import get_changed_tiles, get_changed_rects, get_fingerprint
+
+
+def test_get_changed_tiles():
+    """Test detecting changed tiles."""
+
+    im1 = np.zeros((100, 150, 3), np.uint8)
+    im2 = im1.copy()
+
+    changed = get_changed_tiles(im1, im2, 32)
+    assert changed.shape == (4, 5)
+    assert not changed.any()
+
+    # Change a pixel in the (smaller) edge tile
+    im2[99, 149, 2] = 1
+    changed = get_changed_tiles(im1, im2, 32)
+    assert changed.sum() == 1 and changed[3, 4]
+
+    # Change a pixel in the first tile
+    im2[0, 31] = 1
+    changed = get_changed_tiles(im1, im2, 32)
+    assert changed.sum() == 2 and changed[0, 0]
+
+    # Also works for grayscale
+    changed = get_changed_tiles(im1[:, :, 0], im2[:, :, 0], 32)
+    assert changed.sum() == 1 and changed[0, 0]
+
+    with raises(ValueError):
+        get_changed_tiles(im1, im2[:50], 32)
+
+
+def test_get_changed_rects():
+    """Test turning changed tiles into rectangles."""
+
+    changed = np.array(
+        [
+            [1, 1, 0, 1],
+            [0, 0, 0, 0],
+            [0, 1, 1, 1],
+        ],
+        bool,
+    )
+    rects = get_changed_rects(changed, 10, (25, 35))
+    assert rects == [(0, 0, 20, 10), (30, 0, 5, 10), (10, 20, 25, 5)]
+
+    assert get_changed_rects(changed * False, 10, (25, 35)) == []
+
+
+def test_get_fingerprint():
+    """Test fingerprinting images, with and without xxhash."""
+
+    xxhash = _delta.xxhash
+    try:
+        for _delta.xxhash in {None, xxhash}:
+            im1 = np.random.randint(0, 255, (20, 30, 3)).astype(np.uint8)
+            fp = get_fingerprint(im1)
+            assert isinstance(fp, bytes)
+            assert get_fingerprint(im1.copy()) == fp
+
+            # Contents matter
+            im2 = im1.copy()
+            im2[10, 10, 1] ^= 1
+            assert get_fingerprint(im2) != fp
+
+            # Shape matters
+            assert get_fingerprint(im1.reshape(30, 20, 3)) != fp
+
+            # Strided arrays are supported, without copying if the rows are contiguous
+            stats = {}
+            assert get_fingerprint(im1[2:-2, 2:-2], stats) == get_fingerprint(
+                im1[2:-2, 2:-2].copy()
+            )
+            assert stats == {}
+            assert get_fingerprint(im1[:, :, ::-1], stats) == get_fingerprint(
+                im1[:, :, ::-1].copy()
+            )
+            assert stats == {"copies": 1}
+    finally:
+        _delta.xxhash = xxhash
@@ -0,0 +1,72 @@
+"""Test the events module."""
+
+import numpy as np
+
+from jupyter_rfb._events import merge_events, unpack_event_batch
+
+
+def test_merge_events():
+    """Test merging pointer_move and wheel events."""
+
+    move1 = {"type": "pointer_move", "x": 1, "y": 2, "buttons": (1,), "modifiers": ()}
+    move2 = {"type": "pointer_move", "x": 3, "y": 4, "buttons": (1,), "modifiers": ()}
+    assert merge_events(move1, move2) == move2
+
+    # Buttons and modifiers must match
+    move3 = {**move2, "buttons": ()}
+    assert merge_events(move1, move3) is None
+    move4 = {**move2, "modifiers": ("Shift",)}
+    assert merge_events(move1, move4) is None
+
+    # Wheel deltas are summed
+    wheel1 = {"type": "wheel", "x": 1, "y": 2, "dx": 0, "dy": 10, "buttons": ()}
+    wheel2 = {"type": "wheel", "x": 3, "y": 4, "dx": 5, "dy": 20, "buttons": ()}
+    merged = merge_events(wheel1, wheel2)
+    assert merged == {**wheel2, "dx": 5, "dy": 30}
+    assert wheel2["dy"] == 20  # not modified
+
+    # Other combinations cannot be merged
+    assert merge_events(move1, wheel1) is None
+    down = {"type": "pointer_down", "x": 1, "y": 2, "buttons": (1,), "modifiers": ()}
+    assert merge_events(down, down) is None
+
+
+def test_unpack_event_batch():
+    """Test restoring packed numeric fields from a batch message."""
+
+    nan = float("nan")
+    values = np.array([[10, 2.5, nan, nan, 1000.5], [1, 2, 0, -100, 1001]], "<f8")
+    msg = {
+        "type": "event_batch",
+        "events": [
+            {"type": "pointer_move", "buttons": [1]},
+            {"type": "wheel", "buttons": []},
+        ],
+        "fields": ["x", "y", "dx", "dy", "timestamp"],
+    }
+    events = unpack_event_batch(msg, [values.tobytes()])
+    assert events == [
+        {
+            "type": "pointer_move",
+            "buttons": [1],
+            "x": 10,
+            "y": 2.5,
+            "timestamp": 1000.5,
+        },
+        {
+            "type": "wheel",
+            "buttons": [],
+            "x": 1,
+            "y": 2,
+            "dx": 0,
+            "dy": -100,
+            "timestamp": 1001,
+        },
+    ]
+    # Integer values are int, like they would be via json
+    assert isinstance(events[0]["x"], int)
+    assert "dx" not in events[0]
+
+    # Events without packed fields
+    msg = {"type": "event_batch", "events": [{"type": "key_down", "key": "a"}]}
+    assert unpack_event_batch(msg, []) == [{"type": "key_down", "key": "a"}]
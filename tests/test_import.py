@@ -0,0 +1,45 @@
+"""Test the cost of importing jupyter_rfb."""
+
+import subprocess
+import sys
+
+
+def get_import_times(module_name):
+    """Import a module in a subprocess, and get a dict of imported modules with their self-time."""
+    p = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in p.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line.split(":", 1)[1].split("|")
+        try:
+            self_us = int(parts[0])
+        except ValueError:
+            continue  # the header
+        times[parts[2].strip()] = self_us / 1e6
+    return times
+
+
+def test_import_time():
+    """Test that importing jupyter_rfb does not import encoders, and is fast."""
+
+    times = get_import_times("jupyter_rfb")
+    assert "jupyter_rfb.widget" in times
+
+    # The encoder libraries are imported when the first frame is encoded
+    for name in ("simplejpeg", "PIL", "PIL.Image", "cv2"):
+        assert name not in times
+
+    # Our own modules (not the dependencies) should take little time to import.
+    # Leave out _version, since it may call git.
+    own_time = sum(
+        t
+        for name, t in times.items()
+        if name.startswith("jupyter_rfb") and name != "jupyter_rfb._version"
+    )
+    assert own_time < 0.1
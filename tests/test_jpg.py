@@ -1,15 +1,23 @@
 """Test jpg module."""
 
+import time
+
 import numpy as np
 import pytest
 from pytest import raises
 
+from jupyter_rfb import _jpg
 from jupyter_rfb._jpg import (
     array2jpg,
     select_encoder,
+    JpegEncoder,
     SimpleJpegEncoder,
     PillowJpegEncoder,
     OpenCVJpegEncoder,
+    register_jpeg_encoder,
+    list_jpeg_encoders,
+    get_jpeg_encoder,
+    calibrate_jpeg_encoder,
 )
 
 
@@ -89,6 +97,27 @@ def _perform_checks(encoder):
     assert isinstance(bb1, bytes)
     assert len(bb2) < len(bb1)
 
+    # All color layouts, also when cropped, without copying
+    rgb = get_random_im(100, 100, 3)
+    rgba = np.dstack([rgb, np.full((100, 100), 255, np.uint8)])
+    images = {
+        "RGB": rgb,
+        "BGR": rgb[:, :, ::-1].copy(),
+        "RGBA": rgba,
+        "BGRA": rgba[:, :, [2, 1, 0, 3]].copy(),
+    }
+    for layout, im in images.items():
+        for crop in (False, True):
+            if crop:
+                im = im[20:-20, 20:-20]
+            stats = {}
+            bb = encoder.encode(im, 90, layout, stats)
+            assert isinstance(bb, bytes)
+            if layout in encoder.layouts and encoder.strided_rows:
+                assert stats["copies"] == 0
+            else:
+                assert stats["copies"] <= 1
+
 
 def _perform_error_checks(encoder):
     # JUst to verify that this is ok
@@ -103,8 +132,11 @@ def _perform_error_checks(encoder):
     with raises(ValueError):  # NxMx2?
         encoder.encode(get_random_im(10, 10, 2), 90)
 
-    with raises(ValueError):  # NxMx4?
-        encoder.encode(get_random_im(10, 10, 4), 90)
+    with raises(ValueError):  # NxMx5?
+        encoder.encode(get_random_im(10, 10, 5), 90)
+
+    with raises(ValueError):  # layout does not match
+        encoder.encode(get_random_im(10, 10, 3), 90, "RGBA")
 
     with raises(ValueError):
         encoder.encode(get_random_im(10, 10, 3).astype(np.float32), 90)
@@ -142,3 +174,102 @@ def test_select_encoder():
         SimpleJpegEncoder.__init__ = simple_init
         PillowJpegEncoder.__init__ = pillow_init
         OpenCVJpegEncoder.__init__ = cv2_init
+
+
+class CustomJpegEncoder(JpegEncoder):
+    """An encoder for testing."""
+
+    def _encode(self, array, quality, layout):
+        return b"custom"
+
+
+class UnavailableJpegEncoder(JpegEncoder):
+    """An encoder for testing, with missing dependencies."""
+
+    def __init__(self):
+        raise_importerror()
+
+
+def test_encoder_registry():
+    """Test registering encoders and selecting them."""
+
+    names = list_jpeg_encoders()
+    assert names[:3] == ["simplejpeg", "pillow", "opencv"]
+
+    try:
+        register_jpeg_encoder("custom", CustomJpegEncoder)
+        register_jpeg_encoder("unavailable", UnavailableJpegEncoder, first=True)
+
+        assert list_jpeg_encoders()[0] == "unavailable"
+        assert list_jpeg_encoders()[-1] == "custom"
+        assert "custom" in list_jpeg_encoders(available=True)
+        assert "unavailable" not in list_jpeg_encoders(available=True)
+
+        # Unavailable encoders are skipped in the default selection
+        assert not isinstance(select_encoder(), UnavailableJpegEncoder)
+
+        # The default encoder is selected again after registering an encoder
+        array2jpg(get_random_im(10, 10, 3), 90)
+        register_jpeg_encoder("custom", CustomJpegEncoder, first=True)
+        assert isinstance(_jpg.get_default_encoder(), CustomJpegEncoder)
+        assert array2jpg(get_random_im(10, 10, 3), 90) == b"custom"
+
+        # The encoder instance is re-used
+        assert isinstance(get_jpeg_encoder("custom"), CustomJpegEncoder)
+        assert get_jpeg_encoder("custom") is get_jpeg_encoder("custom")
+        assert get_jpeg_encoder("unavailable") is None
+
+        # Select by name
+        im = get_random_im(10, 10, 3)
+        assert array2jpg(im, 90, "custom") == b"custom"
+        assert array2jpg(im, 90, "unavailable") is None
+        assert array2jpg(im, 90, CustomJpegEncoder()) == b"custom"
+
+        with raises(ValueError):
+            get_jpeg_encoder("notanencoder")
+
+        with raises(TypeError):
+            register_jpeg_encoder("foo", object)
+
+    finally:
+        for name in ("custom", "unavailable"):
+            _jpg._encoder_classes.pop(name, None)
+        _jpg.encoder = None
+
+    assert list_jpeg_encoders() == names
+
+
+def wait_for_calibration():
+    for _ in range(100):
+        if not _jpg._calibration_pending:
+            break
+        time.sleep(0.05)
+
+
+def test_calibrate_encoder():
+    """Test selecting the fastest encoder with a benchmark."""
+
+    available = list_jpeg_encoders(available=True)
+    wait_for_calibration()  # e.g. started by widgets in other tests
+
+    name = calibrate_jpeg_encoder((100, 120, 3))
+    if available:
+        assert name in available
+    else:
+        assert name is None
+
+    # Cached, also for similar sizes
+    _jpg._calibration_cache[((256, 256, 3), "RGB", 80)] = "cached"
+    assert calibrate_jpeg_encoder((100, 120, 3)) == "cached"
+    assert calibrate_jpeg_encoder((200, 250, 3)) == "cached"
+    assert calibrate_jpeg_encoder((200, 250, 3), 85) == "cached"
+    assert calibrate_jpeg_encoder((300, 250, 3)) != "cached"
+    assert calibrate_jpeg_encoder((100, 120)) != "cached"
+    assert calibrate_jpeg_encoder((100, 120, 3), 60) != "cached"
+    _jpg._calibration_cache.clear()
+
+    # Calibrate in the background
+    assert calibrate_jpeg_encoder((100, 120, 3), wait=False) is None
+    wait_for_calibration()
+    assert calibrate_jpeg_encoder((100, 120, 3), wait=False) == name
+    _jpg._calibration_cache.clear()
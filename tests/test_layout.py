@@ -0,0 +1,88 @@
+"""Test the layout module."""
+
+import numpy as np
+from pytest import raises
+
+from jupyter_rfb._layout import (
+    get_layout,
+    check_layout,
+    select_layout,
+    get_layout_view,
+    has_contiguous_rows,
+    get_row_buffer,
+)
+
+
+def test_get_and_check_layout():
+    """Test getting a layout from the number of channels, and checking it."""
+    assert get_layout(1) == "L"
+    assert get_layout(3) == "RGB"
+    assert get_layout(4) == "RGBA"
+    assert get_layout(1, "BGR") == "L"
+    assert get_layout(3, "BGR") == "BGR"
+    assert get_layout(4, "BGR") == "BGRA"
+    with raises(ValueError):
+        get_layout(2)
+
+    check_layout("BGRA", 4)
+    with raises(ValueError):
+        check_layout("BGRA", 3)
+    with raises(ValueError):
+        check_layout("ARGB", 4)
+
+
+def test_select_layout():
+    """Test selecting the layout to convert to."""
+    all_layouts = ("L", "RGB", "BGR", "RGBA", "BGRA")
+    for layout in all_layouts:
+        assert select_layout(layout, all_layouts) == layout
+
+    # Prefer same order, then keeping alpha
+    assert select_layout("BGRA", ("L", "RGB", "BGR", "RGBA")) == "BGR"
+    assert select_layout("BGRA", ("L", "RGB", "RGBA")) == "RGBA"
+    assert select_layout("BGRA", ("L", "RGB")) == "RGB"
+    assert select_layout("RGBA", ("L", "RGB")) == "RGB"
+    assert select_layout("RGB", ("L", "BGR", "BGRA")) == "BGR"
+
+    # Never add alpha, never convert between gray and color
+    with raises(ValueError):
+        select_layout("RGB", ("L", "RGBA"))
+    with raises(ValueError):
+        select_layout("L", ("RGB", "RGBA"))
+    with raises(ValueError):
+        select_layout("RGB", ("L",))
+
+
+def test_get_layout_view():
+    """Test that layouts are converted with a view when possible."""
+    rgba = np.random.randint(0, 255, (10, 12, 4)).astype(np.uint8)
+
+    for target in ("RGB", "BGR", "RGBA"):
+        result, is_copy = get_layout_view(rgba, "RGBA", target)
+        assert not is_copy
+        assert np.shares_memory(result, rgba)
+        assert np.all(result == rgba[:, :, ["RGBA".index(c) for c in target]])
+
+    result, is_copy = get_layout_view(rgba, "RGBA", "BGRA")
+    assert is_copy
+    assert np.all(result == rgba[:, :, [2, 1, 0, 3]])
+
+
+def test_row_buffer():
+    """Test the row buffer of contiguous and strided arrays."""
+    im = np.random.randint(0, 255, (10, 12, 3)).astype(np.uint8)
+    assert has_contiguous_rows(im)
+    buffer = get_row_buffer(im)
+    assert buffer.shape == (360,)
+    assert np.shares_memory(buffer, im)
+
+    crop = im[2:-2, 3:-3]
+    assert has_contiguous_rows(crop)
+    buffer = get_row_buffer(crop)
+    assert buffer.shape == (5 * 36 + 18,)
+    assert np.shares_memory(buffer, im)
+    assert np.all(buffer.reshape(-1)[36 : 36 + 18] == crop[1].reshape(-1))
+
+    assert not has_contiguous_rows(im[:, ::2])
+    assert not has_contiguous_rows(im[:, :, ::-1])
+    assert not has_contiguous_rows(im[::-1])
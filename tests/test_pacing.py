@@ -0,0 +1,41 @@
+"""Test the pacing module."""
+
+from pytest import approx
+
+from jupyter_rfb._pacing import FramePacer
+
+
+def test_frame_pacer_cadence():
+    """Test that draws are aligned to ticks, without drift."""
+
+    pacer = FramePacer(10)
+    assert pacer.get_delay(5.0) == 0
+    assert pacer.mark_drawn(5.0) == 0
+
+    # The next draw is at the next tick
+    assert pacer.get_delay(5.03) == approx(0.06)  # minus the tolerance
+    assert pacer.get_delay(5.1) == 0
+
+    # A late draw does not shift the ticks
+    pacer.mark_drawn(5.13)
+    assert pacer.get_delay(5.15) == approx(0.04)
+
+    # A slightly early draw counts as on the tick
+    pacer.mark_drawn(5.195)
+    assert pacer.get_delay(5.2) == approx(0.09)
+
+
+def test_frame_pacer_missed_deadlines():
+    """Test counting the ticks that passed while a draw was requested."""
+
+    pacer = FramePacer(10)
+    pacer.mark_drawn(0.0)
+
+    # Drawn at the tick after the request: no deadline missed
+    assert pacer.mark_drawn(0.1, 0.05) == 0
+    # The request was at 0.12, due at 0.2, but drawn at 0.41
+    assert pacer.mark_drawn(0.41, 0.12) == 2
+    # Requested long after the last draw (idle)
+    assert pacer.mark_drawn(2.0, 1.95) == 0
+    # Without a request time nothing is counted
+    assert pacer.mark_drawn(3.0) == 0
@@ -1,12 +1,16 @@
 """Test png module."""
 
+import io
 import os
+import struct
 import tempfile
+import zlib
 
 import numpy as np
+import pytest
 from pytest import raises
 
-from jupyter_rfb._png import array2png
+from jupyter_rfb._png import array2png, FILTERS, PRESETS
 
 tempdir = tempfile.gettempdir()
 
@@ -107,3 +111,93 @@ def test_writing_failures():
 
     with raises(ValueError):
         array2png(im4.astype(np.float32))
+
+
+def read_png(bb):
+    """A minimal PNG reader to check the written images."""
+    assert bb[:8] == b"\x89PNG\x0d\x0a\x1a\x0a"
+    chunks = {}
+    i = 8
+    while i < len(bb):
+        (n,) = struct.unpack(">I", bb[i : i + 4])
+        name = bb[i + 4 : i + 8].decode()
+        data = bb[i + 8 : i + 8 + n]
+        (crc,) = struct.unpack(">I", bb[i + 8 + n : i + 12 + n])
+        assert crc == zlib.crc32(data, zlib.crc32(name.encode()))
+        chunks[name] = data
+        i += 12 + n
+    w, h, depth, ctyp, _, _, _ = struct.unpack(">IIBBBBB", chunks["IHDR"])
+    assert depth == 8
+    bpp = {0: 1, 2: 3, 6: 4}[ctyp]
+    raw = zlib.decompress(chunks["IDAT"])
+    n = w * bpp
+    rows = []
+    prev = [0] * n
+    for y in range(h):
+        line = raw[y * (n + 1) : (y + 1) * (n + 1)]
+        ftype, line = line[0], list(line[1:])
+        for x in range(n):
+            a = line[x - bpp] if x >= bpp else 0
+            b = prev[x]
+            c = prev[x - bpp] if x >= bpp else 0
+            if ftype == 1:
+                line[x] = (line[x] + a) % 256
+            elif ftype == 2:
+                line[x] = (line[x] + b) % 256
+            elif ftype == 3:
+                line[x] = (line[x] + (a + b) // 2) % 256
+            elif ftype == 4:
+                p = a + b - c
+                pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+                pred = a if (pa <= pb and pa <= pc) else (b if pb <= pc else c)
+                line[x] = (line[x] + pred) % 256
+        rows.append(line)
+        prev = line
+    return np.array(rows, np.uint8).reshape(h, w, bpp)
+
+
+def test_filters_and_presets():
+    """Test that all filters and presets produce correct images."""
+
+    gradient = np.linspace(0, 255, 17 * 13 * 3).astype(np.uint8).reshape(17, 13, 3)
+    noise = np.random.randint(0, 255, (11, 7, 4)).astype(np.uint8)
+    tall = np.random.randint(0, 255, (200, 3, 3)).astype(np.uint8)  # sampled by auto
+
+    for im in (gradient, noise, tall, im0[:9, :9], im1, im2, im3, im4):
+        expected = im if im.ndim == 3 else im[:, :, None]
+        for preset in PRESETS:
+            assert np.all(read_png(array2png(im, preset=preset)) == expected)
+        for filter in [*FILTERS, "auto", "adaptive"]:
+            assert np.all(read_png(array2png(im, filter=filter)) == expected)
+
+    # Noncontiguous
+    sub = noise[1:-1, 1:-1, :3]
+    assert np.all(read_png(array2png(sub, filter="paeth")) == sub)
+
+    # Other channel orders
+    bgra = noise[:, :, [2, 1, 0, 3]]
+    assert np.all(read_png(array2png(bgra, layout="BGRA")) == noise)
+    assert np.all(read_png(array2png(bgra[:, :, :3], layout="BGR")) == noise[:, :, :3])
+    with raises(ValueError):
+        array2png(bgra, layout="BGR")
+
+    # Filtering helps for smooth images
+    bb1 = array2png(gradient, filter="none", level=9)
+    bb2 = array2png(gradient, filter="adaptive", level=9)
+    assert len(bb2) < len(bb1)
+
+    with raises(ValueError):
+        array2png(im3, preset="foo")
+
+    with raises(ValueError):
+        array2png(im3, filter="foo")
+
+
+def test_compare_with_pillow():
+    """Test that Pillow reads our images."""
+    pil_image = pytest.importorskip("PIL.Image")
+
+    im = np.random.randint(0, 255, (20, 30, 3)).astype(np.uint8)
+    for preset in PRESETS:
+        im_pil = pil_image.open(io.BytesIO(array2png(im, preset=preset)))
+        assert np.all(np.asarray(im_pil) == im)
@@ -0,0 +1,77 @@
+"""Test the profiling module."""
+
+import time
+
+from jupyter_rfb._profiling import ProfilingHook, SamplingProfiler
+
+
+class StubWidget:
+    def __init__(self):
+        self.printed = []
+
+    def print(self, text):
+        self.printed.append(text)
+
+
+def slow_function():
+    time.sleep(0.02)
+
+
+def test_profiling_hook_is_a_noop():
+    """Test that the methods of the base class can all be called."""
+
+    hook = ProfilingHook()
+    widget = StubWidget()
+    hook.before_get_frame(widget, 1)
+    hook.after_get_frame(widget, 1, 0.01)
+    hook.before_encode(widget, 1)
+    hook.after_encode(widget, 1, 0.01, "image/jpeg")
+    hook.before_send(widget, 1)
+    hook.after_send(widget, 1, 0.001, 1000)
+    hook.on_ack(widget, 1, 0.05)
+    hook.before_handle_event(widget, {"type": "resize"})
+    hook.after_handle_event(widget, {"type": "resize"}, 0.001)
+
+
+def test_sampling_profiler():
+    """Test profiling every nth call, and reporting overruns."""
+
+    widget = StubWidget()
+    profiler = SamplingProfiler(every=2, budget=0.01)
+    assert profiler.stats is None
+
+    for index in range(1, 5):
+        profiler.before_get_frame(widget, index)
+        slow_function()
+        profiler.after_get_frame(widget, index, 0.02)
+
+    # All calls overran, but only the profiled ones are reported
+    assert [index for index, _ in profiler.overruns] == [1, 2, 3, 4]
+    assert len(widget.printed) == 2
+    assert widget.printed[0].startswith("get_frame() for frame 2 took 20.0 ms")
+    assert "slow_function" in widget.printed[0]
+
+    # The profiles are accumulated
+    ncalls = [v[0] for k, v in profiler.stats.stats.items() if k[2] == "slow_function"]
+    assert ncalls == [2]
+
+    # Without a budget, there are no overruns
+    profiler = SamplingProfiler(every=1, report=False)
+    profiler.before_get_frame(widget, 1)
+    profiler.after_get_frame(widget, 1, 10)
+    assert not profiler.overruns
+    assert profiler.stats is not None
+
+
+def test_sampling_profiler_print_stats(capsys):
+    """Test printing the accumulated stats."""
+
+    profiler = SamplingProfiler(every=1)
+    profiler.print_stats()
+    assert "No calls" in capsys.readouterr().out
+
+    profiler.before_get_frame(StubWidget(), 1)
+    slow_function()
+    profiler.after_get_frame(StubWidget(), 1, 0.02)
+    profiler.print_stats(limit=5)
+    assert "slow_function" in capsys.readouterr().out
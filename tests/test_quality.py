@@ -0,0 +1,69 @@
+"""Test the quality module."""
+
+from jupyter_rfb._quality import QualityController
+
+
+def simulate(controller, bandwidth, nframes, budget=0.1, overhead=0.01):
+    """Simulate a connection, with frame size proportional to the quality."""
+    qualities = []
+    for index in range(1, nframes + 1):
+        quality = controller.quality
+        nbytes = 1000 * quality
+        roundtrip = overhead + nbytes / bandwidth
+        # The feedback of a frame arrives while the next one is submitted
+        controller.update(index, roundtrip, nbytes, budget, index + 1)
+        qualities.append(quality)
+    return qualities
+
+
+def test_quality_controller():
+    """Test that the quality adapts to the connection."""
+
+    controller = QualityController(20, 90)
+    assert controller.quality == 90
+
+    # A fast connection: max quality
+    qualities = simulate(controller, 100e6, 20)
+    assert set(qualities) == {90}
+
+    # A slow connection: at 500 KB/s, frames up to 45 KB (quality 45) fit in 0.1s
+    qualities = simulate(controller, 500e3, 50)
+    assert 20 < qualities[-1] <= 45
+    assert max(qualities[-10:]) - min(qualities[-10:]) <= 5  # stable
+
+    # A very slow connection: min quality
+    qualities = simulate(controller, 100e3, 50)
+    assert qualities[-1] == 20
+
+    # Back to fast: climbs back to the max
+    qualities = simulate(controller, 100e6, 100)
+    assert qualities[-1] == 90
+    assert qualities == sorted(qualities)
+
+
+def test_quality_controller_bounds():
+    """Test changing the bounds."""
+
+    controller = QualityController(20, 90)
+    controller.set_bounds(20, 50)
+    assert controller.quality == 50
+    controller.set_bounds(60, 50)
+    assert controller.min_quality == controller.max_quality == 60
+    assert controller.quality == 60
+
+
+def test_quality_controller_waits_for_effect():
+    """Test that the controller waits for frames encoded with the new quality."""
+
+    controller = QualityController(20, 90)
+    controller.update(1, 1.0, 90000, 0.1, 5)
+    quality = controller.quality
+    assert quality < 90
+
+    # Frames 2-5 were encoded with the old quality
+    for index in range(2, 6):
+        controller.update(index, 1.0, 90000, 0.1, 6)
+    assert controller.quality == quality
+
+    controller.update(6, 1.0, 90000, 0.1, 7)
+    assert controller.quality < quality
@@ -0,0 +1,107 @@
+"""Test the raw module."""
+
+import zlib
+
+import numpy as np
+from pytest import raises
+
+from jupyter_rfb._raw import TransportSelector, array2raw, get_lz4_block
+
+
+def get_random_im(*shape):
+    return np.random.randint(0, 255, shape).astype(np.uint8)
+
+
+def test_array2raw_layouts():
+    """Test that all layouts are converted to RGBA."""
+
+    rgba = get_random_im(20, 30, 4)
+    expected = rgba.tobytes()
+    assert bytes(array2raw(rgba)) == expected
+    assert bytes(array2raw(rgba[:, :, [2, 1, 0, 3]], "BGRA")) == expected
+
+    # Strided arrays work too
+    big = get_random_im(40, 60, 4)
+    big[::2, ::2] = rgba
+    assert bytes(array2raw(big[::2, ::2])) == expected
+
+    # Without alpha, it's set to 255
+    rgba[:, :, 3] = 255
+    expected = rgba.tobytes()
+    assert bytes(array2raw(rgba[:, :, :3])) == expected
+    assert bytes(array2raw(rgba[:, :, [2, 1, 0]], "BGR")) == expected
+
+    # Grayscale
+    gray = get_random_im(20, 30)
+    result = np.frombuffer(array2raw(gray), np.uint8).reshape(20, 30, 4)
+    for i in range(3):
+        assert np.all(result[:, :, i] == gray)
+    assert np.all(result[:, :, 3] == 255)
+    assert bytes(array2raw(gray.reshape(20, 30, 1))) == result.tobytes()
+
+
+def test_array2raw_copies():
+    """Test that the result does not change when the array does."""
+
+    rgba = get_random_im(20, 30, 4)
+    data = array2raw(rgba)
+    expected = rgba.tobytes()
+    rgba.fill(0)
+    assert bytes(data) == expected
+
+
+def test_array2raw_compression():
+    """Test the compressed results."""
+
+    im = np.zeros((100, 100, 3), np.uint8)
+    im[10:20, 30:50] = 200
+    expected = bytes(array2raw(im))
+
+    data = array2raw(im, compression="deflate")
+    assert len(data) < len(expected) / 10
+    assert zlib.decompress(data) == expected
+
+    lz4_block = get_lz4_block()
+    if lz4_block is not None:
+        data = array2raw(im, compression="lz4")
+        assert len(data) < len(expected) / 10
+        assert lz4_block.decompress(data, uncompressed_size=len(expected)) == expected
+
+
+def test_array2raw_fails():
+    """Test the errors for invalid input."""
+
+    with raises(ValueError):
+        array2raw([1, 2, 3])
+    with raises(ValueError):
+        array2raw(np.zeros((10, 10, 3), np.float32))
+    with raises(ValueError):
+        array2raw(np.zeros((10, 10, 2), np.uint8))
+    with raises(ValueError):
+        array2raw(np.zeros((10, 10, 3), np.uint8), "RGBA")
+    with raises(ValueError):
+        array2raw(np.zeros((10, 10, 3), np.uint8), compression="zstd")
+
+
+def test_transport_selector():
+    """Test that the cheapest transport is selected, and the other probed."""
+
+    selector = TransportSelector()
+    assert selector.get_costs() == {"encoded": None, "raw": None}
+
+    # Both transports are tried first
+    assert selector.select() == "encoded"
+    selector.update("encoded", 0.02, 1e6)
+    assert selector.select() == "raw"
+    selector.update("raw", 0.01, 1e6)
+    assert selector.get_costs() == {"encoded": 0.02, "raw": 0.01}
+
+    # Then the cheapest is used, except for the occasional probe
+    selections = [selector.select() for _ in range(100)]
+    assert selections.count("encoded") == 2
+    assert selections.count("raw") == 98
+
+    # The costs follow changing conditions
+    for _ in range(20):
+        selector.update("raw", 0.1, 1e6)
+    assert selector.select() == "encoded"
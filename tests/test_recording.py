@@ -0,0 +1,163 @@
+"""Test the recording module."""
+
+import threading
+
+import numpy as np
+from pytest import approx, raises
+
+from jupyter_rfb._recording import (
+    FrameRecording,
+    FrameRecordingWriter,
+    RECORDING_FOOTER,
+    is_keyframe,
+)
+
+
+def get_messages():
+    """Get a list of (msg, buffers) like a widget sends."""
+    return [
+        (
+            {"type": "framebufferdata", "mimetype": "image/png", "data_b64": None},
+            [b"png-data"],
+        ),
+        (
+            {
+                "type": "framebufferdata",
+                "mimetype": "image/jpeg",
+                "data_b64": None,
+                "shape": [20, 30],
+                "tiles": [[0, 0, 16, 16], [16, 0, 14, 16]],
+            },
+            [b"tile1", memoryview(np.arange(4, dtype=np.uint8))],
+        ),
+        (
+            {
+                "type": "framebufferdata",
+                "mimetype": "",
+                "data_b64": None,
+                "unchanged": True,
+            },
+            [],
+        ),
+        (
+            {
+                "type": "framebufferdata",
+                "mimetype": "application/x-rfb-raw",
+                "data_b64": None,
+                "shape": [2, 2],
+                "compression": "none",
+            },
+            [bytes(16)],
+        ),
+    ]
+
+
+def write_recording(filename, messages):
+    writer = FrameRecordingWriter(filename)
+    for i, (msg, buffers) in enumerate(messages):
+        writer.write({**msg, "index": i + 1, "timestamp": 100.0 + i / 10}, buffers)
+    return writer
+
+
+def test_is_keyframe():
+    """Test which frames can be shown on their own."""
+
+    assert is_keyframe({"mimetype": "image/jpeg"})
+    assert not is_keyframe({"mimetype": "image/jpeg", "tiles": [[0, 0, 1, 1]]})
+    assert not is_keyframe({"mimetype": "", "unchanged": True})
+    assert is_keyframe({"mimetype": "video/h264", "keyframe": True})
+    assert not is_keyframe({"mimetype": "video/h264", "keyframe": False})
+
+
+def test_recording_roundtrip(tmp_path):
+    """Test writing a recording, and reading it back."""
+
+    filename = tmp_path / "frames.rfbrec"
+    messages = get_messages()
+    writer = write_recording(filename, messages)
+    writer.close()
+    assert writer.error is None
+    assert writer.frame_count == 4
+
+    recording = FrameRecording(filename)
+    assert len(recording) == 4
+    assert recording.index["index"].tolist() == [1, 2, 3, 4]
+    assert recording.index["keyframe"].tolist() == [True, False, False, True]
+    assert recording.index["mimetype"][0] == b"image/png"
+    assert recording.duration == approx(0.3)
+
+    # Random access, the frames are as they were sent
+    for i in (3, 0, 2, 1):
+        msg, buffers = recording[i]
+        expected_msg, expected_buffers = messages[i]
+        assert msg == {**expected_msg, "index": i + 1, "timestamp": 100.0 + i / 10}
+        assert [bytes(b) for b in buffers] == [bytes(b) for b in expected_buffers]
+
+    assert recording.find_keyframe(0) == 0
+    assert recording.find_keyframe(2) == 0
+    assert recording.find_keyframe(3) == 3
+    recording.close()
+    assert len(recording) == 0
+
+
+def test_recording_without_index(tmp_path):
+    """Test reading a recording that was not closed, e.g. because the kernel died."""
+
+    filename = tmp_path / "frames.rfbrec"
+    write_recording(filename, get_messages()).close()
+    data = filename.read_bytes()
+
+    # Remove the index and footer, and cut the last frame short
+    index_offset = RECORDING_FOOTER.unpack(data[-RECORDING_FOOTER.size :])[0]
+    filename.write_bytes(data[: index_offset - 5])
+    recording = FrameRecording(filename)
+    assert len(recording) == 3
+    assert recording[2][0]["unchanged"]
+
+    filename.write_bytes(b"not a recording")
+    with raises(ValueError):
+        FrameRecording(filename)
+
+
+def test_recording_drops_frames(tmp_path):
+    """Test dropping frames up to the next keyframe when writing falls behind."""
+
+    filename = tmp_path / "frames.rfbrec"
+    writer = FrameRecordingWriter(filename, max_pending=20)
+    write_frame = writer._write_frame
+    unblock = threading.Event()
+
+    def slow_write_frame(msg, buffers):
+        unblock.wait()
+        return write_frame(msg, buffers)
+
+    writer._write_frame = slow_write_frame
+    messages = get_messages()
+    for i, (msg, buffers) in enumerate(messages * 2):
+        writer.write({**msg, "index": i + 1, "timestamp": 100.0 + i / 10}, buffers)
+    unblock.set()
+    writer.close()
+    assert writer.error is None
+    # The png (8 bytes), the tiles (9 bytes) and the unchanged frame fit, the
+    # frames after these do not, because nothing is written yet
+    assert writer.frame_count == 3
+    assert writer.dropped_frames == 5
+    recording = FrameRecording(filename)
+    assert recording.index["index"].tolist() == [1, 2, 3]
+    recording.close()
+
+
+def test_recording_write_error(tmp_path):
+    """Test that an error in the writer thread is kept."""
+
+    filename = tmp_path / "frames.rfbrec"
+    writer = FrameRecordingWriter(filename)
+
+    def failing_write_frame(msg, buffers):
+        raise OSError("disk full")
+
+    writer._write_frame = failing_write_frame
+    writer.write(*get_messages()[0])
+    writer.close()
+    assert isinstance(writer.error, OSError)
+    writer.write(*get_messages()[0])  # ignored
@@ -0,0 +1,149 @@
+"""Test the replay module."""
+
+import asyncio
+
+from jupyter_rfb import FrameRecording, RecordingPlayer
+from jupyter_rfb._recording import FrameRecordingWriter
+
+
+class MyPlayer(RecordingPlayer):
+    """Player class to use in the tests."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._frame_feedback = {}
+        self._has_visible_views = True
+        self.msgs = []
+
+    def send(self, msg, buffers):
+        msg = msg.copy()
+        msg["buffers"] = [bytes(b) for b in buffers]
+        self.msgs.append(msg)
+
+    def confirm(self):
+        self._frame_feedback = {
+            "index": self.msgs[-1]["index"],
+            "timestamp": self.msgs[-1]["timestamp"],
+            "localtime": self.msgs[-1]["timestamp"],
+        }
+
+
+def write_recording(filename, interval=0.05, n=6):
+    """Write a recording with a keyframe, followed by a delta frame, etc."""
+    writer = FrameRecordingWriter(filename)
+    for i in range(n):
+        msg = {
+            "type": "framebufferdata",
+            "mimetype": "image/jpeg",
+            "data_b64": None,
+            "index": 10 + i,
+            "timestamp": 1000 + i * interval,
+        }
+        if i % 2:
+            msg["tiles"] = [[0, 0, 1, 1]]
+        writer.write(msg, [f"frame{i}".encode()])
+    writer.close()
+    return FrameRecording(filename)
+
+
+def test_recording_player(tmp_path):
+    """Test playing a recording at its speed, with back-pressure."""
+
+    recording = write_recording(tmp_path / "frames.rfbrec")
+
+    async def main():
+        w = MyPlayer(recording)
+        w.max_buffered_frames = 2
+        assert w.is_playing
+
+        # The frames are played at the recorded times
+        await asyncio.sleep(0.02)
+        assert [m["buffers"] for m in w.msgs] == [[b"frame0"]]
+        assert w.msgs[0]["index"] == 1
+        await asyncio.sleep(0.05)
+        assert len(w.msgs) == 2
+        assert w.msgs[1]["tiles"] == [[0, 0, 1, 1]]
+
+        # The client is not ready for more frames, so playing waits
+        await asyncio.sleep(0.1)
+        assert len(w.msgs) == 2
+        w.confirm()
+        await asyncio.sleep(0.01)
+        assert len(w.msgs) == 3
+        w.confirm()
+
+        # Pause and seek, to a keyframe
+        w.pause()
+        await asyncio.sleep(0.1)
+        assert len(w.msgs) == 3
+        w.seek(5)
+        assert w.position == 4
+        w.play()
+        await asyncio.sleep(0.01)
+        assert w.msgs[-1]["buffers"] == [b"frame4"]
+        w.confirm()
+
+        # Play at a higher speed until the end
+        w.speed = 10
+        await asyncio.sleep(0.05)
+        assert w.msgs[-1]["buffers"] == [b"frame5"]
+        assert not w.is_playing
+        w.close()
+
+    asyncio.run(main())
+
+
+def test_recording_player_repeat(tmp_path):
+    """Test playing a recording repeatedly, as fast as the client confirms."""
+
+    write_recording(tmp_path / "frames.rfbrec", interval=0, n=3)
+
+    async def main():
+        w = MyPlayer(tmp_path / "frames.rfbrec", autoplay=False, repeat=True)
+        w.max_buffered_frames = 1
+        await asyncio.sleep(0.01)
+        assert w.msgs == []
+        w.play()
+        for _ in range(7):
+            await asyncio.sleep(0.01)
+            w.confirm()
+        await asyncio.sleep(0.01)
+        assert [m["buffers"][0][-1] for m in w.msgs] == list(b"01201201")
+        assert [m["index"] for m in w.msgs] == list(range(1, 9))
+        w.close()
+
+    asyncio.run(main())
+
+
+def test_recording_player_keyframe_request(tmp_path):
+    """Test sending the frames from the last keyframe again, when the client asks."""
+
+    write_recording(tmp_path / "frames.rfbrec", interval=10, n=4)
+
+    async def main():
+        w = MyPlayer(tmp_path / "frames.rfbrec")
+        w.max_buffered_frames = 1
+        await asyncio.sleep(0.01)
+        w.confirm()
+        w.seek(1)  # plays frame 0 again, then waits 10s for frame 1
+        await asyncio.sleep(0.01)
+        w.confirm()
+        w.pause()
+        w._rfb_play_position = 2  # as if frame 1 was played too
+
+        # The client missed the base of frame 1, so frames 0 and 1 are sent
+        # again right away, even when paused
+        w._rfb_handle_msg(w, {"type": "request_keyframe"}, [])
+        await asyncio.sleep(0.01)
+        assert [m["buffers"] for m in w.msgs[2:]] == [[b"frame0"]]
+        w.confirm()
+        await asyncio.sleep(0.01)
+        assert [m["buffers"] for m in w.msgs[2:]] == [[b"frame0"], [b"frame1"]]
+        w.confirm()
+        await asyncio.sleep(0.01)
+        assert len(w.msgs) == 4
+        assert w.position == 2
+        assert not w.is_playing
+        w.close()
+
+    asyncio.run(main())
@@ -0,0 +1,125 @@
+"""Test the scheduler module."""
+
+import asyncio
+
+from pytest import approx
+
+from jupyter_rfb._scheduler import FrameScheduler
+
+
+class StubWidget:
+    """The parts of a widget that the scheduler uses."""
+
+    def __init__(self, visible=True, last_input_time=float("-inf")):
+        self._has_visible_views = visible
+        self._rfb_last_input_time = last_input_time
+        self.wakeups = []
+
+    def _rfb_schedule_maybe_draw(self):
+        self.wakeups.append(self)
+
+
+def test_scheduler_without_budget():
+    """Test that draws are never deferred without a budget."""
+
+    scheduler = FrameScheduler()
+    widget = StubWidget()
+    for i in range(10):
+        assert scheduler.request_draw(widget, now=i * 0.001)
+        scheduler.frame_sent(widget, 10**6, 0.1, now=i * 0.001)
+    assert scheduler.get_encoder_pool() is None
+
+    stats = scheduler.get_stats()
+    assert stats["delay"] == 0
+    (allocation,) = stats["widgets"]
+    assert allocation["widget"] is widget
+    assert allocation["frames"] == 10
+    assert allocation["nbytes"] == 10**7
+    assert allocation["deferred_draws"] == 0
+
+
+def test_scheduler_bandwidth_budget():
+    """Test that draws are deferred while the bandwidth budget is in debt."""
+
+    scheduler = FrameScheduler(max_bandwidth=1000)
+    widget = StubWidget()
+    assert scheduler.request_draw(widget, now=0)
+    scheduler.frame_sent(widget, 600, 0, now=0)  # the burst is 100 bytes
+
+    assert scheduler.get_delay(now=0) == approx(0.5)
+    assert not scheduler.request_draw(widget, now=0.2)
+    assert scheduler.get_delay(now=0.2) == approx(0.3)
+    assert scheduler.request_draw(widget, now=0.5)
+    assert scheduler.get_stats()["widgets"][0]["deferred_draws"] == 1
+
+    # The budget does not accumulate beyond the burst time
+    assert scheduler.get_delay(now=100) == 0
+    scheduler.frame_sent(widget, 600, 0, now=100)
+    assert scheduler.get_delay(now=100) == approx(0.5)
+
+
+def test_scheduler_encode_budget():
+    """Test that the encode load is limited too."""
+
+    scheduler = FrameScheduler(max_encode_load=0.5)
+    widget = StubWidget()
+    scheduler.frame_sent(widget, 10**6, 0.3, now=0)
+    assert scheduler.get_delay(now=0) == approx(0.5)
+
+
+def test_scheduler_priority():
+    """Test that recently interacted widgets go first, but none is starved."""
+
+    scheduler = FrameScheduler(max_bandwidth=1000)
+    idle = StubWidget()
+    hidden = StubWidget(visible=False)
+    active = StubWidget(last_input_time=9.5)
+    scheduler.frame_sent(idle, 5000, 0, now=10)
+    for widget in (idle, hidden, active):
+        assert not scheduler.request_draw(widget, now=10)
+
+    priorities = [scheduler.get_priority(w, now=10) for w in (idle, hidden, active)]
+    assert priorities[2] > priorities[0] > priorities[1]
+
+    # A widget that waits long enough goes before a recently interacted one
+    scheduler.remove(active)
+    active._rfb_last_input_time = 12.9
+    assert not scheduler.request_draw(active, now=13)
+    assert scheduler.get_priority(idle, now=13) > scheduler.get_priority(active, now=13)
+
+
+def test_scheduler_wakeup():
+    """Test that waiting widgets are woken up when the budget recovers."""
+
+    async def main():
+        scheduler = FrameScheduler(max_bandwidth=10000)
+        widgets = [StubWidget(), StubWidget(last_input_time=float("inf"))]
+        scheduler.frame_sent(widgets[0], 2000, 0)  # 0.1s of debt
+        for widget in widgets:
+            assert not scheduler.request_draw(widget)
+        assert [w["waiting"] for w in scheduler.get_stats()["widgets"]] == [1, 1]
+
+        await asyncio.sleep(0.05)
+        assert not any(w.wakeups for w in widgets)
+        await asyncio.sleep(0.1)
+        assert all(len(w.wakeups) == 1 for w in widgets)
+
+        # The shutdown wakes the waiting widgets too
+        scheduler.frame_sent(widgets[0], 2000, 0)
+        assert not scheduler.request_draw(widgets[0])
+        scheduler.shutdown()
+        assert len(widgets[0].wakeups) == 2
+
+    asyncio.run(main())
+
+
+def test_scheduler_encoder_pool():
+    """Test the shared encoder pool."""
+
+    scheduler = FrameScheduler(encoder_threads=2)
+    pool = scheduler.get_encoder_pool()
+    assert pool is not None
+    assert scheduler.get_encoder_pool() is pool
+    assert pool.submit(lambda: 42).result() == 42
+    scheduler.shutdown()
+    assert scheduler._pool is None
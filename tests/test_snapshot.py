@@ -0,0 +1,91 @@
+"""Test the snapshot module."""
+
+import io
+
+import numpy as np
+import pytest
+from pytest import raises
+
+from jupyter_rfb._delta import get_fingerprint
+from jupyter_rfb._snapshot import (
+    check_snapshot_format,
+    encode_snapshot,
+    get_snapshot_format,
+    write_bytes,
+)
+from jupyter_rfb._webp import get_pillow
+
+
+def get_image():
+    return np.random.default_rng(0).integers(0, 255, (20, 30, 3), np.uint8)
+
+
+def test_check_snapshot_format():
+    """Test the defaults and validation of the format and quality."""
+
+    assert check_snapshot_format("png") == ("png", 100)
+    assert check_snapshot_format("PNG", 50) == ("png", 100)
+    assert check_snapshot_format("webp") == ("webp", 100)
+    assert check_snapshot_format("webp", 60) == ("webp", 60)
+    assert check_snapshot_format("jpg") == ("jpeg", 80)
+    assert check_snapshot_format("jpeg", None, 100) == ("jpeg", 99)
+    assert check_snapshot_format("avif", 50) == ("avif", 50)
+
+    with raises(ValueError):
+        check_snapshot_format("gif")
+    with raises(ValueError):
+        check_snapshot_format("jpeg", 100)
+    with raises(ValueError):
+        check_snapshot_format("webp", 0)
+
+
+def test_get_snapshot_format(tmp_path):
+    """Test getting the format from a filename."""
+
+    assert get_snapshot_format("foo.png") == "png"
+    assert get_snapshot_format(tmp_path / "foo.JPG") == "jpeg"
+    assert get_snapshot_format("foo.webp") == "webp"
+    assert get_snapshot_format("foo") == "png"
+    assert get_snapshot_format(io.BytesIO()) == "png"
+    with open(tmp_path / "foo.jpeg", "wb") as f:
+        assert get_snapshot_format(f) == "jpeg"
+
+
+def test_encode_snapshot():
+    """Test encoding a snapshot, and reusing the last sent image."""
+
+    im = get_image()
+    data = encode_snapshot(im, "RGB", "png", 100)
+    assert data.startswith(b"\x89PNG")
+
+    # The last image is reused if it matches
+    last_image = get_fingerprint(im), "image/png", 100, b"reused"
+    assert encode_snapshot(im, "RGB", "png", 100, last_image) == b"reused"
+    last_image = get_fingerprint(im[1:]), "image/png", 100, b"reused"
+    assert encode_snapshot(im, "RGB", "png", 100, last_image) != b"reused"
+    last_image = get_fingerprint(im), "image/jpeg", 80, b"reused"
+    assert encode_snapshot(im, "RGB", "jpeg", 80, last_image) == b"reused"
+    assert encode_snapshot(im, "RGB", "jpeg", 70, last_image) != b"reused"
+
+
+@pytest.mark.skipif(not get_pillow("WEBP"), reason="needs Pillow")
+def test_encode_snapshot_formats():
+    """Test encoding snapshots in the different formats."""
+
+    im = get_image()
+    assert encode_snapshot(im, "RGB", "jpeg", 80).startswith(b"\xff\xd8")
+    data = encode_snapshot(im, "RGB", "webp", 100)
+    assert data[:4] == b"RIFF" and data[8:12] == b"WEBP"
+
+
+def test_write_bytes(tmp_path):
+    """Test writing to a filename or file object."""
+
+    filename = tmp_path / "foo.png"
+    write_bytes(filename, b"abc")
+    assert filename.read_bytes() == b"abc"
+    write_bytes(str(filename), b"def")
+    assert filename.read_bytes() == b"def"
+    f = io.BytesIO()
+    write_bytes(f, b"ghi")
+    assert f.getvalue() == b"ghi"
@@ -0,0 +1,102 @@
+"""Test the telemetry module."""
+
+import io
+
+import numpy as np
+from pytest import approx
+
+from jupyter_rfb._telemetry import FrameRecorder, save_records_csv
+
+
+def add_frame(recorder, index, timestamp, nbytes=1000, lossless=False):
+    recorder.add(index, timestamp, 0.01, 0.002, nbytes, "image/jpeg", 1, lossless)
+
+
+def test_frame_recorder_ring():
+    """Test that the recorder keeps the most recent records, oldest first."""
+
+    recorder = FrameRecorder(4)
+    assert len(recorder) == 0
+    assert len(recorder.get_records()) == 0
+
+    for i in range(1, 4):
+        add_frame(recorder, i, float(i))
+    assert len(recorder) == 3
+    assert recorder.get_records()["index"].tolist() == [1, 2, 3]
+
+    for i in range(4, 7):
+        add_frame(recorder, i, float(i))
+    assert len(recorder) == 4
+    records = recorder.get_records()
+    assert records["index"].tolist() == [3, 4, 5, 6]
+    assert records["mimetype"].tolist() == ["image/jpeg"] * 4
+
+    # The records are a copy
+    records["index"] = 0
+    assert recorder.get_records()["index"].tolist() == [3, 4, 5, 6]
+
+    recorder.clear()
+    assert len(recorder.get_records()) == 0
+
+
+def test_frame_recorder_acknowledge():
+    """Test that confirming a frame sets the ack latency of it and older frames."""
+
+    recorder = FrameRecorder(4)
+    for i in range(1, 4):
+        add_frame(recorder, i, 10.0 + i)
+    assert np.isnan(recorder.get_records()["ack_latency"]).all()
+
+    recorder.acknowledge(2, 12.5)
+    latency = recorder.get_records()["ack_latency"]
+    assert latency[:2].tolist() == [1.5, 0.5]
+    assert np.isnan(latency[2])
+
+    # Records that were overwritten are skipped
+    for i in range(4, 8):
+        add_frame(recorder, i, 10.0 + i)
+    recorder.acknowledge(6, 16.5)
+    records = recorder.get_records()
+    assert records["index"].tolist() == [4, 5, 6, 7]
+    assert records["ack_latency"][:3].tolist() == [2.5, 1.5, 0.5]
+    assert np.isnan(records["ack_latency"][3])
+
+
+def test_frame_recorder_summary():
+    """Test the percentiles and the throughput."""
+
+    recorder = FrameRecorder(1024)
+    percentiles, throughput = recorder.get_summary()
+    assert percentiles["nbytes"] == (0, 0, 0)
+    assert throughput == 0
+
+    for i in range(100):
+        add_frame(recorder, i + 1, i * 0.1, nbytes=1000 * (i + 1))
+    recorder.acknowledge(50, 5.0)
+    percentiles, throughput = recorder.get_summary()
+    assert percentiles["nbytes"] == approx((50500, 95050, 99010))
+    assert percentiles["render_time"] == approx((0.01, 0.01, 0.01))
+    # Only the confirmed frames count
+    assert percentiles["ack_latency"][0] == approx(2.55)
+    # 99 frames of on average 50 KB in 9.9 seconds
+    assert throughput == approx(99 * 50000 / 9.9)
+
+
+def test_save_records_csv(tmp_path):
+    """Test writing the records to a CSV file."""
+
+    recorder = FrameRecorder(8)
+    add_frame(recorder, 1, 1.0)
+    add_frame(recorder, 2, 2.0, lossless=True)
+
+    f = io.StringIO()
+    save_records_csv(recorder.get_records(), f)
+    lines = f.getvalue().splitlines()
+    assert lines[0].split(",") == list(recorder.get_records().dtype.names)
+    assert len(lines) == 3
+    assert lines[2].startswith("2,2.0,")
+    assert lines[2].endswith(",nan,True")
+
+    filename = tmp_path / "records.csv"
+    save_records_csv(recorder.get_records(), filename)
+    assert filename.read_text().splitlines() == lines
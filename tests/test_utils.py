@@ -3,7 +3,8 @@
 import pytest
 import numpy as np
 from jupyter_rfb._utils import array2compressed, RFBOutputContext
-from jupyter_rfb import _jpg
+from jupyter_rfb import _jpg, _webp
+from jupyter_rfb._webp import get_pillow
 
 
 def test_array2compressed():
@@ -62,6 +63,36 @@ def test_array2compressed():
     assert "jpeg" in preamble and "png" not in preamble
 
 
+def test_array2compressed_formats():
+    """Test using WebP and AVIF in array2compressed."""
+
+    if get_pillow("WEBP") is None or get_pillow("AVIF") is None:
+        pytest.skip("Need Pillow with WebP and AVIF support")
+
+    im = np.random.randint(0, 255, (100, 100, 4)).astype(np.uint8)
+
+    mimetype, _ = array2compressed(im, 80, image_format="webp")
+    assert mimetype == "image/webp"
+    mimetype, _ = array2compressed(im, 100, image_format="webp")
+    assert mimetype == "image/webp"
+    mimetype, _ = array2compressed(im, 80, image_format="avif")
+    assert mimetype == "image/avif"
+    mimetype, _ = array2compressed(im, 100, image_format="avif")
+    assert mimetype == "image/png"
+
+    # Fallback
+    original = _webp._pillow_per_format.copy()
+    try:
+        _webp._pillow_per_format.update(WEBP=None, AVIF=None)
+        mimetype, _ = array2compressed(im, 80, image_format="webp")
+        assert mimetype in ("image/jpeg", "image/png")
+        mimetype, _ = array2compressed(im, 100, image_format="webp")
+        assert mimetype == "image/png"
+    finally:
+        _webp._pillow_per_format.clear()
+        _webp._pillow_per_format.update(original)
+
+
 class StubRFBOutputContext(RFBOutputContext):
     """A helper class for these tests."""
 
@@ -0,0 +1,94 @@
+"""Test the video module."""
+
+import numpy as np
+import pytest
+from pytest import raises
+
+from jupyter_rfb._video import VIDEO_CODECS, VideoEncoder, quality_to_crf
+
+
+def get_test_frames(n, shape=(60, 80)):
+    """Get frames of a square moving over a gray background."""
+    frames = []
+    for i in range(n):
+        im = np.full((*shape, 3), 100, np.uint8)
+        im[10:30, 5 + i * 2 : 25 + i * 2] = (200, 40, 30)
+        frames.append(im)
+    return frames
+
+
+def decode(codec, datas):
+    """Decode the data of successive frames to RGB arrays."""
+    av = pytest.importorskip("av")
+    ctx = av.CodecContext.create(codec, "r")
+    result = []
+    for data in datas:
+        for frame in ctx.decode(av.Packet(data)):
+            result.append(frame.to_ndarray(format="rgb24"))
+    return result
+
+
+@pytest.mark.parametrize("codec", list(VIDEO_CODECS))
+def test_video_encoder(codec):
+    """Test that frames are encoded without delay, and can be decoded."""
+
+    pytest.importorskip("av")
+    frames = get_test_frames(10)
+    encoder = VideoEncoder(codec, frames[0].shape, 80)
+    results = [encoder.encode(im) for im in frames]
+
+    # Only the first frame is a keyframe, unless requested
+    assert [key for _, key in results] == [True] + [False] * 9
+    assert all(len(data) < len(results[0][0]) for data, _ in results[1:])
+    assert encoder.encode(frames[0], keyframe=True)[1]
+
+    # Each frame can be decoded immediately
+    decoded = decode(codec, [data for data, _ in results])
+    assert len(decoded) == 10
+    for im1, im2 in zip(frames, decoded):
+        assert np.abs(im1.astype(int) - im2).mean() < 5
+
+
+@pytest.mark.parametrize("codec", list(VIDEO_CODECS))
+def test_video_encoder_layouts(codec):
+    """Test other layouts, and padding to an even size."""
+
+    pytest.importorskip("av")
+    im = get_test_frames(1, (61, 81))[0]
+    for array, layout in [
+        (im, "RGB"),
+        (np.ascontiguousarray(im[:, :, ::-1]), "BGR"),
+        (np.dstack([im, np.zeros_like(im[:, :, :1])]), "RGBA"),
+        (im[:, :, ::-1], "BGR"),  # strided
+    ]:
+        encoder = VideoEncoder(codec, array.shape, 90)
+        decoded = decode(codec, [encoder.encode(array, layout)[0]])[0]
+        assert decoded.shape == (62, 82, 3)
+        assert np.abs(im.astype(int) - decoded[:61, :81]).mean() < 5
+
+    gray = im[:, :, 0]
+    encoder = VideoEncoder(codec, gray.shape, 90)
+    decoded = decode(codec, [encoder.encode(gray)[0]])[0]
+    assert np.abs(gray.astype(int) - decoded[:61, :81, 1]).mean() < 5
+
+
+def test_video_encoder_fails():
+    """Test the errors for invalid input."""
+
+    pytest.importorskip("av")
+    with raises(ValueError):
+        VideoEncoder("mpeg1", (10, 10), 80)
+    encoder = VideoEncoder("h264", (10, 10), 80)
+    with raises(ValueError):
+        encoder.encode(np.zeros((12, 10, 3), np.uint8))
+    with raises(ValueError):
+        encoder.encode(np.zeros((10, 10, 3), np.uint8), "RGBA")
+
+
+def test_quality_to_crf():
+    """Test that a higher quality means a lower CRF, within range."""
+
+    for codec, max_crf in [("h264", 51), ("vp9", 63)]:
+        crfs = [quality_to_crf(codec, q) for q in range(1, 101)]
+        assert crfs == sorted(crfs, reverse=True)
+        assert 0 <= crfs[-1] and crfs[0] <= max_crf
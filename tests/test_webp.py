@@ -0,0 +1,103 @@
+"""Test the webp module."""
+
+import io
+
+import numpy as np
+import pytest
+from pytest import raises
+
+from jupyter_rfb import _webp
+from jupyter_rfb._webp import array2webp, array2avif, get_pillow, LOSSLESS_PRESETS
+
+
+def get_random_im(*shape):
+    """Get a random image."""
+    return np.random.randint(0, 255, shape).astype(np.uint8)
+
+
+def read_image(bb):
+    """Decode an image using Pillow."""
+    pil_image = pytest.importorskip("PIL.Image")
+    return np.asarray(pil_image.open(io.BytesIO(bb)))
+
+
+def test_array2webp_lossless():
+    """Test that lossless WebP preserves all pixels, also alpha."""
+    if get_pillow("WEBP") is None:
+        pytest.skip("Need Pillow with WebP support")
+
+    # Note that the color of fully transparent pixels is not preserved
+    rgba = get_random_im(20, 30, 4)
+    rgba[:, :, 3] |= 1
+    for preset in LOSSLESS_PRESETS:
+        bb = array2webp(rgba, lossless=True, preset=preset)
+        assert bb.startswith(b"RIFF")
+        assert np.all(read_image(bb) == rgba)
+
+    # Other layouts, and strided arrays
+    bgra = rgba[:, :, [2, 1, 0, 3]]
+    assert np.all(read_image(array2webp(bgra, lossless=True, layout="BGRA")) == rgba)
+    bgr = bgra[:, :, :3]
+    rgb = rgba[:, :, :3]
+    assert np.all(read_image(array2webp(bgr, lossless=True, layout="BGR")) == rgb)
+    crop = rgba[2:-2, 3:-3]
+    assert np.all(read_image(array2webp(crop, lossless=True)) == crop)
+
+    # Grayscale
+    gray = get_random_im(20, 30)
+    result = read_image(array2webp(gray, lossless=True))
+    assert np.all(result[:, :, 0] == gray)
+
+    with raises(ValueError):
+        array2webp(rgba, lossless=True, preset="foo")
+
+
+def test_array2webp_lossy():
+    """Test lossy WebP."""
+    if get_pillow("WEBP") is None:
+        pytest.skip("Need Pillow with WebP support")
+
+    im = get_random_im(100, 100, 3)
+    bb1 = array2webp(im, 90)
+    bb2 = array2webp(im, 20)
+    assert bb1.startswith(b"RIFF")
+    assert len(bb2) < len(bb1)
+
+    # Transparency is preserved
+    im = get_random_im(100, 100, 4)
+    im[:, :, 3] = 0
+    assert np.all(read_image(array2webp(im, 80))[:, :, 3] == 0)
+
+    with raises(ValueError):
+        array2webp(get_random_im(10, 10, 2))
+    with raises(ValueError):
+        array2webp(get_random_im(10, 10, 3).astype(np.float32))
+    with raises(ValueError):
+        array2webp(b"1234")
+
+
+def test_array2avif():
+    """Test lossy AVIF."""
+    if get_pillow("AVIF") is None:
+        pytest.skip("Need Pillow with AVIF support")
+
+    im = get_random_im(100, 100, 3)
+    bb1 = array2avif(im, 90)
+    bb2 = array2avif(im, 20)
+    assert b"ftypavif" in bb1[:32]
+    assert len(bb2) < len(bb1)
+    assert read_image(bb1).shape == (100, 100, 3)
+
+
+def test_unavailable():
+    """Test that None is returned if a format is not available."""
+    im = get_random_im(10, 10, 3)
+    original = _webp._pillow_per_format.copy()
+    try:
+        _webp._pillow_per_format.update(WEBP=None, AVIF=None)
+        assert array2webp(im) is None
+        assert array2webp(im, lossless=True) is None
+        assert array2avif(im) is None
+    finally:
+        _webp._pillow_per_format.clear()
+        _webp._pillow_per_format.update(original)
@@ -4,11 +4,32 @@ We don't test it live (in a notebook) here, but other than that these
 tests are pretty complete to test the Python-side logic.
 """
 
+import asyncio
+import threading
 import time
+from base64 import b64encode
 
 import numpy as np
-from pytest import raises
-from jupyter_rfb import RemoteFrameBuffer
+import pytest
+from pytest import approx, raises
+from jupyter_rfb import (
+    FrameRecording,
+    ProfilingHook,
+    RemoteFrameBuffer,
+    calibrate_jpeg_encoder,
+    clear_frame_cache,
+    disable_frame_scheduler,
+    enable_frame_scheduler,
+    get_frame_cache_stats,
+    get_frame_scheduler_stats,
+    get_snapshots,
+    save_snapshots,
+)
+from jupyter_rfb import _delta
+from jupyter_rfb import _snapshot as snapshot_module
+from jupyter_rfb import widget as widget_module
+from jupyter_rfb._png import array2png
+from jupyter_rfb._webp import array2webp, get_pillow
 from traitlets import TraitError
 
 
@@ -30,6 +51,7 @@ class MyRFB(RemoteFrameBuffer):
         self._frame_feedback = {}
         self._has_visible_views = True
         self.msgs = []
+        self._frame_counter = 0
 
     def send(self, msg, buffers):
         """Overload the send method so we can check what was sent."""
@@ -42,8 +64,9 @@ class MyRFB(RemoteFrameBuffer):
         self._rfb_draw_requested = True
 
     def get_frame(self):
-        """Return a stub array."""
-        return np.array([[1, 2], [3, 4]], np.uint8)
+        """Return a stub array, which is different for each frame."""
+        self._frame_counter += 1
+        return np.array([[1, 2], [3, self._frame_counter % 256]], np.uint8)
 
     def handle_event(self, event):
         """Implement to do nothing.
@@ -304,6 +327,114 @@ def test_snapshot():
     s = w.snapshot()
     assert s is None  # snapshot() uses display()
 
+    class StubDisplay:
+        def update(self, obj):
+            self.html = obj.data
+
+    # The lossless image that is sent is reused, and base64 encoded without newlines
+    w.quality = 100
+    w._rfb_pending_snapshot_display = display = StubDisplay()
+    w.trigger(True)
+    data = w.msgs[-1]["buffers"][0]
+    mimetype = w.msgs[-1]["mimetype"]
+    assert f"src='data:{mimetype};base64,{b64encode(data).decode()}'" in display.html
+
+    # A lossy image is not, because it can be of a lower quality
+    w.quality = 20
+    w._rfb_pending_snapshot_display = display = StubDisplay()
+    w.flush()
+    w.trigger(True)
+    data = w.msgs[-1]["buffers"][0]
+    assert w.msgs[-1]["mimetype"] == "image/jpeg"
+    assert "src='data:image/jpeg;base64," in display.html
+    assert b64encode(data).decode() not in display.html
+
+    # Or the image is encoded as requested
+    w.snapshot(format="png")
+    w._rfb_pending_snapshot_display = display = StubDisplay()
+    w.flush()
+    w.trigger(True)
+    assert "src='data:image/png;base64," in display.html
+
+
+def test_get_snapshot(tmp_path):
+    """Test getting snapshots as bytes, and saving them to files."""
+
+    w = MyRFB()
+    w._rfb_last_resize_event = None
+    w.quality = 100
+
+    # Without a frame, one is rendered, after giving the widget a size
+    data = w.get_snapshot()
+    assert data.startswith(b"\x89PNG")
+    assert w._rfb_last_resize_event["pwidth"] == 500
+    assert w._frame_counter == 1
+
+    # The lossless image that was sent is reused
+    w.trigger(True)
+    assert w.msgs[-1]["mimetype"] == "image/png"
+    assert w.get_snapshot() == w.msgs[-1]["buffers"][0]
+    assert w._frame_counter == 2
+
+    # Another format is encoded
+    data = w.get_snapshot("jpeg", 50)
+    assert data.startswith(b"\xff\xd8")
+
+    # A pending draw is rendered
+    w._rfb_draw_requested = True
+    w.get_snapshot()
+    assert w._frame_counter == 3
+
+    # Save to files, the format follows from the extension
+    w._rfb_draw_requested = False
+    w.save_snapshot(tmp_path / "snapshot.png")
+    assert (tmp_path / "snapshot.png").read_bytes() == w.msgs[-1]["buffers"][0]
+    w.save_snapshot(tmp_path / "snapshot.jpg")
+    assert (tmp_path / "snapshot.jpg").read_bytes().startswith(b"\xff\xd8")
+
+    with raises(ValueError):
+        w.get_snapshot("gif")
+
+    class AsyncRFB(MyRFB):
+        async def get_frame(self):
+            return np.zeros((2, 2), np.uint8)
+
+    with raises(RuntimeError):
+        AsyncRFB().get_snapshot()
+
+
+def test_get_snapshots(tmp_path, monkeypatch):
+    """Test getting the snapshots of multiple widgets at once."""
+
+    widgets = [MyRFB() for _ in range(4)]
+    for i, w in enumerate(widgets):
+        w._frame_counter = i
+        w.trigger(True)
+    snapshots = get_snapshots(widgets)
+    assert snapshots == [w.get_snapshot() for w in widgets]
+    assert len(set(snapshots)) == 4
+
+    files = [tmp_path / f"snapshot{i}.png" for i in range(4)]
+    save_snapshots(widgets, files)
+    assert [f.read_bytes() for f in files] == snapshots
+
+    # The images are encoded in the encoder pool of the widgets
+    threads = set()
+    encode_snapshot = snapshot_module.encode_snapshot
+
+    def record_thread(*args):
+        threads.add(threading.current_thread().name)
+        return encode_snapshot(*args)
+
+    widgets[2].encoder_threads = 2
+    monkeypatch.setattr(snapshot_module, "encode_snapshot", record_thread)
+    assert get_snapshots(widgets) == snapshots
+    assert threads and all(t.startswith("jupyter_rfb_encoder") for t in threads)
+    widgets[2].close()
+
+    with raises(ValueError):
+        save_snapshots(widgets, files[:2])
+
 
 def test_use_websocket():
     """Test the use of websocket and base64."""
@@ -336,3 +467,1397 @@ def test_use_websocket():
     assert len(msg["buffers"]) == 1
     assert isinstance(msg["buffers"][0], bytes)
     assert msg["data_b64"] is None
+
+
+def test_frame_records(tmp_path):
+    """Test the per-frame records, and the stats derived from them."""
+
+    w = MyRFB()
+    w.trigger(True)
+    w.flush()
+    w.trigger(True)
+    w.flush()
+    w.trigger(False)
+
+    records = w.get_frame_records()
+    assert records["index"].tolist() == [1, 2]
+    assert (records["render_time"] >= 0).all()
+    assert (records["encoding_time"] > 0).all()
+    assert records["nbytes"].tolist() == [len(m["buffers"][0]) for m in w.msgs]
+    assert records["mimetype"].tolist() == [m["mimetype"] for m in w.msgs]
+    assert records["in_flight"].tolist() == [1, 1]
+    assert (records["ack_latency"] >= 0).all()
+
+    # Frames from send_frame() have no render time, and are not confirmed yet
+    w.send_frame(np.zeros((2, 2, 3), np.uint8))
+    record = w.get_frame_records()[-1]
+    assert np.isnan(record["render_time"])
+    assert np.isnan(record["ack_latency"])
+    assert record["in_flight"] == 1
+
+    stats = w.get_stats()
+    assert set(stats["percentiles"]) == {
+        "render_time",
+        "encoding_time",
+        "nbytes",
+        "ack_latency",
+    }
+    p50, p95, p99 = stats["percentiles"]["nbytes"]
+    assert 0 < p50 <= p95 <= p99
+    assert stats["throughput"] >= 0
+    assert stats["b64_encoding"] == 0
+
+    # The time for base64 encoding is measured separately
+    w._use_websocket = False
+    w.flush()
+    w.trigger(True)
+    assert w.get_stats()["b64_encoding"] > 0
+    assert w.get_frame_records()[-1]["nbytes"] == len(w.msgs[-1]["data_b64"])
+
+    # Export to CSV
+    filename = tmp_path / "records.csv"
+    w.save_frame_records(filename)
+    lines = filename.read_text().splitlines()
+    assert lines[0].startswith("index,timestamp,render_time,")
+    assert len(lines) == 1 + len(w.get_frame_records())
+
+    w.reset_stats()
+    assert len(w.get_frame_records()) == 0
+
+
+def test_client_timing():
+    """Test the stage times from the client, and estimating its clock offset."""
+
+    w = MyRFB()
+    w.max_buffered_frames = 2
+    offset = 100.0  # the client's clock is ahead
+
+    def confirm(msg, delay=0.01):
+        t = time.time() + offset
+        w._frame_feedback = {
+            "index": msg["index"],
+            "timestamp": msg["timestamp"],
+            "localtime": t,
+            "received": t - 3 * delay,
+            "decoded": t - delay,
+            "painted": t,
+        }
+        w.trigger(False)
+
+    # Without an estimate, the clocks are assumed to be in sync
+    w.trigger(True)
+    confirm(w.msgs[-1])
+    stats = w.get_stats()
+    assert stats["delivery"] == approx(offset, abs=0.1)
+    assert stats["decode"] == approx(0.02)
+    assert stats["paint"] == approx(0.01)
+    assert stats["clock_offset"] == 0
+
+    # The server pings the client, the reply results in an estimate
+    ping = w.msgs[-1]
+    assert ping["type"] == "clock_ping"
+    t = time.time() + offset
+    w._rfb_handle_msg(w, {"type": "clock_pong", "t0": ping["t0"], "t1": t, "t2": t}, [])
+    assert w.get_stats()["clock_offset"] == approx(offset, abs=0.05)
+
+    # Now the delivery is measured correctly
+    w.reset_stats()
+    w.trigger(True)
+    confirm(w.msgs[-1])
+    assert abs(w.get_stats()["delivery"]) < 0.05
+
+    # No new ping is sent right away
+    assert [m["type"] for m in w.msgs].count("clock_ping") == 1
+
+
+def test_frame_scheduler():
+    """Test that the kernel-wide scheduler defers draws to stay within budget."""
+
+    async def main():
+        w1, w2 = MyRFB(), MyRFB()
+        w1.trigger(True)
+        nbytes = len(w1.msgs[0]["buffers"][0])
+        assert get_frame_scheduler_stats() is None
+
+        # A budget for 5 frames per second, with a burst of half a frame
+        enable_frame_scheduler(max_bandwidth=5 * nbytes)
+        try:
+            w1.flush()
+            w1.trigger(True)
+            assert len(w1.msgs) == 2
+            w2.trigger(True)
+            assert len(w2.msgs) == 0
+
+            stats = get_frame_scheduler_stats()
+            assert stats["max_bandwidth"] == 5 * nbytes
+            assert stats["delay"] > 0
+            allocations = {a["widget"]: a for a in stats["widgets"]}
+            assert allocations[w1]["frames"] == 1
+            assert allocations[w1]["bandwidth_share"] == 1
+            assert allocations[w2]["deferred_draws"] == 1
+            assert allocations[w2]["waiting"]
+
+            # The deferred draw happens when the budget has recovered
+            await asyncio.sleep(0.05)
+            assert len(w2.msgs) == 0
+            await asyncio.sleep(0.1)
+            assert len(w2.msgs) == 1
+
+            # The widgets share the encoder pool
+            enable_frame_scheduler(encoder_threads=1)
+            pool = w1._rfb_get_encoder_pool()
+            assert pool is not None
+            assert w2._rfb_get_encoder_pool() is pool
+            assert w1._rfb_encoder_pool is None
+
+            w1.close()
+            widgets = [a["widget"] for a in get_frame_scheduler_stats()["widgets"]]
+            assert w1 not in widgets
+        finally:
+            disable_frame_scheduler()
+        assert w2._rfb_get_encoder_pool() is None
+
+    asyncio.run(main())
+
+
+def test_profiling_hooks():
+    """Test that profiling hooks are called for each stage of a frame and event."""
+
+    class RecordingHook(ProfilingHook):
+        def __init__(self):
+            self.calls = []
+
+        def before_get_frame(self, widget, index):
+            self.calls.append(("before_get_frame", index))
+
+        def after_get_frame(self, widget, index, duration):
+            assert duration >= 0
+            self.calls.append(("after_get_frame", index))
+
+        def before_encode(self, widget, index):
+            self.calls.append(("before_encode", index))
+
+        def after_encode(self, widget, index, duration, mimetype):
+            assert mimetype.startswith("image/")
+            self.calls.append(("after_encode", index))
+
+        def before_send(self, widget, index):
+            self.calls.append(("before_send", index))
+
+        def after_send(self, widget, index, duration, nbytes):
+            assert nbytes == len(widget.msgs[-1]["buffers"][0])
+            self.calls.append(("after_send", index))
+
+        def on_ack(self, widget, index, latency):
+            assert latency >= 0
+            self.calls.append(("on_ack", index))
+
+        def before_handle_event(self, widget, event):
+            self.calls.append(("before_handle_event", event))
+
+        def after_handle_event(self, widget, event, duration):
+            self.calls.append(("after_handle_event", event))
+
+    w = MyRFB()
+    hook = RecordingHook()
+    w.add_profiling_hook(hook)
+    w.add_profiling_hook(hook)
+    w.trigger(True)
+    assert hook.calls == [
+        ("before_get_frame", 1),
+        ("after_get_frame", 1),
+        ("before_encode", 1),
+        ("after_encode", 1),
+        ("before_send", 1),
+        ("after_send", 1),
+    ]
+
+    hook.calls.clear()
+    w.flush()
+    w.trigger(False)
+    w.trigger(False)
+    assert hook.calls == [("on_ack", 1)]
+
+    hook.calls.clear()
+    w._rfb_handle_msg(w, {"type": "key_down", "key": "a"}, [])
+    assert [call[0] for call in hook.calls] == [
+        "before_handle_event",
+        "after_handle_event",
+    ]
+    assert hook.calls[0][1]["event_type"] == "key_down"
+
+    # Errors in a hook are shown, and do not stop the frame
+    class BrokenHook(ProfilingHook):
+        def before_encode(self, widget, index):
+            raise RuntimeError("oops")
+
+    errors = []
+    w._output_context.append_stderr = errors.append
+    w.add_profiling_hook(BrokenHook())
+    w.trigger(True)
+    assert len(w.msgs) == 2
+    assert "oops" in errors[0]
+
+    # Without hooks, nothing is called
+    hook.calls.clear()
+    w.remove_profiling_hook(hook)
+    w._rfb_profiling_hooks.clear()
+    w.flush()
+    w.trigger(True)
+    assert len(w.msgs) == 3
+    assert hook.calls == []
+
+    async def main():
+        # With async get_frame() and threaded encoding, all calls happen in the loop
+        class AsyncRFB(MyRFB):
+            async def get_frame(self):
+                await asyncio.sleep(0.01)
+                return super().get_frame()
+
+        w = AsyncRFB()
+        w.encoder_threads = 1
+        hook = RecordingHook()
+        w.add_profiling_hook(hook)
+        w.trigger(True)
+        assert hook.calls == [("before_get_frame", 1)]
+        await asyncio.sleep(0.2)
+        assert [call[0] for call in hook.calls] == [
+            "before_get_frame",
+            "after_get_frame",
+            "before_encode",
+            "after_encode",
+            "before_send",
+            "after_send",
+        ]
+        assert len(w.msgs) == 1
+        w.close()
+
+    asyncio.run(main())
+
+
+def test_recording(tmp_path):
+    """Test recording the frames that are sent."""
+
+    w = MyRFB()
+    filename = tmp_path / "frames.rfbrec"
+    w.trigger(True)
+    w.start_recording(filename)
+    for _ in range(3):
+        w.flush()
+        w.trigger(True)
+    # An unchanged frame is recorded too
+    w._frame_counter -= 1
+    w.flush()
+    w.trigger(True)
+    w.stop_recording()
+    w.flush()
+    w.trigger(True)
+    assert len(w.msgs) == 6
+
+    recording = FrameRecording(filename)
+    assert recording.index["index"].tolist() == [2, 3, 4, 5]
+    for i, msg in enumerate(w.msgs[1:5]):
+        recorded_msg, buffers = recording[i]
+        assert recorded_msg["index"] == msg["index"]
+        assert recorded_msg["timestamp"] == msg["timestamp"]
+        assert recorded_msg["mimetype"] == msg["mimetype"]
+        assert [bytes(b) for b in buffers] == [bytes(b) for b in msg["buffers"]]
+    assert recording[3][0]["unchanged"]
+    recording.close()
+
+    # Closing the widget stops the recording
+    w.start_recording(filename)
+    thread = w._rfb_recorder._thread
+    w.close()
+    assert w._rfb_recorder is None
+    thread.join()
+    assert len(FrameRecording(filename)) == 0
+
+    # Stopping reports an error in the writer thread
+    w = MyRFB()
+    w.start_recording(filename)
+
+    def failing_write_frame(msg, buffers):
+        raise OSError("disk full")
+
+    w._rfb_recorder._write_frame = failing_write_frame
+    w.trigger(True)
+    with raises(RuntimeError, match="disk full"):
+        w.stop_recording()
+    assert w._rfb_recorder is None
+
+
+def test_encoder_threads():
+    """Test encoding in worker threads, with frames sent in order."""
+
+    class SlowRFB(MyRFB):
+        def __init__(self):
+            super().__init__()
+            self.delays = {}
+
+        def _rfb_encode_frame(self, frame, array):
+            time.sleep(self.delays.get(frame["index"], 0))
+            return super()._rfb_encode_frame(frame, array)
+
+    async def main():
+        w = SlowRFB()
+        w.encoder_threads = 2
+        w.max_buffered_frames = 3
+
+        # The first frame is slow, so the second is ready first
+        w.delays = {1: 0.2}
+        w.trigger(True)
+        w.trigger(True)
+        assert len(w.msgs) == 0  # encoding in a thread
+
+        # No more draws than max_buffered_frames, even while encoding
+        w.trigger(True)
+        w.trigger(True)
+        assert w._rfb_frame_index == 3
+
+        await asyncio.sleep(0.25)
+        assert [msg["index"] for msg in w.msgs] == [2, 3]
+        assert w.get_stats()["sent_frames"] == 2
+        assert w.get_stats()["dropped_frames"] == 1
+
+        # Confirm the last frame, the dropped frame is not counted
+        w._frame_feedback = {
+            "index": 3,
+            "timestamp": w.msgs[-1]["timestamp"],
+            "localtime": time.time(),
+        }
+        w.trigger(False)
+        assert w.get_stats()["confirmed_frames"] == 2
+        assert w._rfb_frame_index == 4
+
+        await asyncio.sleep(0.1)
+        assert [msg["index"] for msg in w.msgs] == [2, 3, 4]
+
+        w.close()
+        assert w._rfb_encoder_pool is None
+
+    asyncio.run(main())
+
+
+def test_fingerprint_in_worker(monkeypatch):
+    """Test that frames are hashed in the worker thread, and still skipped."""
+
+    threads = []
+
+    def get_fingerprint(array, stats=None):
+        threads.append(threading.current_thread())
+        return _delta.get_fingerprint(array, stats)
+
+    monkeypatch.setattr(widget_module, "get_fingerprint", get_fingerprint)
+
+    async def main():
+        w = MyRFB()
+        w.encoder_threads = 1
+        im = np.random.randint(0, 255, (30, 40, 4)).astype(np.uint8)
+        w.get_frame = lambda: im[:, :, :3]  # strided
+
+        w.trigger(True)
+        await asyncio.sleep(0.1)
+        assert w.msgs[-1]["mimetype"] != ""
+        w.flush()
+        w.trigger(True)
+        await asyncio.sleep(0.1)
+        assert w.msgs[-1]["unchanged"]
+        assert w.get_stats()["skipped_frames"] == 1
+        assert w.get_stats()["copies"] >= 1  # the hashing copies the rows
+
+        assert len(threads) == 2
+        assert threading.main_thread() not in threads
+        w.close()
+
+    asyncio.run(main())
+
+
+def test_encoder_error():
+    """Test that a frame that fails to encode does not stall the widget."""
+
+    class FailingRFB(MyRFB):
+        fail = False
+
+        def _rfb_encode_frame(self, frame, array):
+            if self.fail:
+                raise RuntimeError("encoder failed")
+            return super()._rfb_encode_frame(frame, array)
+
+    def check_recovery(w):
+        # An unchanged frame is sent in place of the failed frame
+        msg = w.msgs[-1]
+        assert msg["unchanged"] and msg["index"] == w._rfb_frame_index
+        assert w.get_stats()["dropped_frames"] == 1
+        assert "encoder failed" in errors[-1]
+        # When it is confirmed, the widget draws again
+        w.fail = False
+        w.flush()
+        w.trigger(True)
+        assert w._rfb_frame_index == 2
+
+    errors = []
+
+    # Encoding in the event loop
+    w = FailingRFB()
+    w._output_context.append_stderr = errors.append
+    w.fail = True
+    w.trigger(True)
+    check_recovery(w)
+    assert not w.msgs[-1].get("unchanged")
+
+    async def main():
+        # Encoding in a worker thread
+        w = FailingRFB()
+        w._output_context.append_stderr = errors.append
+        w.encoder_threads = 1
+        w.fail = True
+        w.trigger(True)
+        await asyncio.sleep(0.1)
+        check_recovery(w)
+        await asyncio.sleep(0.1)
+        assert not w.msgs[-1].get("unchanged")
+        w.close()
+
+    asyncio.run(main())
+
+
+def test_delta_frames():
+    """Test sending only the changed tiles."""
+
+    w = MyRFB()
+    w.max_buffered_frames = 99
+    w._rfb_tile_size = 10
+    w._rfb_keyframe_interval = 2
+    assert w._view_backend == "img"
+    w.delta_frames = True
+    assert w._view_backend == "canvas"
+
+    im = np.zeros((30, 40, 3), np.uint8)
+    w.get_frame = lambda: im.copy()
+
+    # First frame is a keyframe
+    w.trigger(True)
+    assert "tiles" not in w.msgs[-1]
+    assert len(w.msgs[-1]["buffers"]) == 1
+
+    # Changed pixels result in changed tiles
+    im[15, 15] = 255
+    im[25, 35] = 255
+    w.trigger(True)
+    msg = w.msgs[-1]
+    assert msg["shape"] == (30, 40)
+    assert msg["tiles"] == [(10, 10, 10, 10), (30, 20, 10, 10)]
+    assert len(msg["buffers"]) == 2
+
+    # Unchanged frame is skipped
+    w.trigger(True)
+    assert w.msgs[-1]["unchanged"]
+    assert len(w.msgs[-1]["buffers"]) == 0
+
+    # A skipped frame can be the base of a delta frame
+    im[5, 5] = 255
+    w.trigger(True)
+    assert w.msgs[-1]["tiles"] == [(0, 0, 10, 10)]
+
+    # After a max number of deltas, we get a keyframe
+    im[5, 5] = 0
+    w.trigger(True)
+    assert "tiles" not in w.msgs[-1]
+
+    # If most tiles changed, we get a keyframe
+    im[:] = 100
+    w.trigger(True)
+    assert "tiles" not in w.msgs[-1]
+
+    # On resize, we get a keyframe
+    im = np.zeros((30, 50, 3), np.uint8)
+    w.trigger(True)
+    assert "tiles" not in w.msgs[-1]
+
+    # When the client misses the base, it asks for a keyframe, also if unchanged
+    w._rfb_handle_msg(w, {"type": "request_keyframe"}, [])
+    w.trigger(True)
+    assert "tiles" not in w.msgs[-1]
+    assert not w.msgs[-1].get("unchanged")
+    im[5, 5] = 255
+    w.trigger(True)
+    assert w.msgs[-1]["tiles"] == [(0, 0, 10, 10)]
+    im[5, 5] = 0
+
+    # The lossless redraw is a keyframe
+    w._rfb_send_frame(im, True)
+    assert "tiles" not in w.msgs[-1]
+    assert w.msgs[-1]["mimetype"] == "image/png"
+
+    # No deltas when websocket is off
+    w._use_websocket = False
+    im[5, 5] = 255
+    w.trigger(True)
+    assert "tiles" not in w.msgs[-1]
+
+
+def test_delta_frames_reused_array():
+    """Test delta frames when get_frame() changes and returns the same array."""
+
+    w = MyRFB()
+    w.max_buffered_frames = 99
+    w._rfb_tile_size = 10
+    w.delta_frames = True
+
+    im = np.zeros((30, 40, 3), np.uint8)
+    w.get_frame = lambda: im
+
+    w.trigger(True)
+    assert "tiles" not in w.msgs[-1]
+
+    # The base is not the array itself, so the change is found
+    im[15, 15] = 255
+    w.trigger(True)
+    assert w.msgs[-1]["tiles"] == [(10, 10, 10, 10)]
+    assert len(w.msgs[-1]["buffers"]) == 1
+    im[25, 35] = 255
+    w.trigger(True)
+    assert w.msgs[-1]["tiles"] == [(30, 20, 10, 10)]
+
+    # Buffers from get_frame_buffer() are not copied, since they are not reused
+    # while they are the base.
+    buffer = w._rfb_frame_buffers.acquire((30, 40, 3), [])
+    w.get_frame = lambda: buffer
+    w.trigger(True)
+    assert w._rfb_delta_base[1] is buffer
+
+
+def test_delta_frames_stale_base_with_threads():
+    """Test that a delta frame with a dropped base is re-encoded in a worker thread."""
+
+    class SlowRFB(MyRFB):
+        def __init__(self):
+            super().__init__()
+            self.delays = {}
+            self.encodes = []
+
+        def _rfb_encode_frame(self, frame, array):
+            self.encodes.append((frame["index"], frame["base"] is not None))
+            assert threading.current_thread() is not threading.main_thread()
+            time.sleep(self.delays.get(frame["index"], 0))
+            return super()._rfb_encode_frame(frame, array)
+
+    async def main():
+        w = SlowRFB()
+        w.delta_frames = True
+        w.encoder_threads = 2
+        w.max_buffered_frames = 3
+        im = np.zeros((100, 200, 3), np.uint8)
+        w.get_frame = lambda: im.copy()
+
+        # The first frame is slow, so the second (a delta) is ready first
+        w.delays = {1: 0.2}
+        w.trigger(True)
+        im[5, 5] = 255
+        w.trigger(True)
+        await asyncio.sleep(0.1)
+        assert [msg["index"] for msg in w.msgs] == [2]
+        assert "tiles" not in w.msgs[-1]
+        assert w.encodes == [(1, False), (2, True), (2, False)]
+
+        await asyncio.sleep(0.2)
+        assert [msg["index"] for msg in w.msgs] == [2]
+        w.close()
+
+    asyncio.run(main())
+
+
+def test_skip_unchanged_frames():
+    """Test that frames that the client already has are not sent again."""
+
+    w = MyRFB()
+    w.max_buffered_frames = 99
+    im = np.random.randint(0, 255, (30, 40, 3)).astype(np.uint8)
+    w.get_frame = lambda: im.copy()
+
+    w.trigger(True)
+    assert w.msgs[-1]["mimetype"] != ""
+    assert w.msgs[-1]["index"] == 1
+
+    # Same content, the index still advances
+    w.trigger(True)
+    w.trigger(True)
+    assert len(w.msgs) == 3
+    for msg in w.msgs[1:]:
+        assert msg["unchanged"]
+        assert msg["mimetype"] == ""
+        assert msg["buffers"] == []
+    assert w.msgs[-1]["index"] == 3
+
+    stats = w.get_stats()
+    assert stats["sent_frames"] == 1
+    assert stats["skipped_frames"] == 2
+
+    # Skipped frames are confirmed, but not counted
+    w.flush()
+    w.trigger(False)
+    assert w.get_stats()["confirmed_frames"] == 1
+
+    # The lossless redraw is sent once
+    w._rfb_send_frame(im, True)
+    assert w.msgs[-1]["mimetype"] == "image/png"
+    assert len(w.msgs) == 4
+    w._rfb_send_frame(im, True)
+    assert len(w.msgs) == 4
+
+    # A new frame with the same content is skipped too, now that it is lossless
+    w.trigger(True)
+    assert w.msgs[-1]["unchanged"]
+
+    # Changed content is sent
+    im[0, 0] += 1
+    w.trigger(True)
+    assert "unchanged" not in w.msgs[-1]
+    assert w.get_stats()["skipped_frames"] == 3
+
+
+def test_shared_frame_cache():
+    """Test that widgets share encoded frames via the cache."""
+
+    clear_frame_cache()
+    im = np.random.randint(0, 255, (30, 40, 3)).astype(np.uint8)
+    w1, w2 = MyRFB(), MyRFB()
+
+    w1._rfb_send_frame(im)
+    hits = get_frame_cache_stats()["hits"]
+    w2._rfb_send_frame(im)
+    assert get_frame_cache_stats()["hits"] == hits + 1
+    assert w2.msgs[-1]["buffers"] == w1.msgs[-1]["buffers"]
+
+    # Another quality is another image
+    w3 = MyRFB()
+    w3.quality = 50
+    w3._rfb_send_frame(im)
+    assert get_frame_cache_stats()["hits"] == hits + 1
+    assert w3.msgs[-1]["buffers"] != w1.msgs[-1]["buffers"]
+
+    # A snapshot of a frame that another widget sent is a hit, and vice versa
+    w4 = MyRFB()
+    w4._rfb_last_frame = im
+    assert w4.get_snapshot("jpeg") == w1.msgs[-1]["buffers"][0]
+    assert get_frame_cache_stats()["hits"] == hits + 2
+    w1._rfb_send_frame(im, True)
+    assert w4.get_snapshot("png") == w1.msgs[-1]["buffers"][0]
+    assert get_frame_cache_stats()["hits"] == hits + 3
+    im2 = im[::-1].copy()
+    w4._rfb_last_frame = im2
+    w4.get_snapshot("png")
+    w2._rfb_send_frame(im2, True)
+    assert get_frame_cache_stats()["hits"] == hits + 4
+    assert get_frame_cache_stats()["count"] == 4
+
+
+def test_adaptive_quality():
+    """Test that the quality adapts to the roundtrip time."""
+
+    w = MyRFB()
+    w.max_buffered_frames = 1
+    w.quality = 90
+    w.min_quality = 40
+
+    # Fixed quality by default
+    for _ in range(3):
+        w.trigger(True)
+        w.flush()
+    assert w.get_stats()["quality_history"] == [90, 90, 90]
+    assert w._rfb_quality_controller is None
+
+    # Simulate a slow connection, by pretending that frames were sent 1s ago
+    w.target_fps = 10
+    for _ in range(20):
+        w.trigger(True)
+        w.flush()
+        w._frame_feedback["timestamp"] -= 1
+    history = w.get_stats()["quality_history"]
+    assert history[3] == 90
+    assert history[-1] == 40
+    assert history[3:] == sorted(history[3:], reverse=True)
+
+    # Fast connection, the quality climbs back
+    for _ in range(100):
+        w.trigger(True)
+        w.flush()
+    assert w.get_stats()["quality_history"][-1] == 90
+
+    # Disabling it restores the fixed quality
+    w.target_fps = 0
+    w.quality = 70
+    w.trigger(True)
+    assert w.get_stats()["quality_history"][-1] == 70
+
+    with raises(TraitError):
+        w.target_latency = -1
+
+
+def test_interaction_scale():
+    """Test rendering at reduced resolution during interaction."""
+
+    class InteractionRFB(MyRFB):
+        _event_compatibility = 2
+
+        def __init__(self):
+            super().__init__()
+            self.events = []
+
+        def handle_event(self, event):
+            self.events.append(event)
+
+        def get_frame(self):
+            return np.zeros((10, 10, 3), np.uint8)
+
+    def resize_event(pwidth, pheight, ratio):
+        return {
+            "type": "resize",
+            "width": pwidth / ratio,
+            "height": pheight / ratio,
+            "pwidth": pwidth,
+            "pheight": pheight,
+            "ratio": ratio,
+            "timestamp": 0,
+        }
+
+    async def main():
+        w = InteractionRFB()
+        w.max_buffered_frames = 99
+        w._rfb_handle_msg(w, resize_event(400, 200, 2.0), [])
+
+        # Without interaction_scale, there is no difference
+        w._rfb_handle_msg(w, {"type": "pointer_down", "buttons": [1]}, [])
+        assert [e["type"] for e in w.events] == ["resize", "pointer_down"]
+
+        # Hovering does not count as interaction
+        w.interaction_scale = 0.5
+        w.events.clear()
+        w._rfb_handle_msg(w, {"type": "pointer_move", "buttons": []}, [])
+        assert [e["type"] for e in w.events] == ["pointer_move"]
+
+        # But dragging does
+        w.events.clear()
+        w._rfb_handle_msg(w, {"type": "pointer_move", "buttons": [1]}, [])
+        assert [e["type"] for e in w.events] == ["resize", "pointer_move"]
+        assert w.events[0]["pwidth"] == 200
+        assert w.events[0]["pheight"] == 100
+        assert w.events[0]["ratio"] == 1.0
+        assert w.events[0]["width"] == 200
+
+        # Resizing during the interaction keeps the reduced resolution
+        w._rfb_handle_msg(w, resize_event(600, 200, 2.0), [])
+        assert w.events[-1]["pwidth"] == 300
+        w._rfb_handle_msg(w, {"type": "wheel", "buttons": []}, [])
+        assert w.events[-1]["type"] == "wheel"
+
+        # After drawing and settling, the full size is restored
+        w.events.clear()
+        w.trigger(True)
+        await asyncio.sleep(0.4)
+        assert [e["type"] for e in w.events] == ["resize"]
+        assert w.events[0]["pwidth"] == 600
+        assert w.events[0]["ratio"] == 2.0
+        assert not w._rfb_is_interacting
+
+        # The interaction also settles when no frame is drawn
+        w.get_frame = lambda: None
+        w.events.clear()
+        w._rfb_handle_msg(w, {"type": "pointer_down", "buttons": [1]}, [])
+        assert w._rfb_is_interacting
+        await asyncio.sleep(0.2)
+        w._rfb_handle_msg(w, {"type": "pointer_move", "buttons": [1]}, [])
+        await asyncio.sleep(0.2)
+        assert w._rfb_is_interacting
+        await asyncio.sleep(0.2)
+        assert not w._rfb_is_interacting
+        assert w.events[-1]["type"] == "resize"
+        assert w.events[-1]["pwidth"] == 600
+
+    asyncio.run(main())
+
+
+def test_get_frame_buffer():
+    """Test rendering into reusable buffers."""
+
+    class BufferRFB(MyRFB):
+        def get_frame(self):
+            self._frame_counter += 1
+            a = self.get_frame_buffer()
+            a.fill(self._frame_counter)
+            return a
+
+    w = BufferRFB()
+    w.max_buffered_frames = 99
+    with raises(RuntimeError):
+        w.get_frame_buffer()
+
+    event = {"type": "resize", "width": 15, "height": 10}
+    w._rfb_handle_msg(w, {**event, "pwidth": 30, "pheight": 20, "ratio": 2}, [])
+    assert w.get_frame_buffer().shape == (20, 30, 3)
+    assert w.get_frame_buffer(4).shape == (20, 30, 4)
+
+    # The buffers are reused, after max_buffered_frames others
+    w.max_buffered_frames = 2
+    allocations = w._rfb_frame_buffers.allocations
+    buffers = []
+    for _ in range(10):
+        w.flush()
+        w.trigger(True)
+        buffers.append(w._rfb_last_frame)
+    assert len(w.msgs) == 10
+    assert len({id(a) for a in buffers}) == 3
+    assert w._rfb_frame_buffers.allocations == allocations + 3
+    assert buffers[3] is buffers[0]
+
+    # So buffers that are not sent yet (e.g. async rendering) are not reused
+    a = w.get_frame_buffer()
+    assert w.get_frame_buffer() is not a
+    w.max_buffered_frames = 99
+
+    # The delta base is in use too
+    w.delta_frames = True
+    w.trigger(True)
+    w.trigger(True)
+    arrays = w._rfb_get_arrays_in_use()
+    assert any(a is w._rfb_delta_base[1] for a in arrays)
+
+    # The size follows resize events
+    w._rfb_handle_msg(w, {**event, "pwidth": 15, "pheight": 10, "ratio": 1}, [])
+    w.trigger(True)
+    assert w._rfb_last_frame.shape == (10, 15, 3)
+
+
+def test_get_frame_buffer_with_threads():
+    """Test that buffers are not overwritten while being encoded."""
+
+    class BufferRFB(MyRFB):
+        def get_frame(self):
+            self._frame_counter += 1
+            a = self.get_frame_buffer()
+            a.fill(self._frame_counter)
+            return a
+
+    async def main():
+        w = BufferRFB()
+        w.max_buffered_frames = 99
+        w.encoder_threads = 2
+        w.quality = 100
+        event = {"type": "resize", "width": 300, "height": 200, "ratio": 1}
+        w._rfb_handle_msg(w, {**event, "pwidth": 300, "pheight": 200}, [])
+        for _ in range(5):
+            w.trigger(True)
+        assert len(w._rfb_encoding_arrays) > 0
+        in_use = w._rfb_get_arrays_in_use()
+        assert not any(np.may_share_memory(w.get_frame_buffer(), a) for a in in_use)
+        await asyncio.sleep(0.5)
+        assert not w._rfb_encoding_arrays
+        w.close()
+
+    asyncio.run(main())
+
+
+def test_async_get_frame():
+    """Test that an async get_frame() is awaited, with throttling and cancellation."""
+
+    class AsyncRFB(MyRFB):
+        def __init__(self):
+            super().__init__()
+            self.renders = []
+
+        async def get_frame(self):
+            self._frame_counter += 1
+            self.renders.append(self._frame_counter)
+            await asyncio.sleep(0.05)
+            return np.full((4, 4), self._frame_counter, np.uint8)
+
+    async def main():
+        w = AsyncRFB()
+
+        # The frame is sent when the render is done
+        w.trigger(True)
+        await asyncio.sleep(0.01)
+        assert w.renders == [1]
+        assert len(w.msgs) == 0
+        await asyncio.sleep(0.1)
+        assert len(w.msgs) == 1
+        assert w._rfb_render_task is None
+
+        # A pending render counts as a frame in flight
+        w.flush()
+        w.trigger(True)
+        w.trigger(True)
+        await asyncio.sleep(0.1)
+        assert w.renders == [1, 2]
+        assert len(w.msgs) == 2
+        w.flush()
+        w.trigger(False)
+        await asyncio.sleep(0.1)
+        assert w.renders == [1, 2, 3]
+        assert len(w.msgs) == 3
+
+        # A draw request cancels the stale render, but not twice in a row
+        w.flush()
+        w.trigger(True)
+        await asyncio.sleep(0.01)
+        w.request_draw()
+        await asyncio.sleep(0.01)
+        assert w.renders == [1, 2, 3, 4, 5]
+        w.request_draw()
+        await asyncio.sleep(0.1)
+        assert w.renders == [1, 2, 3, 4, 5]
+        assert len(w.msgs) == 4
+        w.flush()
+        w.trigger(False)
+        await asyncio.sleep(0.1)
+        assert w.renders == [1, 2, 3, 4, 5, 6]
+        assert len(w.msgs) == 5
+
+        # Closing cancels the render
+        w.flush()
+        w.trigger(True)
+        w.close()
+        await asyncio.sleep(0.1)
+        assert len(w.msgs) == 5
+
+    asyncio.run(main())
+
+
+def test_async_handle_event():
+    """Test that an async handle_event() is run as a task."""
+
+    class AsyncRFB(MyRFB):
+        def __init__(self):
+            super().__init__()
+            self.events = []
+
+        async def handle_event(self, event):
+            await asyncio.sleep(0.01)
+            self.events.append(event["type"])
+
+    async def main():
+        w = AsyncRFB()
+        w._rfb_handle_msg(w, {"type": "pointer_down", "buttons": [1]}, [])
+        assert w.events == []
+        await asyncio.sleep(0.05)
+        assert w.events == ["pointer_down"]
+        assert not w._rfb_event_tasks
+
+    asyncio.run(main())
+
+
+def test_max_fps():
+    """Test that an animation is paced to max_fps, and missed deadlines counted."""
+
+    class AnimatedRFB(MyRFB):
+        max_buffered_frames = 99
+
+        def get_frame(self):
+            self.request_draw()
+            return super().get_frame()
+
+    async def main():
+        w = AnimatedRFB()
+        w.max_fps = 20
+        w.request_draw()
+        await asyncio.sleep(0.52)
+        assert 9 <= len(w.msgs) <= 12
+        assert w.get_stats()["missed_deadlines"] == 0
+
+        # Bursts of draw requests are coalesced
+        w.max_fps = 1
+        n = len(w.msgs)
+        await asyncio.sleep(0.01)
+        for _ in range(10):
+            w.request_draw()
+            await asyncio.sleep(0.01)
+        assert len(w.msgs) == n + 1
+
+        # The client not being ready results in missed deadlines
+        w.max_fps = 50
+        w.max_buffered_frames = 1
+        w.flush()
+        await asyncio.sleep(0.1)
+        w.flush()
+        w.trigger(False)
+        assert w.get_stats()["missed_deadlines"] >= 3
+        w.close()
+
+    asyncio.run(main())
+
+
+def test_event_coalescing():
+    """Test that pointer_move and wheel events are merged within a loop iteration."""
+
+    class EventRFB(MyRFB):
+        def __init__(self):
+            super().__init__()
+            self.events = []
+
+        def handle_event(self, event):
+            self.events.append(event)
+
+    def move(x, buttons=()):
+        return {"type": "pointer_move", "x": x, "y": 0, "buttons": buttons}
+
+    def wheel(dy):
+        return {"type": "wheel", "x": 0, "y": 0, "dx": 0, "dy": dy, "buttons": []}
+
+    async def main():
+        w = EventRFB()
+
+        # The first event is dispatched directly, the others are merged
+        for x in range(5):
+            w._rfb_handle_msg(w, move(x), [])
+        assert [e["x"] for e in w.events] == [0]
+        await asyncio.sleep(0)
+        assert [e["x"] for e in w.events] == [0, 4]
+        assert w.get_stats()["coalesced_events"] == 3
+
+        # Other events keep the order
+        w.events.clear()
+        for dy in (1, 2, 3):
+            w._rfb_handle_msg(w, wheel(dy), [])
+        w._rfb_handle_msg(w, {"type": "pointer_down", "buttons": [1]}, [])
+        for x in (1, 2, 3):
+            w._rfb_handle_msg(w, move(x, [1]), [])
+        types = [e["type"] for e in w.events]
+        assert types == ["wheel", "wheel", "pointer_down", "pointer_move"]
+        assert [e["dy"] for e in w.events[:2]] == [1, 5]
+        await asyncio.sleep(0)
+        assert [e["type"] for e in w.events][4:] == ["pointer_move"]
+        assert w.events[-1]["x"] == 3
+
+        # Events that cannot be merged are dispatched directly
+        w.events.clear()
+        await asyncio.sleep(0)
+        w._rfb_handle_msg(w, move(1, [1]), [])
+        w._rfb_handle_msg(w, move(2), [])
+        assert [e["x"] for e in w.events] == [1, 2]
+
+    asyncio.run(main())
+
+
+def test_event_batch():
+    """Test that batched events are dispatched one by one."""
+
+    class EventRFB(MyRFB):
+        def __init__(self):
+            super().__init__()
+            self.events = []
+
+        def handle_event(self, event):
+            self.events.append(event)
+
+    async def main():
+        w = EventRFB()
+        assert w._event_batching
+
+        fields = ["x", "y", "dx", "dy", "timestamp"]
+        values = np.array([[1, 2, 0, 5, 10], [3, 4, 0, 5, 11], [3, 4, 0, 5, 12]], "<f8")
+        msg = {
+            "type": "event_batch",
+            "events": [
+                {"type": "wheel", "buttons": [], "modifiers": ["Shift"]},
+                {"type": "wheel", "buttons": [], "modifiers": ["Shift"]},
+                {"type": "key_down", "key": "a", "modifiers": []},
+            ],
+            "fields": fields,
+        }
+        w._rfb_handle_msg(w, msg, [values.tobytes()])
+        await asyncio.sleep(0)
+
+        # The same events as when sent separately, including coalescing
+        assert [e["type"] for e in w.events] == ["wheel", "wheel", "key_down"]
+        assert w.events[0]["modifiers"] == ("Shift",)
+        assert w.events[1]["x"] == 3 and w.events[1]["dy"] == 5
+        assert w.events[2]["key"] == "a" and w.events[2]["timestamp"] == 12
+
+    asyncio.run(main())
+
+
+def test_event_throttle():
+    """Test that the client's throttle follows the time to handle events."""
+
+    class SlowRFB(MyRFB):
+        delay = 0
+
+        def handle_event(self, event):
+            time.sleep(self.delay)
+
+    w = SlowRFB()
+    assert w._event_throttle == 0.02
+    w.event_throttle = 0.01
+    assert w._event_throttle == 0.01
+
+    w.delay = 0.05
+    for _ in range(10):
+        w._rfb_handle_msg(w, {"type": "pointer_move", "x": 0, "y": 0}, [])
+    assert 0.03 <= w._event_throttle <= 0.06
+
+    w.delay = 0.2
+    for _ in range(5):
+        w._rfb_handle_msg(w, {"type": "pointer_move", "x": 0, "y": 0}, [])
+    assert w._event_throttle == 0.1
+
+    w.delay = 0
+    for _ in range(40):
+        w._rfb_handle_msg(w, {"type": "pointer_move", "x": 0, "y": 0}, [])
+    assert 0.01 <= w._event_throttle <= 0.012
+
+
+def test_raw_transport():
+    """Test sending raw (compressed) pixels instead of encoded images."""
+
+    w = MyRFB()
+    w._use_websocket = True
+    im = np.random.randint(0, 255, (20, 30, 3)).astype(np.uint8)
+    assert w.transport == "encoded"
+    assert w._view_backend == "img"
+
+    w.transport = "raw"
+    assert w._view_backend == "canvas"
+    w._rfb_send_frame(im)
+    msg = w.msgs[-1]
+    assert msg["mimetype"] == "application/x-rgba"
+    assert msg["shape"] == (20, 30)
+    assert msg["compression"] == "none"
+    assert len(msg["buffers"][0]) == 20 * 30 * 4
+    assert w._rfb_sent_content[1]  # raw frames are lossless
+
+    w.raw_compression = "deflate"
+    w._rfb_send_frame(im[::-1])
+    assert w.msgs[-1]["compression"] == "deflate"
+    assert len(w.msgs[-1]["buffers"][0]) < 20 * 30 * 4
+
+    with raises(TraitError):
+        w.raw_compression = "zstd"
+
+    # Without websocket, frames are always encoded
+    w._use_websocket = False
+    w._rfb_send_frame(im)
+    assert w.msgs[-1]["mimetype"] in ("image/jpeg", "image/png")
+
+    # With auto, both transports are tried, and the measurements are used
+    w = MyRFB()
+    w._use_websocket = True
+    w.transport = "auto"
+    for i in range(4):
+        w._rfb_send_frame(np.full((20, 30, 3), i, np.uint8))
+        w._rfb_process_feedback(w._rfb_frame_index, 0.01 if i % 2 else 0.1)
+    mimetypes = [msg["mimetype"] for msg in w.msgs]
+    assert mimetypes[0] != "application/x-rgba"
+    assert mimetypes[1:] == ["application/x-rgba"] * 3
+    costs = w._rfb_transport_selector.get_costs()
+    assert costs["raw"] < costs["encoded"]
+
+
+def test_video_codec():
+    """Test streaming frames as video, with the keyframes and fallbacks."""
+
+    pytest.importorskip("av")
+    w = MyRFB()
+    w._use_websocket = True
+    frames = [np.full((20, 30, 3), i * 10, np.uint8) for i in range(6)]
+
+    # The client does not support the codec (yet)
+    w.video_codec = "h264"
+    assert w._view_backend == "canvas"
+    w._rfb_send_frame(frames[0])
+    assert w.msgs[-1]["mimetype"] in ("image/jpeg", "image/png")
+
+    # The first frame is a keyframe
+    w._video_codecs = ["h264", "vp9"]
+    w._rfb_send_frame(frames[1])
+    msg = w.msgs[-1]
+    assert msg["mimetype"] == "video/h264"
+    assert msg["keyframe"] is True
+    assert msg["shape"] == (20, 30)
+    w._rfb_send_frame(frames[2])
+    assert w.msgs[-1]["keyframe"] is False
+
+    # The lossless redraw is an image
+    w._rfb_send_frame(frames[2], True)
+    assert w.msgs[-1]["mimetype"] == "image/png"
+
+    # The client can ask for a keyframe (this is not an event)
+    w._rfb_handle_msg(w, {"type": "request_keyframe"}, [])
+    w._rfb_send_frame(frames[3])
+    assert w.msgs[-1]["keyframe"] is True
+    w._rfb_send_frame(frames[4])
+    assert w.msgs[-1]["keyframe"] is False
+
+    # A new size or codec needs a keyframe
+    w._rfb_send_frame(frames[5][:10])
+    assert w.msgs[-1]["keyframe"] is True
+    w.video_codec = "vp9"
+    w._rfb_send_frame(frames[5])
+    assert w.msgs[-1]["mimetype"] == "video/vp9"
+    assert w.msgs[-1]["keyframe"] is True
+
+    w.video_codec = "none"
+    w._rfb_send_frame(frames[0])
+    assert w.msgs[-1]["mimetype"] in ("image/jpeg", "image/png")
+
+    with raises(TraitError):
+        w.video_codec = "mpeg1"
+
+
+def test_view_backend():
+    """Test selecting how the client decodes and shows frames."""
+
+    w = MyRFB()
+    assert w.view_backend == "auto"
+    assert w._view_backend == "img"
+
+    w.view_backend = "worker"
+    assert w._view_backend == "worker"
+    w.view_backend = "canvas"
+    assert w._view_backend == "canvas"
+
+    # Compositing needs a canvas
+    w.view_backend = "img"
+    assert w._view_backend == "img"
+    w.delta_frames = True
+    assert w._view_backend == "canvas"
+    w.view_backend = "worker"
+    assert w._view_backend == "worker"
+    w.view_backend = "auto"
+    assert w._view_backend == "canvas"
+
+    with raises(TraitError):
+        w.view_backend = "webgl"
+
+
+def test_encoder_trait():
+    """Test selecting the JPEG encoder for a widget."""
+
+    w = MyRFB()
+    im = np.zeros((10, 10, 3), np.uint8)
+    assert w.encoder == "auto"
+    assert w._rfb_get_jpeg_backend(im) is None
+
+    w.encoder = "pillow"
+    assert w._rfb_get_jpeg_backend(im) == "pillow"
+
+    # Calibration runs in the background, at the widget's quality
+    w.encoder = "calibrate"
+    expected = calibrate_jpeg_encoder(im.shape, 60)
+    assert w._rfb_get_jpeg_backend(im, "RGB", 60) == expected
+
+    # The name is checked when it is set
+    with raises(TraitError):
+        w.encoder = "simplejepg"
+    assert w.encoder == "calibrate"
+
+    # The backend is only selected for JPEG frames
+    w._rfb_get_jpeg_backend = lambda *args: "pillow"
+    w._rfb_send_frame(im)
+    assert w.msgs[-1]["mimetype"] in ("image/jpeg", "image/png")
+    w.quality = 100
+    w._rfb_get_jpeg_backend = None  # would fail if called
+    w._rfb_send_frame(im + 1)
+    assert w.msgs[-1]["mimetype"] == "image/png"
+
+
+def test_image_format():
+    """Test selecting the image format, based on what the client supports."""
+
+    w = MyRFB()
+    im = np.random.randint(0, 255, (20, 30, 3)).astype(np.uint8)
+    assert w.image_format == "auto"
+
+    # The client has not reported its formats yet
+    assert w._rfb_get_image_format(False) == "jpeg"
+    assert w._rfb_get_image_format(True) == "jpeg"
+
+    # WebP is opt-in
+    w._image_formats = ["image/png", "image/jpeg", "image/webp"]
+    assert w._rfb_get_image_format(False) == "jpeg"
+    assert w._rfb_get_image_format(True) == "jpeg"
+    w.image_format = "webp"
+    assert w._rfb_get_image_format(False) == "webp"
+    assert w._rfb_get_image_format(True) == "webp"
+    w.image_format = "avif"
+    assert w._rfb_get_image_format(False) == "jpeg"
+    assert w._rfb_get_image_format(True) == "webp"
+    w._image_formats = ["image/png", "image/jpeg", "image/webp", "image/avif"]
+    assert w._rfb_get_image_format(False) == "avif"
+    w.image_format = "jpeg"
+    assert w._rfb_get_image_format(False) == "jpeg"
+    assert w._rfb_get_image_format(True) == "jpeg"
+
+    with raises(TraitError):
+        w.image_format = "gif"
+
+    # Sending frames, which are always followed by a lossless one
+    if get_pillow("WEBP") is not None:
+        w.image_format = "webp"
+        w._rfb_send_frame(im)
+        assert w.msgs[-1]["mimetype"] == "image/webp"
+        assert w._rfb_lossless_draw_info is None  # no loop in this test
+        w._rfb_send_frame(im, True)
+        assert w.msgs[-1]["mimetype"] == "image/webp"
+        # The lossless redraw uses the fast preset
+        w._use_websocket = True
+        w._rfb_send_frame(im[1:], True)
+        expected = array2webp(im[1:], lossless=True, preset="fast")
+        assert bytes(w.msgs[-1]["buffers"][0]) == expected
+
+
+def test_lossless_redraw_preset():
+    """Test that the lossless redraw when idle uses the default PNG preset."""
+
+    w = MyRFB()
+    w._use_websocket = True
+    y, x = np.mgrid[0:40, 0:60]
+    im = np.stack([x * 4, y * 6, x + y], axis=2).astype(np.uint8)
+
+    w._rfb_send_frame(im, True)
+    assert w.msgs[-1]["mimetype"] == "image/png"
+    assert bytes(w.msgs[-1]["buffers"][0]) == array2png(im, preset="default")
+
+    w.quality = 100
+    w._rfb_send_frame(im[1:])
+    assert bytes(w.msgs[-1]["buffers"][0]) == array2png(im[1:], preset="fast")
+
+
+def test_channel_order():
+    """Test that frames in BGR(A) order are encoded without copying."""
+
+    w = MyRFB()
+    w._use_websocket = True
+    rgba = np.random.randint(0, 255, (20, 30, 4)).astype(np.uint8)
+    bgra = np.ascontiguousarray(rgba[:, :, [2, 1, 0, 3]])
+
+    # PNG
+    w.quality = 100
+    w._rfb_send_frame(rgba)
+    w.channel_order = "BGR"
+    w._rfb_send_frame(bgra)
+    assert w.msgs[-1]["buffers"] == w.msgs[-2]["buffers"]
+    assert w.get_stats()["copies"] == 0
+
+    # JPEG, whether the selected encoder needs a copy depends on its layouts
+    w.quality = 80
+    w._rfb_send_frame(bgra[2:-2, 2:-2])
+    assert w.msgs[-1]["mimetype"] in ("image/jpeg", "image/png")
+    assert w.get_stats()["copies"] <= 1
+
+    with raises(TraitError):
+        w.channel_order = "RGBA"
+
+
+def test_frontend_assets():
+    """Test that the JS and CSS are loaded when the widget is created."""
+    from jupyter_rfb import widget
+
+    w = RemoteFrameBuffer()
+    assert "class RenderviewAnywidgetModel" in w._esm
+    assert "class BaseRenderView" in w._esm
+    assert ".renderview-wrapper" in w._css
+
+    # Module constants for backwards compatibility
+    assert widget.JS == w._esm
+    assert widget.CSS == w._css